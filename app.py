@@ -7,6 +7,11 @@ app = cdk.App()
 
 # 環境情報を取得
 environment = os.getenv('ENVIRONMENT', 'dev')
+handler_entry_point = os.getenv('HANDLER_ENTRY_POINT', 'lambda_handler')
+ingest_mode = os.getenv('INGEST_MODE', 'sync')
+# 作成するインデックスの数（既存のテーブルへは1つずつ増やしてデプロイ、未指定はすべて）
+index_count = os.getenv('TABLE_INDEX_COUNT')
+stack_options = {'index_count': int(index_count)} if index_count else {}
 account = os.getenv('CDK_DEFAULT_ACCOUNT') or os.getenv('AWS_ACCOUNT_ID')
 region = os.getenv('CDK_DEFAULT_REGION', 'ap-northeast-1')
 
@@ -22,13 +27,13 @@ env = cdk.Environment(account=account, region=region)
 
 # 環境別にスタックを作成
 if environment == 'prod':
-    ApiStack(app, "ApiStack-Prod", env=env, environment='prod')
+    ApiStack(app, "ApiStack-Prod", env=env, environment='prod', handler_entry_point=handler_entry_point, ingest_mode=ingest_mode, **stack_options)
 elif environment == 'v2qa':
-    ApiStack(app, "ApiStack-V2QA", env=env, environment='v2qa')
+    ApiStack(app, "ApiStack-V2QA", env=env, environment='v2qa', handler_entry_point=handler_entry_point, ingest_mode=ingest_mode, **stack_options)
 elif environment == 'dev':
-    ApiStack(app, "ApiStack-Dev", env=env, environment='dev')
+    ApiStack(app, "ApiStack-Dev", env=env, environment='dev', handler_entry_point=handler_entry_point, ingest_mode=ingest_mode, **stack_options)
 else:
     # デフォルト（テスト用）
-    ApiStack(app, "ApiStack", env=env, environment='test')
+    ApiStack(app, "ApiStack", env=env, environment='test', handler_entry_point=handler_entry_point, ingest_mode=ingest_mode, **stack_options)
 
 app.synth()
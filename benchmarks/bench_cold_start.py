@@ -0,0 +1,122 @@
+"""
+コールドスタートのベンチマーク
+
+新しいPythonプロセスで functions.handler の読み込み（Lambdaの初期化フェーズ相当）と
+最初・2回目の呼び出しにかかる時間を、DynamoDBの初期化モード(lazy / eager)ごとに計測する。
+DynamoDBはmotoのサーバーモードで代用する。
+
+実行方法:
+    python -m benchmarks.bench_cold_start --runs 5
+    python -m benchmarks.bench_cold_start --max-first-invocation-ms 300  # 超過時は終了コード1
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TABLE_NAME = 'cold-start-table'
+REGION = 'ap-northeast-1'
+
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from functions import handler
+imported = time.perf_counter()
+event = {{'httpMethod': 'GET', 'path': '/items/1', 'pathParameters': {{'id': '1'}}, 'body': None}}
+handler.lambda_handler(event, None)
+first = time.perf_counter()
+handler.lambda_handler(event, None)
+second = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_invocation_ms': (first - imported) * 1000,
+    'second_invocation_ms': (second - first) * 1000,
+}}))
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_dynamodb():
+    """motoのサーバーを起動してテーブルを作成"""
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+    server.start()
+    endpoint = f'http://127.0.0.1:{port}'
+    client = boto3.client('dynamodb', region_name=REGION, endpoint_url=endpoint,
+                          aws_access_key_id='testing', aws_secret_access_key='testing')
+    client.create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST',
+    )
+    client.put_item(TableName=TABLE_NAME, Item={'id': {'S': '1'}, 'name': {'S': 'cold start'}})
+    return server, endpoint
+
+
+def _run_child(mode, endpoint):
+    env = dict(
+        os.environ,
+        TABLE_NAME=TABLE_NAME,
+        DYNAMODB_INIT_MODE=mode,
+        AWS_DEFAULT_REGION=REGION,
+        AWS_ENDPOINT_URL_DYNAMODB=endpoint,
+        AWS_ACCESS_KEY_ID='testing',
+        AWS_SECRET_ACCESS_KEY='testing',
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT.format(root=ROOT)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    # 最終行が計測結果（それ以前は初期化ログ）
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start benchmark for functions.handler')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', nargs='+', default=['lazy', 'eager'])
+    parser.add_argument('--max-first-invocation-ms', type=float, default=None,
+                        help='最初の呼び出し時間（中央値）の上限。超過したモードがあれば終了コード1')
+    args = parser.parse_args()
+
+    server, endpoint = _start_dynamodb()
+    failed = False
+    try:
+        print(f"{'mode':<8}{'import ms':>12}{'1st call ms':>14}{'2nd call ms':>14}{'total ms':>12}")
+        for mode in args.modes:
+            runs = [_run_child(mode, endpoint) for _ in range(args.runs)]
+            medians = {
+                key: statistics.median(run[key] for run in runs)
+                for key in ('import_ms', 'first_invocation_ms', 'second_invocation_ms')
+            }
+            total = medians['import_ms'] + medians['first_invocation_ms']
+            print(f"{mode:<8}{medians['import_ms']:>12.1f}{medians['first_invocation_ms']:>14.1f}"
+                  f"{medians['second_invocation_ms']:>14.1f}{total:>12.1f}")
+            if args.max_first_invocation_ms is not None \
+                    and medians['first_invocation_ms'] > args.max_first_invocation_ms:
+                print(f'  -> {mode}: first invocation exceeds {args.max_first_invocation_ms} ms')
+                failed = True
+    finally:
+        server.stop()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
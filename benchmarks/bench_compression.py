@@ -0,0 +1,45 @@
+"""
+レスポンス圧縮のマイクロベンチマーク
+
+一覧取得のレスポンスと同じ形式のJSONボディをいくつかのサイズで作成し、
+gzip / brotli（インストールされている場合）の圧縮にかかるCPU時間と
+削減できるバイト数（base64エンコード後）を比較する。
+
+実行方法:
+    python -m benchmarks.bench_compression
+"""
+import argparse
+import base64
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('TABLE_NAME', 'benchmark-table')
+
+from benchmarks.bench_serialization import make_items
+from functions import handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    candidates = {'gzip': handler.COMPRESSORS['gzip']}
+    if handler.brotli is not None:
+        candidates['br'] = handler.COMPRESSORS['br']
+
+    print(f"{'items':>8}{'raw KB':>10}  {'encoding':<10}{'best ms':>10}{'sent KB':>10}{'saved':>8}")
+    for count in args.items:
+        data = handler.dumps({'items': make_items(count), 'count': count, 'nextToken': None}).encode('utf-8')
+        for name, compress in candidates.items():
+            best = min(timeit.repeat(lambda: compress(data), number=1, repeat=args.repeat))
+            sent = len(base64.b64encode(compress(data)))
+            print(f'{count:>8}{len(data) / 1024:>10.1f}  {name:<10}{best * 1000:>10.2f}'
+                  f'{sent / 1024:>10.1f}{1 - sent / len(data):>8.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+ルーティングのディスパッチ時間のマイクロベンチマーク
+
+ルート数を増やしながら、if/elif を順に評価する従来方式と、
+functions.handler.Router の (httpMethod, resource) テーブル参照を比較する。
+計測対象はハンドラの決定のみで、ハンドラ自体は何もしない。
+
+実行方法:
+    python -m benchmarks.bench_router
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('TABLE_NAME', 'benchmark-table')
+
+from functions import handler
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def make_routes(count):
+    """(httpMethod, resource) の組をcount件生成"""
+    return [(METHODS[i % len(METHODS)], f'/resource{i // len(METHODS)}/{{id}}') for i in range(count)]
+
+
+def noop(table, event):
+    return None
+
+
+def make_chain(routes):
+    """ルートを先頭から順に比較する従来方式のディスパッチ"""
+    def dispatch(method, resource):
+        for route_method, route_resource in routes:
+            if method == route_method and resource == route_resource:
+                return noop
+        return None
+    return dispatch
+
+
+def make_router(routes):
+    router = handler.Router()
+    for method, resource in routes:
+        router.route(method, resource)(noop)
+    return router.resolve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--routes', type=int, nargs='+', default=[5, 20, 100, 500])
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'routes':>8}  {'dispatch':<10}{'ns/call':>10}")
+    for count in args.routes:
+        routes = make_routes(count)
+        # 最悪ケースとして最後に登録したルートを引く
+        method, resource = routes[-1]
+        for name, dispatch in (('if/elif', make_chain(routes)), ('router', make_router(routes))):
+            best = min(timeit.repeat(
+                lambda: dispatch(method, resource), number=args.number, repeat=args.repeat
+            ))
+            print(f'{count:>8}  {name:<10}{best / args.number * 1e9:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+JSONシリアライズのマイクロベンチマーク
+
+従来の json.dumps + DecimalEncoder と、functions.handler のシリアライザ
+（json / orjson + Decimal変換フック）を1k/10k件のアイテムで比較する。
+
+実行方法:
+    python -m benchmarks.bench_serialization
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('TABLE_NAME', 'benchmark-table')
+
+from functions import handler
+
+
+def make_items(count):
+    """DynamoDBから取得したような数値(Decimal)を含むアイテムを生成"""
+    return [
+        {
+            'id': f'{i:010d}',
+            'name': f'商品{i}',
+            'description': 'ベンチマーク用の説明文' * 4,
+            'price': Decimal(1000 + i),
+            'rate': Decimal('0.15'),
+            'stock': Decimal(i % 50),
+            'tags': ['catalog', 'benchmark'],
+            'dimensions': {'width': Decimal('12.5'), 'height': Decimal('30'), 'depth': Decimal('4')},
+            'createdAt': '2024-11-21T10:00:00',
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_dumps(value):
+    return json.dumps(value, cls=handler.DecimalEncoder, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    candidates = {'legacy (DecimalEncoder)': legacy_dumps}
+    candidates['json'] = handler.JSON_SERIALIZERS['json']
+    if handler.orjson is not None:
+        candidates['orjson'] = handler.JSON_SERIALIZERS['orjson']
+
+    print(f"{'items':>8}  {'serializer':<24}{'best ms':>10}{'speedup':>10}")
+    for size in args.sizes:
+        items = make_items(size)
+        baseline = None
+        for name, serializer in candidates.items():
+            best = min(timeit.repeat(lambda: serializer(items), number=1, repeat=args.repeat))
+            baseline = baseline or best
+            print(f'{size:>8}  {name:<24}{best * 1000:>10.2f}{baseline / best:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
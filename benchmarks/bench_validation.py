@@ -0,0 +1,61 @@
+"""
+リクエストボディ検証のマイクロベンチマーク
+
+作成・更新（POST/PUT）のボディをいくつかのサイズで作成し、JSONの読み込みのみの場合
+（floatのまま / 小数をDecimalで読み込む場合）と functions.handler.parse_item
+（Decimalでの読み込み + スキーマ検証 + アイテムサイズ計算）の
+1リクエストあたりの処理時間（マイクロ秒）を比較する。
+
+実行方法:
+    python -m benchmarks.bench_validation
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('TABLE_NAME', 'benchmark-table')
+
+from functions import handler
+
+
+def make_body(extra_attributes):
+    """既知の属性と任意の属性extra_attributes個を含むボディ"""
+    body = {
+        'name': 'ベンチマーク商品',
+        'description': '検証のマイクロベンチマーク用のアイテム' * 4,
+        'category': 'books',
+        'status': 'active',
+        'price': 1980.5,
+        'tags': ['new', 'sale', 'popular'],
+    }
+    body.update({f'attr{i}': {'value': i, 'ratio': i / 7, 'label': f'label-{i}'} for i in range(extra_attributes)})
+    return json.dumps(body, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--attributes', type=int, nargs='+', default=[0, 10, 100, 1000])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'attrs':>8}{'body KB':>10}  {'step':<12}{'us/req':>10}")
+    for count in args.attributes:
+        event = {'httpMethod': 'POST', 'resource': '/items', 'body': make_body(count)}
+        candidates = {
+            'json.loads': lambda: json.loads(event['body']),
+            'Decimal': lambda: json.loads(event['body'], parse_float=Decimal),
+            'parse_item': lambda: handler.parse_item(event),
+        }
+        for name, func in candidates.items():
+            best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+            print(f"{count:>8}{len(event['body'].encode('utf-8')) / 1024:>10.1f}  {name:<12}"
+                  f'{best / args.number * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+lambda_handler の負荷試験・ベンチマーク
+
+motoで代用したDynamoDBに対して、API Gatewayのプロキシ統合と同じ形式のイベントで
+functions.handler.lambda_handler を並列に呼び出し、ルートごとに
+レイテンシ(p50/p95/p99)・スループット(ops/sec)・ピークメモリを計測する。
+結果はJSONのベースラインとして保存でき、ベースラインと比較して劣化があれば終了コード1で終了する。
+
+実行方法:
+    python -m benchmarks.load_test --items 5000 --requests 500 --concurrency 8
+    python -m benchmarks.load_test --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('TABLE_NAME', 'load-test-table')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+from benchmarks.scenarios import CATEGORIES, build_scenarios
+from functions import handler
+
+
+def create_table(item_count):
+    """ApiStackと同じキー・インデックス構成のテーブルを作成してデータを投入"""
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.create_table(
+        TableName=os.environ['TABLE_NAME'],
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': name, 'AttributeType': 'S'}
+            for name in ('id', 'createdAt', 'createdDay', 'category', 'status')
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': index_name,
+                'KeySchema': [
+                    {'AttributeName': partition_key, 'KeyType': 'HASH'},
+                    {'AttributeName': 'createdAt', 'KeyType': 'RANGE'},
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+            }
+            for index_name, partition_key in (
+                (handler.CREATED_DAY_INDEX, 'createdDay'),
+                (handler.CATEGORY_INDEX, 'category'),
+                (handler.STATUS_INDEX, 'status'),
+            )
+        ],
+        BillingMode='PAY_PER_REQUEST',
+    )
+    with table.batch_writer() as writer:
+        for i in range(item_count):
+            writer.put_item(Item=handler.with_created_day({
+                'id': f'{i:08d}',
+                'name': f'商品{i}',
+                'price': 100 + i,
+                'category': CATEGORIES[i % len(CATEGORIES)],
+                'status': 'active',
+                'createdAt': f'2024-11-{1 + i % 28:02d}T10:00:00',
+            }))
+    return dynamodb, table
+
+
+def percentile(sorted_values, ratio):
+    index = min(len(sorted_values) - 1, max(0, round(ratio * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_route(make_event, requests, concurrency, trace_memory):
+    """1ルート分のリクエストを並列に実行して計測"""
+    def invoke(_):
+        event = make_event()
+        started = time.perf_counter()
+        response = handler.lambda_handler(event, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response['statusCode']
+
+    if trace_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(invoke, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    stats = {
+        'requests': requests,
+        'errors': errors,
+        'ops_per_sec': round(requests / wall, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        # プロセス全体の最大常駐メモリ（ルート実行後の時点の値）
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if trace_memory:
+        stats['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    return stats
+
+
+def compare(results, baseline, max_regression):
+    """ベースラインと比較し、劣化したルートと指標の一覧を返す"""
+    regressions = []
+    for route, stats in results.items():
+        base = baseline.get('routes', {}).get(route)
+        if not base:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if stats[metric] > base[metric] * (1 + max_regression):
+                regressions.append(f'{route}: {metric} {base[metric]} -> {stats[metric]}')
+        if stats['ops_per_sec'] < base['ops_per_sec'] * (1 - max_regression):
+            regressions.append(f"{route}: ops_per_sec {base['ops_per_sec']} -> {stats['ops_per_sec']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for functions.handler.lambda_handler')
+    parser.add_argument('--items', type=int, default=2000, help='テーブルに投入するアイテム数')
+    parser.add_argument('--requests', type=int, default=200, help='ルートごとのリクエスト数')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--routes', nargs='+', default=None, help='実行するルート（省略時は全ルート）')
+    parser.add_argument('--trace-memory', action='store_true', help='tracemallocでルートごとのピークを計測')
+    parser.add_argument('--save-baseline', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    random.seed(0)
+    with mock_aws():
+        dynamodb, table = create_table(args.items)
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        scenarios = build_scenarios(args.items)
+        routes = args.routes or list(scenarios)
+        if args.trace_memory:
+            tracemalloc.start()
+
+        results = {}
+        print(f"{'route':<24}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rss MB':>9}{'errors':>8}")
+        for route in routes:
+            stats = run_route(scenarios[route], args.requests, args.concurrency, args.trace_memory)
+            results[route] = stats
+            print(f"{route:<24}{stats['ops_per_sec']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}"
+                  f"{stats['p99_ms']:>9}{stats['peak_rss_mb']:>9}{stats['errors']:>8}")
+
+    report = {
+        'config': {'items': args.items, 'requests': args.requests, 'concurrency': args.concurrency},
+        'routes': results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'Saved baseline to {args.save_baseline}')
+
+    failed = any(stats['errors'] for stats in results.values())
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        failed = failed or bool(regressions)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
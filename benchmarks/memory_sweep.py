@@ -0,0 +1,128 @@
+"""
+Lambda関数のメモリサイズのスイープ
+
+デプロイ済みの関数（$LATEST）のメモリサイズを順に変更し、ベンチマークと同じシナリオの
+イベントで直接呼び出して、REPORTログの処理時間・課金時間・最大メモリ使用量から
+メモリサイズごとのレイテンシと100万リクエストあたりの費用を比較する。
+ApiStackの FUNCTION_SETTINGS のメモリサイズはこの結果をもとに決める。
+
+終了時（中断時を含む）に関数のメモリサイズを元に戻す。書き込みを行うルートは
+対象のテーブルにデータを作成するため、開発環境の関数に対して実行すること。
+
+実行方法:
+    python -m benchmarks.memory_sweep --function-name dev-api-handler --memory 256 512 1024 1769
+    python -m benchmarks.memory_sweep --function-name dev-api-handler --routes "GET /items" --output sweep.json
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import boto3
+
+from benchmarks.scenarios import build_scenarios
+
+# 東京リージョンの料金（USD、ARM64）
+PRICE_PER_GB_SECOND = 0.0000133334
+PRICE_PER_REQUEST = 0.0000002
+
+REPORT_PATTERN = re.compile(r'(Billed Duration|Duration|Max Memory Used|Init Duration): ([\d.]+)')
+
+
+def parse_report(log_result):
+    """呼び出しログ末尾のREPORT行から計測値を取得"""
+    log = base64.b64decode(log_result).decode('utf-8', errors='replace')
+    report = next((line for line in log.splitlines() if line.startswith('REPORT')), '')
+    return {name: float(value) for name, value in REPORT_PATTERN.findall(report)}
+
+
+def set_memory(client, function_name, memory_size):
+    client.update_function_configuration(FunctionName=function_name, MemorySize=memory_size)
+    client.get_waiter('function_updated_v2').wait(FunctionName=function_name)
+
+
+def invoke(client, function_name, event):
+    response = client.invoke(
+        FunctionName=function_name,
+        Payload=json.dumps(event).encode('utf-8'),
+        LogType='Tail',
+    )
+    payload = json.loads(response['Payload'].read() or b'null')
+    failed = 'FunctionError' in response or (payload or {}).get('statusCode', 500) >= 500
+    return parse_report(response['LogResult']), failed
+
+
+def sweep_memory(client, function_name, memory_size, scenarios, invocations):
+    """1つのメモリサイズでシナリオごとに呼び出して集計"""
+    set_memory(client, function_name, memory_size)
+    results = {}
+    for route, make_event in scenarios.items():
+        # 設定変更後の最初の呼び出しはコールドスタートになるため別に記録する
+        first, _ = invoke(client, function_name, make_event())
+        durations, billed, max_memory, errors = [], [], [], 0
+        for _ in range(invocations):
+            report, failed = invoke(client, function_name, make_event())
+            errors += failed
+            durations.append(report.get('Duration', 0.0))
+            billed.append(report.get('Billed Duration', 0.0))
+            max_memory.append(report.get('Max Memory Used', 0.0))
+        durations.sort()
+        mean_billed_ms = statistics.mean(billed)
+        results[route] = {
+            'init_ms': first.get('Init Duration'),
+            'p50_ms': round(statistics.median(durations), 2),
+            'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+            'max_memory_mb': max(max_memory),
+            'cost_per_million': round(
+                (mean_billed_ms / 1000 * memory_size / 1024 * PRICE_PER_GB_SECOND + PRICE_PER_REQUEST) * 1_000_000,
+                4,
+            ),
+            'errors': errors,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--function-name', required=True)
+    parser.add_argument('--memory', type=int, nargs='+', default=[256, 512, 1024, 1769, 2048])
+    parser.add_argument('--invocations', type=int, default=20)
+    parser.add_argument('--items', type=int, default=5000, help='テーブルに投入済みのアイテム数（IDの範囲）')
+    parser.add_argument('--routes', nargs='+', help='対象のルート（既定は全シナリオ）')
+    parser.add_argument('--output', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args.items)
+    if args.routes:
+        scenarios = {route: scenarios[route] for route in args.routes}
+
+    client = boto3.client('lambda')
+    original_memory = client.get_function_configuration(FunctionName=args.function_name)['MemorySize']
+    results = {}
+    try:
+        for memory_size in args.memory:
+            results[memory_size] = sweep_memory(
+                client, args.function_name, memory_size, scenarios, args.invocations
+            )
+    finally:
+        set_memory(client, args.function_name, original_memory)
+
+    print(f"{'memory':>7}  {'route':<24}{'init ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'mem MB':>8}{'$/1M':>9}{'errors':>8}")
+    for memory_size, routes in results.items():
+        for route, result in routes.items():
+            init_ms = f"{result['init_ms']:.0f}" if result['init_ms'] else '-'
+            print(f"{memory_size:>7}  {route:<24}{init_ms:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                  f"{result['max_memory_mb']:>8.0f}{result['cost_per_million']:>9}{result['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+ベンチマーク用のリクエストシナリオ
+
+API Gatewayのプロキシ統合と同じ形式のイベントをルートごとに生成する。
+load_test（moto）と memory_sweep（デプロイ済みの関数）で共通に使う。
+"""
+import json
+import random
+
+CATEGORIES = ['book', 'food', 'toy', 'tool']
+
+
+def build_scenarios(item_count):
+    """ルートごとのイベント生成関数"""
+    def random_id():
+        return f'{random.randrange(item_count):08d}'
+
+    return {
+        'GET /items/{id}': lambda: {
+            'httpMethod': 'GET', 'resource': '/items/{id}', 'path': '/items/x',
+            'pathParameters': {'id': random_id()}, 'body': None,
+        },
+        'GET /items': lambda: {
+            'httpMethod': 'GET', 'resource': '/items', 'path': '/items',
+            'queryStringParameters': {'limit': '100'}, 'pathParameters': None, 'body': None,
+        },
+        'GET /items?category': lambda: {
+            'httpMethod': 'GET', 'resource': '/items', 'path': '/items',
+            'queryStringParameters': {'category': random.choice(CATEGORIES), 'limit': '50'},
+            'pathParameters': None, 'body': None,
+        },
+        'POST /items': lambda: {
+            'httpMethod': 'POST', 'resource': '/items', 'path': '/items', 'pathParameters': None,
+            'body': json.dumps({'name': '負荷試験', 'price': 100, 'category': 'book'}),
+        },
+        'PATCH /items/{id}': lambda: {
+            'httpMethod': 'PATCH', 'resource': '/items/{id}', 'path': '/items/x',
+            'pathParameters': {'id': random_id()}, 'body': json.dumps({'$add': {'views': 1}}),
+        },
+        'POST /items:batchGet': lambda: {
+            'httpMethod': 'POST', 'resource': '/items:batchGet', 'path': '/items:batchGet',
+            'pathParameters': None,
+            'body': json.dumps({'ids': list({random_id() for _ in range(50)})}),
+        },
+    }
@@ -1,22 +1,556 @@
+import time
+
+_module_load_started = time.perf_counter()
+
+import asyncio
+import base64
+import contextvars
+import functools
+import gzip
+import hashlib
 import json
 import os
-from datetime import datetime
+import queue
+import random
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from decimal import Decimal
 
+try:
+    import orjson
+except ImportError:  # デプロイパッケージに含まれていない場合は標準のjsonを使う
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # デプロイパッケージに含まれていない場合はgzipのみ使う
+    brotli = None
+
 # グローバル変数として宣言（遅延初期化）
 dynamodb = None
 table = None
+# 処理済みマーカー・冪等キーの記録用テーブル（(アイテムのテーブル, 記録用テーブル) の組）
+control_table = None
+sqs = None
+s3 = None
+
+# DynamoDBクライアントの初期化モード
+#   lazy : 最初のリクエストでboto3のリソース(Table)を作成
+#   eager: Lambdaの初期化フェーズで低レベルクライアントを作成し、リソース層を使わない
+DYNAMODB_INIT_MODE = os.environ.get('DYNAMODB_INIT_MODE', 'lazy')
+
+# DynamoDBクライアントの接続プール・タイムアウト・リトライ設定（ApiStackから環境変数で指定）
+CLIENT_CONNECT_TIMEOUT = float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '1'))
+CLIENT_READ_TIMEOUT = float(os.environ.get('DYNAMODB_READ_TIMEOUT', '3'))
+CLIENT_MAX_POOL_CONNECTIONS = int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '50'))
+CLIENT_TCP_KEEPALIVE = os.environ.get('DYNAMODB_TCP_KEEPALIVE', 'true').lower() == 'true'
+CLIENT_RETRY_MODE = os.environ.get('DYNAMODB_RETRY_MODE', 'adaptive')
+CLIENT_MAX_ATTEMPTS = int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '5'))
+THROTTLING_ERROR_CODES = frozenset({
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+})
+
+# 初期化処理の所要時間（ミリ秒）
+init_timings = {}
+
+# リクエストごとの計測値をCloudWatch Embedded Metric Format(EMF)で出力する設定
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ItemsApi')
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '0'))
+METRIC_PHASES = (
+    ('init', 'InitTime'),
+    ('parse', 'ParseTime'),
+    ('validate', 'ValidateTime'),
+    ('dynamodb', 'DynamoDBTime'),
+    ('serialize', 'SerializeTime'),
+    ('handler', 'HandlerTime'),
+    ('compress', 'CompressTime'),
+)
 
 def _get_table():
     """DynamoDBテーブルを取得（遅延初期化）"""
     global dynamodb, table
     if table is None:
-        dynamodb = boto3.resource('dynamodb')
+        if DYNAMODB_INIT_MODE == 'eager':
+            return _init_client_table()
+        dynamodb = boto3.resource('dynamodb', config=_client_config())
+        client_stats.register(dynamodb.meta.client)
+        request_metrics.register(dynamodb.meta.client)
         table_name = os.environ['TABLE_NAME']
         table = dynamodb.Table(table_name)
     return table
 
+def _get_control_table(items):
+    """
+    処理済みマーカー・冪等キーの記録を保存するテーブルを取得
+
+    CONTROL_TABLE_NAMEが未設定の場合は、アイテムのテーブルに予約IDで保存する。
+    アイテムのテーブルと同じクライアント（トランザクションを共にできる）で作成する。
+    """
+    global control_table
+    if not CONTROL_TABLE_NAME or CONTROL_TABLE_NAME == items.name:
+        return items
+    if control_table is None or control_table[0] is not items:
+        if isinstance(items, ClientTable):
+            control = ClientTable(items._client, CONTROL_TABLE_NAME)
+        else:
+            control = dynamodb.Table(CONTROL_TABLE_NAME)
+        control_table = (items, control)
+    return control_table[1]
+
+def _get_sqs():
+    """取り込みキュー用のSQSクライアントを取得（遅延初期化）"""
+    global sqs
+    if sqs is None:
+        sqs = boto3.client('sqs', config=_client_config())
+    return sqs
+
+def _get_s3():
+    """一括インポート・エクスポート用のS3クライアントを取得（遅延初期化）"""
+    global s3
+    if s3 is None:
+        s3 = boto3.client('s3', config=_client_config().merge(Config(signature_version='s3v4')))
+    return s3
+
+def _client_config():
+    """DynamoDBクライアント用のbotocore設定"""
+    return Config(
+        connect_timeout=CLIENT_CONNECT_TIMEOUT,
+        read_timeout=CLIENT_READ_TIMEOUT,
+        max_pool_connections=CLIENT_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=CLIENT_TCP_KEEPALIVE,
+        retries={'mode': CLIENT_RETRY_MODE, 'max_attempts': CLIENT_MAX_ATTEMPTS},
+    )
+
+
+class ClientStats:
+    """
+    DynamoDBクライアントのリトライ・スロットリング回数を数えるフック
+
+    botocoreの needs-retry イベントは各試行の後に発行されるため、
+    そこで試行回数とエラーコードを集計する。呼び出しごとに reset() で初期化する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def register(self, client):
+        client.meta.events.register('needs-retry.dynamodb', self._on_attempt)
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.throttles = 0
+
+    def _on_attempt(self, response=None, attempts=1, **kwargs):
+        error_code = None
+        if response is not None:
+            error_code = response[1].get('Error', {}).get('Code')
+        with self._lock:
+            if attempts > 1:
+                self.retries += 1
+            else:
+                self.calls += 1
+            if error_code in THROTTLING_ERROR_CODES:
+                self.throttles += 1
+        # Noneを返し、リトライの判定はbotocoreのリトライハンドラに任せる
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            return {'calls': self.calls, 'retries': self.retries, 'throttles': self.throttles}
+
+
+client_stats = ClientStats()
+
+
+class RequestMetrics:
+    """
+    呼び出しごとのフェーズ別処理時間と消費キャパシティを集計し、EMF形式で出力する
+
+    METRICS_SAMPLE_RATE の割合の呼び出しのみ計測し、計測しない呼び出しでは
+    タイマーは何もしない。DynamoDBの呼び出し時間と
+    消費キャパシティはbotocoreのイベントフックで集計する。
+    """
+
+    def __init__(self, sample_rate=None):
+        self.sample_rate = METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.start(sampled=False)
+
+    def register(self, client):
+        events = client.meta.events
+        events.register('before-parameter-build.dynamodb', self._on_parameter_build)
+        events.register('before-call.dynamodb', self._on_before_call)
+        events.register('after-call.dynamodb', self._on_after_call)
+        events.register('after-call-error.dynamodb', self._on_after_call)
+
+    def start(self, sampled=None):
+        """呼び出しの開始時に集計を初期化（sampled省略時はサンプリング率で決定）"""
+        if sampled is None:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        with self._lock:
+            self.sampled = sampled
+            self.started = time.perf_counter()
+            self.phases = dict.fromkeys((phase for phase, _ in METRIC_PHASES), 0.0)
+            self.consumed_capacity = 0.0
+            self.dynamodb_calls = 0
+
+    def add(self, phase, elapsed_ms):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed_ms
+
+    @contextmanager
+    def timer(self, phase):
+        """with文のブロックの処理時間をフェーズに加算"""
+        if not self.sampled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, (time.perf_counter() - started) * 1000)
+
+    def _on_parameter_build(self, params, model, **kwargs):
+        if self.sampled and 'ReturnConsumedCapacity' in model.input_shape.members:
+            params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def _on_before_call(self, **kwargs):
+        self._local.started = time.perf_counter()
+
+    def _on_after_call(self, parsed=None, **kwargs):
+        started = getattr(self._local, 'started', None)
+        if not self.sampled or started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        consumed = (parsed or {}).get('ConsumedCapacity') or []
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        with self._lock:
+            self.phases['dynamodb'] += elapsed_ms
+            self.dynamodb_calls += 1
+            self.consumed_capacity += sum(c.get('CapacityUnits', 0) for c in consumed)
+
+    def emit(self, event, status_code, cold_start=False):
+        """計測結果をEMF形式のJSON 1行として出力"""
+        if not self.sampled:
+            return None
+        with self._lock:
+            record = {
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['Route', 'Method']],
+                        'Metrics': [
+                            *({'Name': name, 'Unit': 'Milliseconds'} for _, name in METRIC_PHASES),
+                            {'Name': 'TotalTime', 'Unit': 'Milliseconds'},
+                            {'Name': 'ConsumedCapacity', 'Unit': 'Count'},
+                            {'Name': 'DynamoDBCalls', 'Unit': 'Count'},
+                        ],
+                    }],
+                },
+                'Route': event.get('resource') or event.get('path'),
+                'Method': event.get('httpMethod'),
+                **{name: round(self.phases[phase], 3) for phase, name in METRIC_PHASES},
+                'TotalTime': round((time.perf_counter() - self.started) * 1000, 3),
+                'ConsumedCapacity': self.consumed_capacity,
+                'DynamoDBCalls': self.dynamodb_calls,
+                'StatusCode': status_code,
+                'ColdStart': cold_start,
+            }
+        print(json.dumps(record))
+        return record
+
+
+request_metrics = RequestMetrics()
+_cold_start = True
+
+def _init_client_table():
+    """低レベルクライアントを作成してテーブルを初期化し、所要時間を記録"""
+    global dynamodb, table
+    started = time.perf_counter()
+    dynamodb = boto3.client('dynamodb', config=_client_config())
+    client_stats.register(dynamodb)
+    request_metrics.register(dynamodb)
+    table = ClientTable(dynamodb, os.environ['TABLE_NAME'])
+    init_timings['client_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return table
+
+
+class ClientTable:
+    """
+    低レベルクライアントをboto3のTableリソースと同じ呼び出し方で使うためのラッパー
+
+    リクエストのキー・アイテム・式の値をDynamoDBの型表現に変換し、
+    レスポンスをPythonの値に戻す。batch_get_item / batch_write_item は
+    Tableリソースの meta.client と同じ形式（テーブル名をキーとしたRequestItems）で受け付ける。
+    """
+
+    _ITEM_PARAMS = ('Key', 'Item', 'ExclusiveStartKey', 'ExpressionAttributeValues')
+    _ITEM_RESULTS = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+        # Tableリソースの table.meta.client と同じ形で呼べるようにする
+        self.meta = SimpleNamespace(client=self)
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+    def _serialize(self, item):
+        return {k: self._serializer.serialize(v) for k, v in item.items()}
+
+    def _deserialize(self, item):
+        return {k: self._deserializer.deserialize(v) for k, v in item.items()}
+
+    def _call(self, operation, **params):
+        for name in self._ITEM_PARAMS:
+            if name in params:
+                params[name] = self._serialize(params[name])
+        response = getattr(self._client, operation)(TableName=self.name, **params)
+        for name in self._ITEM_RESULTS:
+            if name in response:
+                response[name] = self._deserialize(response[name])
+        if 'Items' in response:
+            response['Items'] = [self._deserialize(item) for item in response['Items']]
+        return response
+
+    def get_item(self, **params):
+        return self._call('get_item', **params)
+
+    def put_item(self, **params):
+        return self._call('put_item', **params)
+
+    def update_item(self, **params):
+        return self._call('update_item', **params)
+
+    def delete_item(self, **params):
+        return self._call('delete_item', **params)
+
+    def scan(self, **params):
+        return self._call('scan', **params)
+
+    def query(self, **params):
+        return self._call('query', **params)
+
+    def batch_get_item(self, RequestItems, **params):
+        request = {
+            name: dict(spec, Keys=[self._serialize(key) for key in spec['Keys']])
+            for name, spec in RequestItems.items()
+        }
+        response = self._client.batch_get_item(RequestItems=request, **params)
+        response['Responses'] = {
+            name: [self._deserialize(item) for item in items]
+            for name, items in response.get('Responses', {}).items()
+        }
+        response['UnprocessedKeys'] = {
+            name: dict(spec, Keys=[self._deserialize(key) for key in spec['Keys']])
+            for name, spec in response.get('UnprocessedKeys', {}).items()
+        }
+        return response
+
+    def batch_write_item(self, RequestItems, **params):
+        response = self._client.batch_write_item(
+            RequestItems=self._convert_write_requests(RequestItems, self._serialize), **params
+        )
+        response['UnprocessedItems'] = self._convert_write_requests(
+            response.get('UnprocessedItems', {}), self._deserialize
+        )
+        return response
+
+    def transact_write_items(self, TransactItems, **params):
+        request = []
+        for action in TransactItems:
+            (operation, spec), = action.items()
+            spec = dict(spec)
+            for name in self._ITEM_PARAMS:
+                if name in spec:
+                    spec[name] = self._serialize(spec[name])
+            request.append({operation: spec})
+        return self._client.transact_write_items(TransactItems=request, **params)
+
+    @staticmethod
+    def _convert_write_requests(request_items, convert):
+        converted = {}
+        for name, requests in request_items.items():
+            converted[name] = []
+            for request in requests:
+                if 'PutRequest' in request:
+                    converted[name].append({'PutRequest': {'Item': convert(request['PutRequest']['Item'])}})
+                else:
+                    converted[name].append({'DeleteRequest': {'Key': convert(request['DeleteRequest']['Key'])}})
+        return converted
+
+# 一覧取得（ページング）の設定
+DEFAULT_PAGE_LIMIT = int(os.environ.get('DEFAULT_PAGE_LIMIT', '100'))
+MAX_PAGE_LIMIT = int(os.environ.get('MAX_PAGE_LIMIT', '1000'))
+# Lambdaプロキシ統合のレスポンス上限(6MB)に対して余裕を持たせたボディサイズ上限
+MAX_RESPONSE_BYTES = int(os.environ.get('MAX_RESPONSE_BYTES', str(5 * 1024 * 1024)))
+# JSONシリアライザの選択（auto: orjsonがあれば使用 / orjson / json）
+JSON_SERIALIZER = os.environ.get('JSON_SERIALIZER', 'auto')
+# floatで正確に表せる整数の上限（2^53）
+MAX_SAFE_INTEGER = 2 ** 53
+# レスポンス圧縮（Accept-Encodingに応じてbr/gzip）を行うボディサイズの下限（負の値で無効）
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+# テーブルのキー属性
+KEY_ATTRIBUTES = ('id',)
+
+# グローバルセカンダリインデックス（ApiStackの定義と対応）
+CREATED_DAY_INDEX = 'createdDay-createdAt-index'
+CATEGORY_INDEX = 'category-createdAt-index'
+STATUS_INDEX = 'status-createdAt-index'
+# 検索に使うインデックス（カンマ区切り、ApiStackで作成済みのもの。未設定の場合はすべて）
+# インデックスは1回のデプロイで1つずつ追加するため、作成前のインデックスは使わずにスキャンする
+QUERY_INDEXES = frozenset(
+    os.environ['QUERY_INDEXES'].split(',') if 'QUERY_INDEXES' in os.environ
+    else (CREATED_DAY_INDEX, CATEGORY_INDEX, STATUS_INDEX)
+)
+# createdAfter/createdBefore の範囲を日別インデックスで検索する最大日数（超える場合はスキャン）
+MAX_DAY_BUCKETS = int(os.environ.get('MAX_DAY_BUCKETS', '31'))
+QUERY_FILTERS = ('category', 'status', 'createdAfter', 'createdBefore')
+
+# 部分更新（PATCH）で楽観的排他制御に使う属性
+VERSION_ATTRIBUTE = 'version'
+
+# fieldsクエリパラメータで指定できる属性数の上限
+MAX_PROJECTION_FIELDS = 50
+
+# 並列スキャン（エクスポート）の設定
+DEFAULT_SCAN_SEGMENTS = int(os.environ.get('DEFAULT_SCAN_SEGMENTS', '4'))
+MAX_SCAN_SEGMENTS = int(os.environ.get('MAX_SCAN_SEGMENTS', '64'))
+SCAN_MAX_WORKERS = int(os.environ.get('SCAN_MAX_WORKERS', '8'))
+_SEGMENT_DONE = object()
+
+# バッチ操作の設定（BatchGetItemは100件、BatchWriteItemは25件が上限）
+BATCH_GET_CHUNK_SIZE = 100
+BATCH_WRITE_CHUNK_SIZE = 25
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '1000'))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '8'))
+BATCH_MAX_RETRIES = int(os.environ.get('BATCH_MAX_RETRIES', '5'))
+BATCH_BACKOFF_BASE = 0.05
+BATCH_BACKOFF_MAX = 1.0
+
+# アイテムID生成の設定
+ID_GENERATOR = os.environ.get('ID_GENERATOR', 'ulid')
+CREATE_MAX_ATTEMPTS = 3
+CROCKFORD_BASE32 = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+SNOWFLAKE_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+
+# アイテム作成の取り込みモード
+#   sync : リクエスト内でDynamoDBに書き込み201を返す
+#   queue: 取り込みキュー(SQS)に登録して202を返し、ingest_handlerがまとめて書き込む
+INGEST_MODE = os.environ.get('INGEST_MODE', 'sync')
+INGEST_QUEUE_URL = os.environ.get('INGEST_QUEUE_URL')
+
+# S3経由の一括インポート・エクスポート（NDJSON）の設定
+BULK_BUCKET = os.environ.get('BULK_BUCKET')
+# マルチパートアップロードのパートサイズ（S3の下限は最後のパート以外5MB）
+EXPORT_PART_SIZE = max(5 * 1024 * 1024, int(os.environ.get('EXPORT_PART_SIZE', str(8 * 1024 * 1024))))
+PRESIGNED_URL_TTL_SECONDS = int(os.environ.get('PRESIGNED_URL_TTL_SECONDS', '3600'))
+# インポート時にまとめて書き込む件数（BatchWriteItemのチャンクを並列に書き込む）
+IMPORT_FLUSH_SIZE = BATCH_WRITE_CHUNK_SIZE * BATCH_MAX_WORKERS
+# インポート結果に含める行エラーの上限
+IMPORT_MAX_ERRORS = 100
+
+# DynamoDB Streamsで更新する集計レコードの設定
+# 集計レコードは予約プレフィックス付きのIDで同じテーブルに保存し、一覧・エクスポートからは除外する
+# 処理済みマーカー（と冪等キーの記録）はリクエストごとに増えるため、一覧・エクスポートのスキャンで読まないよう
+# CONTROL_TABLE_NAMEのテーブルに保存する（未設定の場合は同じテーブル）
+CONTROL_TABLE_NAME = os.environ.get('CONTROL_TABLE_NAME')
+RESERVED_ID_PREFIX = '#'
+STATS_ID = '#stats'
+RECENT_ID = '#recent'
+STREAM_MARKER_PREFIX = '#stream#'
+CATEGORY_COUNT_PREFIX = 'category:'
+RECENT_ITEMS_LIMIT = int(os.environ.get('RECENT_ITEMS_LIMIT', '20'))
+# 処理済みマーカーの保持期間（ストリームの保持期間24時間を超える長さ）
+STREAM_MARKER_TTL_SECONDS = 2 * 24 * 60 * 60
+# TransactWriteItemsの上限(100件)から集計レコード2件分を除いた件数
+STREAM_TRANSACT_CHUNK_SIZE = 98
+STREAM_MAX_ATTEMPTS = 5
+# TTLで削除する属性（ApiStackのテーブル設定と対応）
+TTL_ATTRIBUTE = 'expiresAt'
+
+# アイテム作成（POST /items）の冪等キー（Idempotency-Keyヘッダー）の設定
+# 初回の応答を予約プレフィックス付きのIDでCONTROL_TABLE_NAMEのテーブル（未設定の場合は同じテーブル）に記録し、
+# 保持期間を過ぎたらTTLで削除する
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_PREFIX = '#idempotency#'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 60 * 60)))
+# 記録は初回の応答（アイテム全体）を含むため、記録のID・フィンガープリント・TTLの分として
+# 冪等キー付きの作成ではボディのサイズ上限からさらに差し引くバイト数
+IDEMPOTENCY_RECORD_BYTES = 512
+# 記録のコンテナ内キャッシュ（サイズ0で無効）
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '0'))
+
+# アイテム削除（DELETE /items/{id}）のモード
+#   hard: DeleteItemで即時に削除する
+#   soft: 削除日時とTTLの期限を記録したトゥームストーンに置き換え、実際の削除はDynamoDBのTTLに任せる
+DELETE_MODE = os.environ.get('DELETE_MODE', 'hard')
+TOMBSTONE_ATTRIBUTE = 'deletedAt'
+# トゥームストーンをTTLで削除するまでの期間
+TOMBSTONE_TTL_SECONDS = int(os.environ.get('TOMBSTONE_TTL_SECONDS', str(24 * 60 * 60)))
+# トゥームストーンから取り除くGSIのキー属性（キーの無いアイテムは疎なインデックスに含まれない）
+INDEX_KEY_ATTRIBUTES = ('category', 'status', 'createdDay')
+
+# 非同期版ハンドラでDynamoDB呼び出しを並行実行する上限
+ASYNC_MAX_CONCURRENCY = int(os.environ.get('ASYNC_MAX_CONCURRENCY', '16'))
+_async_executor = None
+_event_loop = None
+
+# 単一アイテム取得のコンテナ内キャッシュ設定（サイズ0で無効）
+ITEM_CACHE_SIZE = int(os.environ.get('ITEM_CACHE_SIZE', '0'))
+ITEM_CACHE_TTL_SECONDS = float(os.environ.get('ITEM_CACHE_TTL_SECONDS', '30'))
+
+# アイテム作成・更新（POST/PUT）のリクエストボディの検証設定
+# DynamoDBのアイテムサイズ上限(400KB)
+MAX_ITEM_BYTES = 400 * 1024
+# パース前にボディの長さで拒否する上限（JSONの記号・エスケープの分アイテムサイズより大きくなる）
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', str(512 * 1024)))
+# サーバー側で付与する属性（id・日時・version）の分としてボディのサイズ上限から差し引くバイト数
+SERVER_ATTRIBUTES_BYTES = 256
+# DynamoDBの数値の有効桁数とドキュメントのネストの上限
+MAX_NUMBER_DIGITS = 38
+MAX_NESTING_DEPTH = 32
+# サーバー側で管理するためリクエストボディで指定できない属性
+RESERVED_ATTRIBUTES = (
+    *KEY_ATTRIBUTES, 'createdAt', 'createdDay', 'updatedAt', VERSION_ATTRIBUTE, TTL_ATTRIBUTE, TOMBSTONE_ATTRIBUTE,
+)
+# 型を検証する既知の属性（それ以外の属性は型を問わずそのまま保存する）
+# category/statusはGSIのキーのため空文字を許可しない
+ITEM_FIELDS = {
+    'name': {'type': 'string', 'minLength': 1, 'maxLength': 256},
+    'description': {'type': 'string', 'maxLength': 4096},
+    'category': {'type': 'string', 'minLength': 1, 'maxLength': 64},
+    'status': {'type': 'string', 'minLength': 1, 'maxLength': 64},
+    'price': {'type': 'number', 'minimum': 0},
+    'tags': {'type': 'array', 'maxItems': 50, 'items': {'type': 'string', 'minLength': 1, 'maxLength': 64}},
+}
+
+
+class ValidationError(Exception):
+    """リクエスト内容が不正な場合の例外（400を返す）"""
+
+
 class DecimalEncoder(json.JSONEncoder):
     """DynamoDBのDecimal型をJSONに変換するためのエンコーダー"""
     def default(self, obj):
@@ -24,78 +558,2232 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
-def lambda_handler(event, context):
+def _now_ms():
+    return time.time_ns() // 1_000_000
+
+
+class UlidGenerator:
+    """
+    ULID形式（26文字、時刻順にソート可能）のID生成器
+
+    128ビット = 48ビットのミリ秒時刻 + 32ビットのノード（コンテナごとに乱数）+ 48ビットのシーケンス。
+    同一ミリ秒内はシーケンスを加算し、時刻が戻った場合も直前の時刻を使うため単調増加となる。
+    """
+
+    def __init__(self, node=None, clock=_now_ms):
+        self.node = random.getrandbits(32) if node is None else node
+        self.clock = clock
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = max(self.clock(), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & 0xFFFFFFFFFFFF
+                if self._sequence == 0:
+                    # シーケンスが一周した場合は次のミリ秒に進める
+                    now += 1
+            else:
+                # ミリ秒ごとに乱数から開始し、推測しにくくする
+                self._sequence = random.getrandbits(47)
+            self._last_ms = now
+            value = (now << 80) | (self.node << 48) | self._sequence
+
+        chars = []
+        for _ in range(26):
+            chars.append(CROCKFORD_BASE32[value & 0x1F])
+            value >>= 5
+        return ''.join(reversed(chars))
+
+
+class SnowflakeGenerator:
+    """
+    Snowflake形式（64ビット整数を19桁ゼロ埋めした文字列）のID生成器
+
+    41ビットのミリ秒時刻 + 10ビットのノード + 12ビットのシーケンス。
+    1ミリ秒に4096件を超えた場合は次のミリ秒まで待機する。
+    """
+
+    def __init__(self, node=None, clock=_now_ms):
+        self.node = random.getrandbits(10) if node is None else node & 0x3FF
+        self.clock = clock
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = max(self.clock(), self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & 0xFFF
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = self.clock()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            value = ((now - SNOWFLAKE_EPOCH_MS) << 22) | (self.node << 12) | self._sequence
+        return str(value).zfill(19)
+
+
+ID_GENERATORS = {
+    'ulid': UlidGenerator,
+    'snowflake': SnowflakeGenerator,
+}
+
+def create_id_generator(name=ID_GENERATOR, ingest_mode=INGEST_MODE):
+    """
+    ID生成器を作成
+
+    snowflakeのノード番号はコンテナごとのランダムな10ビットで、同時に動くコンテナ間で衝突しうる。
+    syncモードは条件付き書き込みで衝突を検出して再採番するが、queueモードの取り込み（BatchWriteItem）は
+    検出できずに既存のアイテムを上書きするため、queueモードではsnowflakeを使えない。
+    """
+    if name == 'snowflake' and ingest_mode == 'queue':
+        raise ValueError('ID_GENERATOR=snowflake cannot be used with INGEST_MODE=queue')
+    return ID_GENERATORS[name]()
+
+generate_item_id = create_id_generator()
+
+def _is_conditional_check_failed(error):
+    return error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+def with_created_day(item):
+    """日別インデックス用にcreatedAtの日付部分をcreatedDayとして設定"""
+    created_at = item.get('createdAt')
+    if isinstance(created_at, str) and len(created_at) >= 10 and 'createdDay' not in item:
+        return {**item, 'createdDay': created_at[:10]}
+    return item
+
+def new_item(body):
+    """リクエストボディに新しいIDと作成日時を付与"""
+    return with_created_day({
+        'id': generate_item_id(),
+        **body,
+        'createdAt': datetime.now().isoformat()
+    })
+
+def create_item(table, body):
+    """新しいIDでアイテムを作成（ID衝突時は再採番して再試行）"""
+    for attempt in range(CREATE_MAX_ATTEMPTS):
+        item = new_item(body)
+        try:
+            table.put_item(Item=item, ConditionExpression='attribute_not_exists(id)')
+            return item
+        except ClientError as e:
+            if not _is_conditional_check_failed(e) or attempt == CREATE_MAX_ATTEMPTS - 1:
+                raise
+
+# 置き換え（PUT・バッチ書き込み）で引き継ぐために読み込む属性
+REPLACE_ATTRIBUTES = (VERSION_ATTRIBUTE, 'createdAt', 'createdDay', TOMBSTONE_ATTRIBUTE)
+
+def replacement_item(item_id, body, current, now):
+    """
+    置き換え後のアイテム（現在のversionを1加算し、作成日時を引き継ぐ）
+
+    作成日時（createdAt / createdDay）は新規・削除済みのアイテムでは現在時刻とする。
+    """
+    created = {} if is_tombstone(current) else {
+        name: current[name] for name in ('createdAt', 'createdDay') if name in current
+    }
+    return with_created_day({
+        'id': item_id,
+        **body,
+        'createdAt': now,
+        **created,
+        VERSION_ATTRIBUTE: (current.get(VERSION_ATTRIBUTE) or 0) + 1,
+        'updatedAt': now
+    })
+
+def replace_item(table, item_id, body):
+    """
+    PUTでアイテムを置き換える（versionを引き継いで1加算）
+
+    現在のversionと作成日時を読み、書き込みまでにversionが変わっていない場合のみ置き換える
+    （競合時は読み直して再試行し、上限に達した場合はConditionalCheckFailedを送出）。
+    """
+    for attempt in range(CREATE_MAX_ATTEMPTS):
+        current = table.get_item(
+            Key={'id': item_id}, ConsistentRead=True, **projection_params(list(REPLACE_ATTRIBUTES))
+        ).get('Item') or {}
+        version = current.get(VERSION_ATTRIBUTE)
+        item = replacement_item(item_id, body, current, datetime.now().isoformat())
+        if version is None:
+            condition = {'ConditionExpression': 'attribute_not_exists(#version)'}
+        else:
+            condition = {
+                'ConditionExpression': '#version = :version',
+                'ExpressionAttributeValues': {':version': version},
+            }
+        try:
+            table.put_item(Item=item, ExpressionAttributeNames={'#version': VERSION_ATTRIBUTE}, **condition)
+            return item
+        except ClientError as e:
+            if not _is_conditional_check_failed(e) or attempt == CREATE_MAX_ATTEMPTS - 1:
+                raise
+
+
+class ItemCache:
+    """TTLとLRU追い出しを備えたアイテムキャッシュ（ウォームコンテナ内で共有）"""
+
+    def __init__(self, max_size, ttl_seconds, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """キャッシュからアイテムを取得（期限切れ・未登録はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ヒット・ミス数と現在の件数"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+item_cache = ItemCache(ITEM_CACHE_SIZE, ITEM_CACHE_TTL_SECONDS)
+idempotency_cache = ItemCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+
+def get_item_cached(table, item_id, fields=None):
+    """
+    キャッシュを経由してアイテムを取得（戻り値は (アイテム or None, キャッシュヒットか)）
+
+    fieldsを指定した場合、キャッシュにあればその場で属性を絞り込み、
+    なければProjectionExpressionで取得する（一部の属性のみのためキャッシュしない）。
+    """
+    if item_cache.enabled:
+        item = item_cache.get(item_id)
+        if item is not None:
+            if fields:
+                item = {name: item[name] for name in fields if name in item}
+            return item, True
+    if fields:
+        # 論理削除の判定のため削除日時も取得する
+        projection = projection_params(list(dict.fromkeys([*fields, TOMBSTONE_ATTRIBUTE])))
+        item = table.get_item(Key={'id': item_id}, **projection).get('Item')
+        if not item or is_tombstone(item):
+            return None, False
+        return {name: item[name] for name in fields if name in item}, False
+    response = table.get_item(Key={'id': item_id})
+    item = response.get('Item')
+    if not item or is_tombstone(item):
+        return None, False
+    item_cache.put(item_id, item)
+    return item, False
+
+def parse_fields(value, key_attributes=KEY_ATTRIBUTES):
+    """fieldsクエリパラメータ（カンマ区切り）を属性名のリストに変換（キー属性は常に含める）"""
+    if value is None:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    if not fields:
+        raise ValidationError('fields must not be empty')
+    if len(fields) > MAX_PROJECTION_FIELDS:
+        raise ValidationError(f'fields must contain at most {MAX_PROJECTION_FIELDS} names')
+    return list(dict.fromkeys([*key_attributes, *fields]))
+
+def projection_params(fields):
+    """属性名のリストをProjectionExpressionのパラメータに変換"""
+    if not fields:
+        return {}
+    names = {f'#p{i}': name for i, name in enumerate(fields)}
+    return {
+        'ProjectionExpression': ','.join(names),
+        'ExpressionAttributeNames': names,
+    }
+
+def _get_header(event, name):
+    """リクエストヘッダーを大文字小文字を区別せずに取得"""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+def compute_etag(body):
+    """レスポンスボディの内容からETagを生成"""
+    return '"%s"' % hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest()
+
+def encoded_etag(etag, encoding):
+    """圧縮したボディのETag（圧縮前のETagにエンコーディングの接尾辞を付ける）"""
+    return f'{etag[:-1]}-{encoding}"'
+
+def _matching_etag(if_none_match, etag):
+    """
+    If-None-Matchの中でetagと一致する値を返す（一致しなければNone）
+
+    圧縮したボディに付けた接尾辞付きのETagも、圧縮前のETagと同じ内容として一致させる。
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == '*':
+        return etag
+    for value in if_none_match.split(','):
+        candidate = value.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag or any(candidate == encoded_etag(etag, encoding) for encoding in COMPRESSORS):
+            return candidate
+    return None
+
+def conditional_response(event, body, headers=None):
+    """
+    ETagを付けた200レスポンスを作成（If-None-Matchが一致すれば304を返す）
+
+    304にはクライアントが保持している表現（圧縮の有無）のETagを返す。
+    """
+    etag = compute_etag(body)
+    matched = _matching_etag(_get_header(event, 'If-None-Match'), etag)
+    if matched is not None:
+        return create_raw_response(304, '', {'ETag': matched, **(headers or {})})
+    return create_raw_response(200, body, {'ETag': etag, **(headers or {})})
+
+def compile_update(body, now):
+    """
+    PATCHのリクエストボディをUpdateItemのパラメータに変換
+
+    - 値がnull以外の属性はSET、nullの属性はREMOVE
+    - "$add": {属性: 数値} はADD（アトミックカウンタ）
+    - "version" を指定した場合は現在のversionと一致する場合のみ更新する
+    - 値はITEM_SCHEMAで検証し、予約属性（id・作成日時・削除日時など）は更新できない
+    更新のたびにversionを1加算し、updatedAtを記録する。
+    """
+    if not isinstance(body, dict):
+        raise ValidationError('Request body must be a JSON object')
+    body = dict(body)
+    increments = body.pop('$add', {})
+    expected_version = body.pop(VERSION_ATTRIBUTE, None)
+    if not isinstance(increments, dict):
+        raise ValidationError('$add must be an object')
+    with request_metrics.timer('validate'):
+        ITEM_SCHEMA.validate_update(body, increments)
+    for name, value in increments.items():
+        if isinstance(value, bool) or not isinstance(value, (int, Decimal)):
+            raise ValidationError(f'$add value for {name} must be a number')
+        if name in body:
+            raise ValidationError(f'{name} cannot be both set and added')
+    if expected_version is not None and (
+        isinstance(expected_version, bool) or not isinstance(expected_version, (int, Decimal))
+    ):
+        raise ValidationError('version must be a number')
+    if not body and not increments:
+        raise ValidationError('No attributes to update')
+
+    names = {'#version': VERSION_ATTRIBUTE, '#updatedAt': 'updatedAt'}
+    values = {':zero': 0, ':one': 1, ':updatedAt': now}
+    set_clauses = [
+        '#version = if_not_exists(#version, :zero) + :one',
+        '#updatedAt = :updatedAt',
+    ]
+    remove_clauses = []
+    add_clauses = []
+    for i, (name, value) in enumerate(body.items()):
+        names[f'#a{i}'] = name
+        if value is None:
+            remove_clauses.append(f'#a{i}')
+        else:
+            values[f':a{i}'] = value
+            set_clauses.append(f'#a{i} = :a{i}')
+    for i, (name, value) in enumerate(increments.items()):
+        names[f'#n{i}'] = name
+        values[f':n{i}'] = value
+        add_clauses.append(f'#n{i} :n{i}')
+
+    expression = 'SET ' + ', '.join(set_clauses)
+    if remove_clauses:
+        expression += ' REMOVE ' + ', '.join(remove_clauses)
+    if add_clauses:
+        expression += ' ADD ' + ', '.join(add_clauses)
+
+    condition = 'attribute_exists(#key) AND attribute_not_exists(#deletedAt)'
+    names['#key'] = KEY_ATTRIBUTES[0]
+    names['#deletedAt'] = TOMBSTONE_ATTRIBUTE
+    if expected_version is not None:
+        condition += ' AND #version = :expectedVersion'
+        values[':expectedVersion'] = expected_version
+
+    return {
+        'UpdateExpression': expression,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ReturnValues': 'UPDATED_NEW',
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD',
+    }
+
+def patch_item(table, event, item_id):
+    """UpdateItemでアイテムを部分更新"""
+    body = load_item_body(event)
+    params = compile_update(body, datetime.now().isoformat())
+    try:
+        response = table.update_item(Key={'id': item_id}, **params)
+    except ClientError as e:
+        if not _is_conditional_check_failed(e):
+            raise
+        current = e.response.get('Item')
+        if not current or is_tombstone(current):
+            return create_response(404, {'message': 'Item not found'})
+        version = current.get(VERSION_ATTRIBUTE)
+        return create_response(409, {
+            'message': 'Version conflict',
+            'currentVersion': TypeDeserializer().deserialize(version) if version else None,
+        })
+    return create_response(200, {'id': item_id, **response.get('Attributes', {})})
+
+def encode_page_token(key):
+    """LastEvaluatedKeyを不透明なページトークンに変換"""
+    raw = json.dumps(key, cls=DecimalEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_page_token(token, key_attributes=KEY_ATTRIBUTES):
+    """ページトークンをExclusiveStartKeyに復元（キー属性が検索方法と一致するものだけ受け付ける）"""
     try:
-        table = _get_table()
-        method = event['httpMethod']
-        path = event['path']
-        path_parameters = event.get('pathParameters') or {}
-        item_id = path_parameters.get('id')
-
-        if method == 'GET':
-            if item_id:
-                # 単一アイテム取得
-                response = table.get_item(Key={'id': item_id})
-                item = response.get('Item')
-                if item:
-                    return create_response(200, item)
+        padded = token + '=' * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')), parse_float=Decimal)
+    except (ValueError, TypeError):
+        raise ValidationError('Invalid nextToken')
+    if (not isinstance(key, dict) or set(key) != set(key_attributes)
+            or not all(isinstance(value, str) and value for value in key.values())):
+        raise ValidationError('Invalid nextToken')
+    return key
+
+def _parse_limit(value):
+    """limitクエリパラメータを検証して件数に変換"""
+    if value is None:
+        return DEFAULT_PAGE_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValidationError('limit must be an integer')
+    if limit < 1:
+        raise ValidationError('limit must be greater than 0')
+    return min(limit, MAX_PAGE_LIMIT)
+
+def build_page(fetch, limit, start_key=None, max_bytes=None, key_attributes=KEY_ATTRIBUTES):
+    """
+    1ページ分のアイテムをシリアライズ済みの断片として組み立てる
+
+    fetch(Limit, ExclusiveStartKey)でDynamoDBのページを順に取得し、件数(limit)か
+    バイト数(max_bytes)のどちらかに達した時点で打ち切る。
+    戻り値は (JSON断片のリスト, 次ページの開始キー or None)。
+    """
+    if max_bytes is None:
+        max_bytes = MAX_RESPONSE_BYTES
+    fragments = []
+    size = 0
+    next_key = start_key
+    last_key = None
+
+    while len(fragments) < limit:
+        params = {'Limit': limit - len(fragments)}
+        if next_key:
+            params['ExclusiveStartKey'] = next_key
+        response = fetch(**params)
+        next_key = response.get('LastEvaluatedKey')
+
+        with request_metrics.timer('serialize'):
+            for item in response.get('Items', []):
+                if is_reserved_id(item.get('id')):
+                    continue
+                fragment = dumps(item)
+                fragment_size = len(fragment.encode('utf-8')) + 1
+                if fragments and size + fragment_size > max_bytes:
+                    # 予算超過: 直前に返したアイテムの位置から次ページを再開する
+                    return fragments, last_key
+                fragments.append(fragment)
+                size += fragment_size
+                last_key = {name: item[name] for name in key_attributes if name in item}
+
+        if not next_key:
+            break
+
+    return fragments, next_key
+
+def _parse_segments(value):
+    """segmentsクエリパラメータを検証してセグメント数に変換"""
+    if value is None:
+        return DEFAULT_SCAN_SEGMENTS
+    try:
+        segments = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError('segments must be an integer')
+    if not 1 <= segments <= MAX_SCAN_SEGMENTS:
+        raise ValidationError(f'segments must be between 1 and {MAX_SCAN_SEGMENTS}')
+    return segments
+
+def parallel_scan(scan, total_segments, max_workers=None, **scan_kwargs):
+    """
+    Segment/TotalSegmentsによる並列スキャンを行い、全セグメントのアイテムを順次返すジェネレータ
+
+    各セグメントは全ページを読み切るまでスレッドプール上でスキャンされ、
+    取得したページはキュー経由で呼び出し側に流れる。キューは有限長のため、
+    呼び出し側の消費が遅い場合はワーカー側が待機しメモリ使用量が抑えられる。
+    """
+    if max_workers is None:
+        max_workers = SCAN_MAX_WORKERS
+    max_workers = max(1, min(max_workers, total_segments))
+    pages = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+
+    def put(value):
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker(segment):
+        params = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+        try:
+            while not stop.is_set():
+                response = scan(**params)
+                put(response.get('Items', []))
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    break
+                params['ExclusiveStartKey'] = last_key
+        except Exception as e:
+            put(e)
+        finally:
+            put(_SEGMENT_DONE)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for segment in range(total_segments):
+                executor.submit(worker, segment)
+            remaining = total_segments
+            while remaining:
+                page = pages.get()
+                if page is _SEGMENT_DONE:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
                 else:
-                    return create_response(404, {'message': 'Item not found'})
+                    yield from page
+        finally:
+            # 途中終了時にワーカーを止める
+            stop.set()
+
+def export_items(table, query_parameters):
+    """
+    並列スキャンで全アイテムを取得
+
+    結果は1つのレスポンスにまとめて返すため、MAX_RESPONSE_BYTESを超えるテーブルは413とし、
+    POST /items:export（S3へのエクスポート）を案内する。
+    """
+    segments = _parse_segments(query_parameters.get('segments'))
+    fields = parse_fields(query_parameters.get('fields'))
+
+    fragments = []
+    size = 0
+    for item in parallel_scan(table.scan, segments, **_merge_expressions(projection_params(fields), live_filter())):
+        if is_reserved_id(item.get('id')):
+            continue
+        with request_metrics.timer('serialize'):
+            fragment = dumps(item)
+        size += len(fragment.encode('utf-8')) + 1
+        if size > MAX_RESPONSE_BYTES:
+            return create_response(413, {
+                'message': 'Export is too large for a single response; use POST /items:export or limit/nextToken paging'
+            })
+        fragments.append(fragment)
+
+    body = '{"items":[%s],"count":%d}' % (','.join(fragments), len(fragments))
+    return create_raw_response(200, body)
+
+def list_items(table, event, query_parameters):
+    """全アイテムをページ単位で取得"""
+    limit = _parse_limit(query_parameters.get('limit'))
+    token = query_parameters.get('nextToken')
+    start_key = decode_page_token(token) if token else None
+    params = _merge_expressions(projection_params(parse_fields(query_parameters.get('fields'))), live_filter())
+
+    fragments, next_key = build_page(lambda **page: table.scan(**params, **page), limit, start_key)
+    next_token = encode_page_token(next_key) if next_key else None
+    body = '{"items":[%s],"count":%d,"nextToken":%s}' % (
+        ','.join(fragments), len(fragments), json.dumps(next_token)
+    )
+    return conditional_response(event, body)
+
+def _parse_timestamp(value, name):
+    """ISO 8601形式の日時を検証して正規化"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValidationError(f'{name} must be an ISO 8601 timestamp')
+
+def _merge_expressions(*params_list):
+    """ExpressionAttributeNames/Valuesを持つパラメータをまとめる"""
+    merged = {}
+    for params in params_list:
+        for key, value in params.items():
+            if key in ('ExpressionAttributeNames', 'ExpressionAttributeValues'):
+                merged.setdefault(key, {}).update(value)
             else:
-                # 全アイテム取得
-                response = table.scan()
-                items = response.get('Items', [])
-                return create_response(200, items)
-
-        elif method == 'POST':
-            # アイテム作成
-            body = json.loads(event.get('body', '{}'))
-            new_item = {
-                'id': str(int(datetime.now().timestamp() * 1000)),
-                **body,
-                'createdAt': datetime.now().isoformat()
-            }
-            table.put_item(Item=new_item)
-            return create_response(201, new_item)
-
-        elif method == 'PUT':
-            # アイテム更新
-            if not item_id:
-                return create_response(400, {'message': 'ID is required'})
-            
-            body = json.loads(event.get('body', '{}'))
-            updated_item = {
-                'id': item_id,
-                **body,
-                'updatedAt': datetime.now().isoformat()
+                merged[key] = value
+    return merged
+
+def _created_range(after, before, names, values):
+    """createdAtの範囲条件を組み立てる"""
+    names['#createdAt'] = 'createdAt'
+    if after and before:
+        values[':after'] = after
+        values[':before'] = before
+        return '#createdAt BETWEEN :after AND :before'
+    if after:
+        values[':after'] = after
+        return '#createdAt >= :after'
+    values[':before'] = before
+    return '#createdAt <= :before'
+
+def _day_buckets(after, before):
+    """createdAfter〜createdBefore（省略時は現在）の日付の一覧（上限を超える場合はNone）"""
+    start = datetime.fromisoformat(after).date()
+    end = datetime.fromisoformat(before).date() if before else datetime.now().date()
+    days = (end - start).days + 1
+    if days < 1 or days > MAX_DAY_BUCKETS:
+        return None
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+def plan_query(table, filters):
+    """
+    フィルタ条件から検索方法を決定する
+
+    戻り値は (プラン名, fetch関数, ページのキー属性)。fetch関数はbuild_pageから
+    Limit/ExclusiveStartKeyを受け取り、DynamoDBのレスポンス形式で結果を返す。
+    category/statusが指定されればそれぞれのインデックス、createdAfterの範囲が
+    MAX_DAY_BUCKETS日以内なら日別インデックスをQueryし、当てはまらない場合のみスキャンする。
+    QUERY_INDEXESに含まれないインデックスは使わない。
+    """
+    category = filters.get('category')
+    status = filters.get('status')
+    after = filters.get('createdAfter')
+    before = filters.get('createdBefore')
+
+    for index_name, attribute, value in (
+        (CATEGORY_INDEX, 'category', category),
+        (STATUS_INDEX, 'status', status),
+    ):
+        if value is None or index_name not in QUERY_INDEXES:
+            continue
+        names = {'#pk': attribute}
+        values = {':pk': value}
+        key_clauses = ['#pk = :pk']
+        if after or before:
+            key_clauses.append(_created_range(after, before, names, values))
+        filter_clauses = []
+        for other, other_value in (('category', category), ('status', status)):
+            if other != attribute and other_value is not None:
+                names[f'#{other}'] = other
+                values[f':{other}'] = other_value
+                filter_clauses.append(f'#{other} = :{other}')
+        params = {
+            'IndexName': index_name,
+            'KeyConditionExpression': ' AND '.join(key_clauses),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }
+        if filter_clauses:
+            params['FilterExpression'] = ' AND '.join(filter_clauses)
+        return f'query:{index_name}', lambda **page: table.query(**_merge_expressions(params, page)), (
+            *KEY_ATTRIBUTES, attribute, 'createdAt'
+        )
+
+    buckets = _day_buckets(after, before) if after and CREATED_DAY_INDEX in QUERY_INDEXES else None
+    if buckets:
+        def fetch_day_buckets(ExclusiveStartKey=None, **page):
+            # 各日付のパーティションを順にQueryする。日付の切り替わりは
+            # {'createdDay': 次の日付} のみの開始キーで表す
+            day = ExclusiveStartKey.get('createdDay') if ExclusiveStartKey else buckets[0]
+            if day not in buckets:
+                raise ValidationError('Invalid nextToken')
+            names = {'#pk': 'createdDay'}
+            values = {':pk': day}
+            params = {
+                'IndexName': CREATED_DAY_INDEX,
+                'KeyConditionExpression': '#pk = :pk AND ' + _created_range(after, before, names, values),
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values,
             }
-            table.put_item(Item=updated_item)
-            return create_response(200, updated_item)
+            if ExclusiveStartKey and 'id' in ExclusiveStartKey:
+                params['ExclusiveStartKey'] = ExclusiveStartKey
+            response = table.query(**_merge_expressions(params, page))
+            if not response.get('LastEvaluatedKey') and day != buckets[-1]:
+                response = dict(response, LastEvaluatedKey={'createdDay': buckets[buckets.index(day) + 1]})
+            return response
+        return f'query:{CREATED_DAY_INDEX}', fetch_day_buckets, (*KEY_ATTRIBUTES, 'createdDay', 'createdAt')
+
+    # 該当するインデックスが無い場合はフィルタ付きスキャン
+    names = {}
+    values = {}
+    clauses = []
+    if after or before:
+        clauses.append(_created_range(after, before, names, values))
+    for attribute, value in (('category', category), ('status', status)):
+        if value is not None:
+            names[f'#{attribute}'] = attribute
+            values[f':{attribute}'] = value
+            clauses.append(f'#{attribute} = :{attribute}')
+    params = live_filter({
+        'FilterExpression': ' AND '.join(clauses),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+    })
+    return 'scan', lambda **page: table.scan(**_merge_expressions(params, page)), KEY_ATTRIBUTES
+
+def parse_filters(values):
+    """検索条件（category/status/createdAfter/createdBefore）を検証してplan_queryの形式に変換"""
+    for name in QUERY_FILTERS:
+        if values.get(name) is not None and not isinstance(values[name], str):
+            raise ValidationError(f'{name} must be a string')
+    created_after = _parse_timestamp(values.get('createdAfter'), 'createdAfter')
+    created_before = _parse_timestamp(values.get('createdBefore'), 'createdBefore')
+    # createdAtは文字列で比較されるため、範囲も同じ比較で検証する（BETWEENは逆順の範囲を拒否する）
+    if created_after and created_before and created_after > created_before:
+        raise ValidationError('createdAfter must not be later than createdBefore')
+    return {
+        'category': values.get('category'),
+        'status': values.get('status'),
+        'createdAfter': created_after,
+        'createdBefore': created_before,
+    }
+
+def query_items(table, event, query_parameters):
+    """フィルタ条件に合うアイテムをインデックスを使って取得"""
+    limit = _parse_limit(query_parameters.get('limit'))
+    plan, fetch, key_attributes = plan_query(table, parse_filters(query_parameters))
+    token = query_parameters.get('nextToken')
+    start_key = decode_page_token(token, key_attributes) if token else None
+    projection = projection_params(parse_fields(query_parameters.get('fields'), key_attributes))
+
+    fragments, next_key = build_page(lambda **page: fetch(**projection, **page), limit, start_key, key_attributes=key_attributes)
+    next_token = encode_page_token(next_key) if next_key else None
+    body = '{"items":[%s],"count":%d,"nextToken":%s}' % (
+        ','.join(fragments), len(fragments), json.dumps(next_token)
+    )
+    return conditional_response(event, body, {'X-Query-Plan': plan})
+
+def get_single_item(table, event, item_id, query_parameters):
+    """単一アイテムを取得"""
+    fields = parse_fields(query_parameters.get('fields'))
+    item, cache_hit = get_item_cached(table, item_id, fields)
+    if not item:
+        return create_response(404, {'message': 'Item not found'})
+    headers = {'X-Cache': 'HIT' if cache_hit else 'MISS'} if item_cache.enabled else None
+    with request_metrics.timer('serialize'):
+        body = dumps(item)
+    return conditional_response(event, body, headers)
+
+def _chunks(values, size):
+    """リストを指定サイズごとに分割"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def _backoff(attempt):
+    """指数バックオフ（フルジッター）で待機"""
+    time.sleep(random.uniform(0, min(BATCH_BACKOFF_MAX, BATCH_BACKOFF_BASE * (2 ** attempt))))
+
+# チャンクの実行方法の差し替え（非同期版のハンドラではイベントループ上の並行実行に切り替える）
+_chunk_runner = contextvars.ContextVar('chunk_runner', default=None)
+
+def _run_chunks(func, chunks):
+    """チャンクを並列に処理し、結果を1つのリストにまとめる"""
+    runner = _chunk_runner.get()
+    if runner is not None:
+        return runner(func, chunks)
+    if len(chunks) == 1:
+        return func(chunks[0])
+    results = []
+    with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(chunks))) as executor:
+        for chunk_results in executor.map(func, chunks):
+            results.extend(chunk_results)
+    return results
+
+def _batch_get_chunk(table, ids, fields=None, consistent=False, include_tombstones=False):
+    """
+    BatchGetItemで1チャンク分を取得（UnprocessedKeysは再試行）
+
+    fieldsを指定した場合はキー属性と合わせて射影して取得する。
+    """
+    # リソース経由のクライアントは型変換込みで、スレッド間で共有できる
+    client = table.meta.client
+    spec = {'Keys': [{'id': item_id} for item_id in ids]}
+    if fields:
+        spec.update(projection_params(list(dict.fromkeys([*KEY_ATTRIBUTES, *fields]))))
+    if consistent:
+        spec['ConsistentRead'] = True
+    request = {table.name: spec}
+    found = {}
+    error = 'Unprocessed'
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        if attempt:
+            _backoff(attempt)
+        try:
+            response = client.batch_get_item(RequestItems=request)
+        except ClientError as e:
+            # このチャンクの未取得分のみ失敗とし、他のチャンクの結果は返す
+            print(f'Error: {str(e)}')
+            error = str(e)
+            break
+        for item in response.get('Responses', {}).get(table.name, []):
+            if include_tombstones or not is_tombstone(item):
+                found[item['id']] = item
+        request = response.get('UnprocessedKeys') or {}
+        if not request:
+            break
+
+    unprocessed = {
+        key['id'] for key in request.get(table.name, {}).get('Keys', [])
+    }
+    results = []
+    for item_id in ids:
+        if item_id in found:
+            results.append({'id': item_id, 'success': True, 'item': found[item_id]})
+        elif item_id in unprocessed:
+            results.append({'id': item_id, 'success': False, 'error': error})
+        else:
+            results.append({'id': item_id, 'success': False, 'error': 'Item not found'})
+    return results
+
+def _batch_write_chunk(table, requests):
+    """BatchWriteItemで1チャンク分を書き込み（UnprocessedItemsは再試行）"""
+    client = table.meta.client
+    pending = {table.name: [request for _, request in requests]}
+    for item_id, _ in requests:
+        item_cache.invalidate(item_id)
+    error = 'Unprocessed'
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        if attempt:
+            _backoff(attempt)
+        try:
+            response = client.batch_write_item(RequestItems=pending)
+        except ClientError as e:
+            # このチャンクの未書き込み分のみ失敗とし、他のチャンクの結果は返す
+            print(f'Error: {str(e)}')
+            error = str(e)
+            break
+        pending = response.get('UnprocessedItems') or {}
+        if not pending:
+            break
+
+    unprocessed = set()
+    for request in pending.get(table.name, []):
+        if 'PutRequest' in request:
+            unprocessed.add(request['PutRequest']['Item']['id'])
+        else:
+            unprocessed.add(request['DeleteRequest']['Key']['id'])
+    return [
+        {'id': item_id, 'success': False, 'error': error} if item_id in unprocessed
+        else {'id': item_id, 'success': True}
+        for item_id, _ in requests
+    ]
+
+def _batch_replace_chunk(table, entries):
+    """
+    バッチ書き込みの1チャンク分を、PUTと同じく現在のversion・作成日時を引き継いで置き換える
+
+    現在の値はBatchGetItem（強い整合性・射影）でまとめて読み込む。BatchWriteItemには条件を
+    付けられないため、読み込みから書き込みまでの間の他の更新は上書きする。
+    """
+    ids = [item_id for item_id, _ in entries]
+    current = {}
+    results = []
+    for result in _batch_get_chunk(table, ids, REPLACE_ATTRIBUTES, consistent=True, include_tombstones=True):
+        if result['success']:
+            current[result['id']] = result['item']
+        elif result['error'] != 'Item not found':
+            # 現在の値を読めなかったアイテムは書き込まない
+            results.append(result)
+    failed = {result['id'] for result in results}
+    now = datetime.now().isoformat()
+    requests = [
+        (item_id, {'PutRequest': {'Item': replacement_item(item_id, body, current.get(item_id, {}), now)}})
+        for item_id, body in entries if item_id not in failed
+    ]
+    return results + (_batch_write_chunk(table, requests) if requests else [])
+
+def enqueue_item(item):
+    """作成するアイテムを取り込みキューに登録"""
+    _get_sqs().send_message(QueueUrl=INGEST_QUEUE_URL, MessageBody=dumps(item))
+    return item
+
+def ingest_handler(event, context):
+    """
+    取り込みキュー(SQS)のメッセージをBatchWriteItemでまとめて書き込む
+
+    書き込めなかったメッセージのみ batchItemFailures として返し、
+    SQSイベントソースの部分的なバッチ失敗レポートで再配信させる。
+    """
+    table = _get_table()
+    failures = []
+    requests = {}
+    message_ids = {}
+    for record in event.get('Records') or []:
+        try:
+            item = json.loads(record['body'], parse_float=Decimal)
+            item_id = item['id']
+            if not isinstance(item_id, str) or not item_id:
+                raise ValueError('ID is required')
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Invalid message {record['messageId']}: {str(e)}")
+            failures.append(record['messageId'])
+            continue
+        # 同一IDが複数ある場合は最後のものを採用
+        requests.pop(item_id, None)
+        requests[item_id] = {'PutRequest': {'Item': item}}
+        message_ids.setdefault(item_id, []).append(record['messageId'])
+
+    results = []
+    if requests:
+        results = _run_chunks(
+            lambda chunk: _batch_write_chunk(table, chunk),
+            _chunks(list(requests.items()), BATCH_WRITE_CHUNK_SIZE),
+        )
+    for result in results:
+        if not result['success']:
+            failures.extend(message_ids[result['id']])
+    print(json.dumps({
+        'message': 'ingest',
+        'received': len(event.get('Records') or []),
+        'written': sum(result['success'] for result in results),
+        'failed': len(failures),
+    }))
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
+def idempotency_key(event):
+    """Idempotency-Keyヘッダーの値（指定なしはNone）"""
+    key = _get_header(event, IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValidationError(f'{IDEMPOTENCY_HEADER} must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+    return key
+
+def request_fingerprint(event):
+    """同じキーで異なるリクエストが送られたことを検出するためのボディのハッシュ"""
+    return hashlib.sha256((event.get('body') or '').encode('utf-8')).hexdigest()
+
+def _cancellation_codes(error):
+    """TransactionCanceledExceptionのアクションごとの失敗理由"""
+    if error.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+        return []
+    return [reason.get('Code') for reason in error.response.get('CancellationReasons') or []]
+
+def find_idempotency_record(table, record_id):
+    """記録をコンテナ内キャッシュ、なければテーブルから取得"""
+    record = idempotency_cache.get(record_id)
+    if record is None:
+        record = table.get_item(Key={'id': record_id}, ConsistentRead=True).get('Item')
+        if record is not None:
+            idempotency_cache.put(record_id, record)
+    return record
+
+def replay_response(record, fingerprint):
+    """記録した初回の応答を返す（同じキーで異なるボディの場合は422）"""
+    if record['fingerprint'] != fingerprint:
+        return create_response(422, {'message': f'{IDEMPOTENCY_HEADER} was used with a different request body'})
+    return create_response(int(record['statusCode']), record['response'], {'Idempotent-Replayed': 'true'})
+
+def create_item_idempotent(table, event, body, key):
+    """
+    Idempotency-Key付きのアイテム作成
+
+    初回はアイテムと応答の記録を1つのトランザクションで条件付き書き込みする
+    （queueモードでは記録を書き込んでからキューに登録する）。
+    同じキーの再送は記録の読み込みのみで初回の応答を返し、アイテムを書き込まない。
+    """
+    record_id = IDEMPOTENCY_PREFIX + key
+    fingerprint = request_fingerprint(event)
+    records = _get_control_table(table)
+    record = find_idempotency_record(records, record_id)
+    if record is not None:
+        return replay_response(record, fingerprint)
+    max_item_bytes = ITEM_SCHEMA.max_item_bytes - IDEMPOTENCY_RECORD_BYTES
+    if item_size(body) > max_item_bytes:
+        raise ValidationError(f'Item exceeds the maximum size of {max_item_bytes} bytes when {IDEMPOTENCY_HEADER} is used')
+
+    status_code = 202 if INGEST_MODE == 'queue' else 201
+    for attempt in range(CREATE_MAX_ATTEMPTS):
+        item = new_item(body)
+        record = {
+            'id': record_id,
+            'fingerprint': fingerprint,
+            'statusCode': status_code,
+            'response': item,
+            TTL_ATTRIBUTE: int(time.time()) + IDEMPOTENCY_TTL_SECONDS,
+        }
+        try:
+            if INGEST_MODE == 'queue':
+                records.put_item(Item=record, ConditionExpression='attribute_not_exists(id)')
+            else:
+                table.meta.client.transact_write_items(TransactItems=[
+                    {'Put': {'TableName': records.name, 'Item': record, 'ConditionExpression': 'attribute_not_exists(id)'}},
+                    {'Put': {'TableName': table.name, 'Item': item, 'ConditionExpression': 'attribute_not_exists(id)'}},
+                ])
+            break
+        except ClientError as e:
+            codes = _cancellation_codes(e)
+            if _is_conditional_check_failed(e) or codes[:1] == ['ConditionalCheckFailed']:
+                # 同じキーの並行リクエストが先に記録した（読み込むまでに記録が削除された場合は書き込みを再試行）
+                record = find_idempotency_record(records, record_id)
+                if record is not None:
+                    return replay_response(record, fingerprint)
+                if attempt == CREATE_MAX_ATTEMPTS - 1:
+                    return create_response(409, {'message': f'A request with the same {IDEMPOTENCY_HEADER} is in progress'})
+                continue
+            # アイテムのID衝突時は再採番して再試行
+            if codes[1:2] != ['ConditionalCheckFailed'] or attempt == CREATE_MAX_ATTEMPTS - 1:
+                raise
+
+    if INGEST_MODE == 'queue':
+        try:
+            enqueue_item(item)
+        except Exception:
+            # 登録できなかった場合は再送で作成し直せるよう記録を削除する
+            records.delete_item(Key={'id': record_id})
+            raise
+    idempotency_cache.put(record_id, record)
+    return create_response(status_code, item)
+
+def is_reserved_id(item_id):
+    """集計レコード・処理済みマーカー用の予約済みIDかどうか"""
+    return isinstance(item_id, str) and item_id.startswith(RESERVED_ID_PREFIX)
+
+def is_tombstone(item):
+    """論理削除されたアイテム（TTLによる削除待ち）かどうか"""
+    return TOMBSTONE_ATTRIBUTE in item
+
+def live_filter(params=None):
+    """スキャンの条件に論理削除されたアイテムを除く条件を加える"""
+    params = dict(params or {})
+    clause = 'attribute_not_exists(#deletedAt)'
+    expression = params.get('FilterExpression')
+    params['FilterExpression'] = f'({expression}) AND {clause}' if expression else clause
+    params['ExpressionAttributeNames'] = {**params.get('ExpressionAttributeNames', {}), '#deletedAt': TOMBSTONE_ATTRIBUTE}
+    return params
+
+def soft_delete_item(table, item_id):
+    """
+    アイテムをトゥームストーンに置き換える（戻り値は論理削除したかどうか）
+
+    削除日時とTTLの期限を記録し、GSIのキー属性を取り除いてインデックスから外す。
+    実際の削除は期限後にDynamoDBのTTLがバックグラウンドで行う（書き込みキャパシティを消費しない）。
+    存在しないアイテム・削除済みのアイテムは何もしない。
+    """
+    names = {'#id': 'id', '#deletedAt': TOMBSTONE_ATTRIBUTE, '#ttl': TTL_ATTRIBUTE}
+    names.update({f'#k{i}': name for i, name in enumerate(INDEX_KEY_ATTRIBUTES)})
+    item_cache.invalidate(item_id)
+    try:
+        table.update_item(
+            Key={'id': item_id},
+            UpdateExpression='SET #deletedAt = :now, #ttl = :ttl REMOVE ' + ', '.join(
+                f'#k{i}' for i in range(len(INDEX_KEY_ATTRIBUTES))
+            ),
+            ConditionExpression='attribute_exists(#id) AND attribute_not_exists(#deletedAt)',
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={
+                ':now': datetime.now().isoformat(),
+                ':ttl': int(time.time()) + TOMBSTONE_TTL_SECONDS,
+            },
+        )
+    except ClientError as e:
+        if not _is_conditional_check_failed(e):
+            raise
+        return False
+    return True
+
+def _soft_delete_chunk(table, ids):
+    """1チャンク分のアイテムを順に論理削除"""
+    results = []
+    for item_id in ids:
+        try:
+            deleted = soft_delete_item(table, item_id)
+        except ClientError as e:
+            results.append({'id': item_id, 'success': False, 'error': str(e)})
+            continue
+        results.append({'id': item_id, 'success': True} if deleted else
+                       {'id': item_id, 'success': False, 'error': 'Item not found'})
+    return results
+
+def find_matching_ids(table, filters, limit):
+    """
+    フィルタ条件に合うアイテムのIDをlimit件まで取得（戻り値は (IDのリスト, 残りがあるか)）
+
+    検索方法は一覧取得と同じplan_queryで決め、IDのみを射影して読み込む。
+    """
+    _, fetch, _ = plan_query(table, filters)
+    params = projection_params(list(KEY_ATTRIBUTES))
+    ids = []
+    while len(ids) < limit:
+        response = fetch(Limit=limit - len(ids), **params)
+        ids.extend(item['id'] for item in response.get('Items', []) if not is_reserved_id(item['id']))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return ids, False
+        params['ExclusiveStartKey'] = last_key
+    return ids, True
+
+def _stream_image(record, name):
+    image = record['dynamodb'].get(name)
+    if not image:
+        return None
+    if TOMBSTONE_ATTRIBUTE in image:
+        # 論理削除されたアイテムは削除済みとして集計する
+        return None
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in image.items()}
+
+def _recent_entry(item):
+    return {
+        'id': item['id'],
+        'name': item.get('name'),
+        'category': item.get('category'),
+        'updatedAt': item.get('updatedAt') or item.get('createdAt'),
+    }
+
+def aggregate_stream_records(records):
+    """
+    ストリームレコードから集計の差分を計算
+
+    戻り値は (件数の増減, カテゴリ別件数の増減, 最近更新されたアイテムの変更)。
+    アイテムの変更はID → 一覧の項目（削除されたアイテムはNone）で、後のレコードが優先される。
+    """
+    count = 0
+    categories = {}
+    touched = {}
+    for record in records:
+        old = _stream_image(record, 'OldImage')
+        new = _stream_image(record, 'NewImage')
+        if old is None and new is None:
+            # 削除済み（トゥームストーン）のTTLによる削除
+            continue
+        if old is None and new is not None:
+            count += 1
+        elif old is not None and new is None:
+            count -= 1
+        old_category = (old or {}).get('category')
+        new_category = (new or {}).get('category')
+        if old_category != new_category:
+            if old_category is not None:
+                categories[old_category] = categories.get(old_category, 0) - 1
+            if new_category is not None:
+                categories[new_category] = categories.get(new_category, 0) + 1
+        item_id = (new or old)['id']
+        touched.pop(item_id, None)
+        touched[item_id] = _recent_entry(new) if new is not None else None
+    return count, {k: v for k, v in categories.items() if v}, touched
+
+def merge_recent(entries, touched):
+    """最近更新されたアイテムの一覧に変更を反映し、更新日時の新しい順にRECENT_ITEMS_LIMIT件に絞る"""
+    merged = {entry['id']: entry for entry in entries}
+    for item_id, entry in touched.items():
+        merged.pop(item_id, None)
+        if entry is not None:
+            merged[item_id] = entry
+    ordered = sorted(merged.values(), key=lambda entry: entry.get('updatedAt') or '', reverse=True)
+    return ordered[:RECENT_ITEMS_LIMIT]
+
+def _apply_stream_chunk(table, records, markers=None):
+    """
+    1チャンク分のストリームレコードを集計レコードに1つのトランザクションで反映
+
+    レコードごとの処理済みマーカー（markersのテーブル）を attribute_not_exists 条件付きで
+    同じトランザクションに含めるため、再送されたレコードはトランザクションの失敗として検出できる。
+    """
+    markers = markers or table
+    count, categories, touched = aggregate_stream_records(records)
+    now = datetime.now().isoformat()
+    expires_at = int(time.time()) + STREAM_MARKER_TTL_SECONDS
+    actions = [
+        {'Put': {
+            'TableName': markers.name,
+            'Item': {'id': STREAM_MARKER_PREFIX + record['eventID'], TTL_ATTRIBUTE: expires_at},
+            'ConditionExpression': 'attribute_not_exists(id)',
+        }}
+        for record in records
+    ]
+
+    deltas = {'itemCount': count}
+    deltas.update({CATEGORY_COUNT_PREFIX + name: delta for name, delta in categories.items()})
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        names = {f'#a{i}': name for i, name in enumerate(deltas)}
+        values = {f':a{i}': delta for i, delta in enumerate(deltas.values())}
+        actions.append({'Update': {
+            'TableName': table.name,
+            'Key': {'id': STATS_ID},
+            'UpdateExpression': 'SET updatedAt = :now ADD ' + ', '.join(
+                f'{name} {value}' for name, value in zip(names, values)
+            ),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': {**values, ':now': now},
+        }})
+
+    if touched:
+        current = table.get_item(Key={'id': RECENT_ID}, ConsistentRead=True).get('Item') or {}
+        version = current.get(VERSION_ATTRIBUTE)
+        put = {
+            'TableName': table.name,
+            'Item': {
+                'id': RECENT_ID,
+                'items': merge_recent(current.get('items') or [], touched),
+                'updatedAt': now,
+                VERSION_ATTRIBUTE: (version or 0) + 1,
+            },
+        }
+        if version is None:
+            put['ConditionExpression'] = 'attribute_not_exists(id)'
+        else:
+            put['ConditionExpression'] = '#v = :v'
+            put['ExpressionAttributeNames'] = {'#v': VERSION_ATTRIBUTE}
+            put['ExpressionAttributeValues'] = {':v': version}
+        actions.append({'Put': put})
+
+    table.meta.client.transact_write_items(TransactItems=actions)
+
+def stream_handler(event, context):
+    """
+    DynamoDB Streamsのレコードから集計レコード（件数・カテゴリ別件数・最近更新されたアイテム）を更新
+
+    処理済みのレコード（再送）は処理済みマーカーの条件で失敗するため除外し、
+    最近更新されたアイテムの一覧の競合（version不一致）は読み直して再試行する。
+    """
+    table = _get_table()
+    markers = _get_control_table(table)
+    records = [
+        record for record in event.get('Records') or []
+        if not is_reserved_id(record['dynamodb']['Keys']['id'].get('S'))
+    ]
+    applied = skipped = 0
+    for chunk in _chunks(records, STREAM_TRANSACT_CHUNK_SIZE):
+        for attempt in range(STREAM_MAX_ATTEMPTS):
+            if not chunk:
+                break
+            try:
+                _apply_stream_chunk(table, chunk, markers)
+                applied += len(chunk)
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException' or attempt == STREAM_MAX_ATTEMPTS - 1:
+                    raise
+                reasons = e.response.get('CancellationReasons') or []
+                duplicates = {
+                    record['eventID'] for record, reason in zip(chunk, reasons)
+                    if reason.get('Code') == 'ConditionalCheckFailed'
+                }
+                skipped += len(duplicates)
+                chunk = [record for record in chunk if record['eventID'] not in duplicates]
+                if not duplicates:
+                    _backoff(attempt + 1)
+    print(json.dumps({'message': 'stream', 'applied': applied, 'skipped': skipped}))
+    return {'applied': applied, 'skipped': skipped}
+
+def read_stats(table):
+    """集計レコードから件数とカテゴリ別件数を取得"""
+    item = table.get_item(Key={'id': STATS_ID}).get('Item') or {}
+    return {
+        'count': item.get('itemCount', 0),
+        'categories': {
+            name[len(CATEGORY_COUNT_PREFIX):]: value for name, value in sorted(item.items())
+            if name.startswith(CATEGORY_COUNT_PREFIX) and value
+        },
+        'updatedAt': item.get('updatedAt'),
+    }
+
+def read_recent(table):
+    """集計レコードから最近更新されたアイテムを取得"""
+    item = table.get_item(Key={'id': RECENT_ID}).get('Item') or {}
+    items = item.get('items') or []
+    return {'items': items, 'count': len(items), 'updatedAt': item.get('updatedAt')}
+
+def export_to_s3(table, segments=None, key=None):
+    """
+    並列スキャンで全アイテムをNDJSONとしてS3にマルチパートアップロードし、署名付きURLを返す
+
+    パートサイズ分のバッファだけを保持して順にアップロードするため、
+    テーブルの大きさによらずメモリ使用量は一定。
+    """
+    if not BULK_BUCKET:
+        raise RuntimeError('BULK_BUCKET is not configured')
+    client = _get_s3()
+    if key is None:
+        key = f'exports/{datetime.now().strftime("%Y%m%dT%H%M%S")}-{generate_item_id()}.ndjson'
+    upload_id = client.create_multipart_upload(
+        Bucket=BULK_BUCKET, Key=key, ContentType='application/x-ndjson'
+    )['UploadId']
+
+    parts = []
+    buffer = bytearray()
+    count = 0
+
+    def upload_part():
+        part_number = len(parts) + 1
+        response = client.upload_part(
+            Bucket=BULK_BUCKET, Key=key, UploadId=upload_id, PartNumber=part_number, Body=bytes(buffer)
+        )
+        parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        buffer.clear()
+
+    try:
+        for item in parallel_scan(table.scan, segments or DEFAULT_SCAN_SEGMENTS, **live_filter()):
+            if is_reserved_id(item.get('id')):
+                continue
+            buffer += dumps(item).encode('utf-8') + b'\n'
+            count += 1
+            if len(buffer) >= EXPORT_PART_SIZE:
+                upload_part()
+        if buffer or not parts:
+            upload_part()
+        client.complete_multipart_upload(
+            Bucket=BULK_BUCKET, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        client.abort_multipart_upload(Bucket=BULK_BUCKET, Key=key, UploadId=upload_id)
+        raise
+
+    url = client.generate_presigned_url(
+        'get_object', Params={'Bucket': BULK_BUCKET, 'Key': key}, ExpiresIn=PRESIGNED_URL_TTL_SECONDS
+    )
+    return {'bucket': BULK_BUCKET, 'key': key, 'count': count, 'parts': len(parts), 'url': url}
+
+def import_from_s3(table, key):
+    """
+    S3のNDJSONを1行ずつ読み込み、BatchWriteItemでまとめて書き込む
+
+    IMPORT_FLUSH_SIZE 件ごとに書き込むため、オブジェクトの大きさによらずメモリ使用量は一定。
+    不正な行は書き込まずにエラーとして返す（同一IDは後の行を採用）。
+    """
+    if not BULK_BUCKET:
+        raise RuntimeError('BULK_BUCKET is not configured')
+    body = _get_s3().get_object(Bucket=BULK_BUCKET, Key=key)['Body']
+    summary = {'key': key, 'imported': 0, 'failed': 0, 'errors': []}
+    pending = {}
+
+    def error(line_number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < IMPORT_MAX_ERRORS:
+            summary['errors'].append({'line': line_number, 'error': message})
+
+    def flush():
+        results = _run_chunks(
+            lambda chunk: _batch_write_chunk(table, chunk),
+            _chunks(list(pending.items()), BATCH_WRITE_CHUNK_SIZE),
+        )
+        for result in results:
+            if result['success']:
+                summary['imported'] += 1
+            else:
+                error(None, f"{result['id']}: {result['error']}")
+        pending.clear()
+
+    for line_number, line in enumerate(body.iter_lines(), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line, parse_float=Decimal)
+        except ValueError:
+            error(line_number, 'Invalid JSON')
+            continue
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(item_id, str) or not item_id or is_reserved_id(item_id):
+            error(line_number, 'Invalid ID')
+            continue
+        pending.pop(item_id, None)
+        pending[item_id] = {'PutRequest': {'Item': with_created_day(item)}}
+        if len(pending) >= IMPORT_FLUSH_SIZE:
+            flush()
+    if pending:
+        flush()
+    return summary
+
+def _backfill_created_chunk(table, items):
+    """1チャンク分のアイテムに作成日時（createdAt / createdDay）を付与（既にある値は変えない）"""
+    results = []
+    for item in items:
+        created_at = item.get('createdAt') or item.get('updatedAt') or datetime.now().isoformat()
+        try:
+            table.update_item(
+                Key={'id': item['id']},
+                UpdateExpression='SET #createdAt = if_not_exists(#createdAt, :createdAt), '
+                                 '#createdDay = if_not_exists(#createdDay, :createdDay)',
+                # 並行して削除・論理削除されたアイテムは作り直さない
+                ConditionExpression='attribute_exists(#id) AND attribute_not_exists(#deletedAt)',
+                ExpressionAttributeNames={
+                    '#id': 'id', '#createdAt': 'createdAt', '#createdDay': 'createdDay',
+                    '#deletedAt': TOMBSTONE_ATTRIBUTE,
+                },
+                ExpressionAttributeValues={':createdAt': created_at, ':createdDay': created_at[:10]},
+            )
+        except ClientError as e:
+            if not _is_conditional_check_failed(e):
+                results.append({'id': item['id'], 'success': False, 'error': str(e)})
+            continue
+        results.append({'id': item['id'], 'success': True})
+    return results
+
+def backfill_created(table, segments=None):
+    """
+    作成日時（createdAt / createdDay）の無いアイテムに付与する（インデックスの追加前に実行）
+
+    インデックスのソートキー・日別のパーティションキーが無いアイテムはインデックスに載らず、
+    条件付き取得から漏れるため、並列スキャンで探してUpdateItemで補う。
+    createdAtが無いアイテムはupdatedAt（無ければ現在時刻）を作成日時とする。
+    """
+    names = {'#id': 'id', '#createdAt': 'createdAt', '#createdDay': 'createdDay', '#updatedAt': 'updatedAt'}
+    params = live_filter({
+        'FilterExpression': 'attribute_not_exists(#createdAt) OR attribute_not_exists(#createdDay)',
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+    })
+    summary = {'updated': 0, 'failed': 0, 'errors': []}
+    pending = []
+
+    def flush():
+        for result in _run_chunks(
+            lambda chunk: _backfill_created_chunk(table, chunk),
+            _chunks(pending, BATCH_WRITE_CHUNK_SIZE),
+        ):
+            if result['success']:
+                summary['updated'] += 1
+            else:
+                summary['failed'] += 1
+                if len(summary['errors']) < IMPORT_MAX_ERRORS:
+                    summary['errors'].append(result)
+        pending.clear()
+
+    for item in parallel_scan(table.scan, segments or DEFAULT_SCAN_SEGMENTS, **params):
+        if is_reserved_id(item.get('id')) or not isinstance(item.get('createdAt', ''), str):
+            continue
+        pending.append(item)
+        if len(pending) >= IMPORT_FLUSH_SIZE:
+            flush()
+    if pending:
+        flush()
+    print(json.dumps({'message': 'backfill', 'updated': summary['updated'], 'failed': summary['failed']}))
+    return summary
+
+def rebuild_aggregates(table, segments=None):
+    """
+    並列スキャン1回で集計レコード（#stats / #recent）を作り直す（ストリーム有効化時に実行）
+
+    集計はストリームの差分で更新されるため、既存のデータがあるテーブルでは空から始まり、
+    既存のアイテムの削除で件数が負になる。全アイテムを数え直して集計レコードを置き換える。
+    #recentはversionを進めて書き込むため、実行中のストリーム処理は読み直して再試行する。
+    """
+    names = {'#id': 'id', '#name': 'name', '#category': 'category', '#updatedAt': 'updatedAt', '#createdAt': 'createdAt'}
+    params = live_filter({'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names})
+    count = 0
+    categories = {}
+    recent = []
+    for item in parallel_scan(table.scan, segments or DEFAULT_SCAN_SEGMENTS, **params):
+        if is_reserved_id(item.get('id')):
+            continue
+        count += 1
+        category = item.get('category')
+        if category is not None:
+            categories[category] = categories.get(category, 0) + 1
+        recent.append(_recent_entry(item))
+        if len(recent) >= RECENT_ITEMS_LIMIT * 2:
+            recent = merge_recent(recent, {})
+    recent = merge_recent(recent, {})
+
+    now = datetime.now().isoformat()
+    stats = {'id': STATS_ID, 'itemCount': count, 'updatedAt': now}
+    stats.update({CATEGORY_COUNT_PREFIX + name: value for name, value in categories.items()})
+    table.put_item(Item=stats)
+    for attempt in range(STREAM_MAX_ATTEMPTS):
+        version = (table.get_item(Key={'id': RECENT_ID}, ConsistentRead=True).get('Item') or {}).get(VERSION_ATTRIBUTE)
+        condition = {'ConditionExpression': 'attribute_not_exists(id)'} if version is None else {
+            'ConditionExpression': '#v = :v',
+            'ExpressionAttributeNames': {'#v': VERSION_ATTRIBUTE},
+            'ExpressionAttributeValues': {':v': version},
+        }
+        try:
+            table.put_item(
+                Item={'id': RECENT_ID, 'items': recent, 'updatedAt': now, VERSION_ATTRIBUTE: (version or 0) + 1},
+                **condition,
+            )
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException' or attempt == STREAM_MAX_ATTEMPTS - 1:
+                raise
+            _backoff(attempt + 1)
+    print(json.dumps({'message': 'rebuild', 'count': count, 'categories': len(categories)}))
+    return {'count': count, 'categories': len(categories), 'recent': len(recent)}
+
+def bulk_handler(event, context):
+    """
+    一括インポート・エクスポートを直接呼び出しで実行するエントリーポイント
+
+    API Gatewayの統合タイムアウトを超える大きなテーブルの移行に使う。
+    event: {"action": "export", "segments": n, "key": "..."} / {"action": "import", "key": "..."}
+           / {"action": "backfill", "segments": n}（インデックス追加前の作成日時の補完）
+           / {"action": "rebuild", "segments": n}（集計レコードの作り直し）
+    """
+    table = _get_table()
+    action = event.get('action')
+    if action == 'export':
+        return export_to_s3(table, event.get('segments'), event.get('key'))
+    if action == 'import':
+        return import_from_s3(table, event['key'])
+    if action == 'backfill':
+        return backfill_created(table, event.get('segments'))
+    if action == 'rebuild':
+        return rebuild_aggregates(table, event.get('segments'))
+    raise ValueError(f'Unknown action: {action}')
+
+def _parse_batch_body(event, field):
+    """バッチ操作のリクエストボディから対象リストを取り出す"""
+    try:
+        body = parse_body(event, parse_float=Decimal, parse_constant=_reject_constant)
+    except ValueError:
+        raise ValidationError('Request body must be valid JSON')
+    values = body.get(field) if isinstance(body, dict) else None
+    if not isinstance(values, list) or not values:
+        raise ValidationError(f'{field} must be a non-empty list')
+    if len(values) > BATCH_MAX_ITEMS:
+        raise ValidationError(f'{field} must contain at most {BATCH_MAX_ITEMS} entries')
+    return values
+
+def _parse_batch_ids(event):
+    ids = _parse_batch_body(event, 'ids')
+    if not all(isinstance(item_id, str) and item_id for item_id in ids):
+        raise ValidationError('ids must be non-empty strings')
+    if any(is_reserved_id(item_id) for item_id in ids):
+        raise ValidationError(f'ids must not start with {RESERVED_ID_PREFIX!r}')
+    # 同一キーを1リクエストに含めるとDynamoDBがエラーを返すため重複を除く
+    return list(dict.fromkeys(ids))
+
+def _batch_response(results, **extra):
+    succeeded = sum(1 for result in results if result['success'])
+    return create_response(200, {
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        **extra,
+    })
+
+def _plan_batch_get(table, event):
+    """
+    バッチ取得をチャンク単位の処理に分解する
+
+    バッチ操作の plan 関数は (チャンク処理関数, チャンクのリスト, 事前に確定した結果) を返し、
+    同期版（スレッドプール）と非同期版（イベントループ）の両方から実行される。
+    """
+    ids = _parse_batch_ids(event)
+    return (
+        lambda chunk: _batch_get_chunk(table, chunk),
+        _chunks(ids, BATCH_GET_CHUNK_SIZE),
+        [],
+    )
+
+def _plan_batch_write(table, event):
+    """
+    バッチ書き込みをチャンク単位の処理に分解する
 
-        elif method == 'DELETE':
-            # アイテム削除
-            if not item_id:
-                return create_response(400, {'message': 'ID is required'})
-            
-            table.delete_item(Key={'id': item_id})
-            return create_response(200, {'message': 'Item deleted'})
+    各アイテムはPOST・PUTと同じスキーマで検証し、不正なアイテムのみ失敗として返す。
+    """
+    items = _parse_batch_body(event, 'items')
+    results = []
+    entries = {}
+    for item in items:
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(item_id, str) or not item_id:
+            results.append({'id': item_id, 'success': False, 'error': 'ID is required'})
+            continue
+        if is_reserved_id(item_id):
+            results.append({'id': item_id, 'success': False, 'error': 'Invalid ID'})
+            continue
+        try:
+            with request_metrics.timer('validate'):
+                body = ITEM_SCHEMA.validate(item, allowed={'id': item_id})
+        except ValidationError as e:
+            results.append({'id': item_id, 'success': False, 'error': str(e)})
+            continue
+        # 同一IDが複数ある場合は最後のものを採用
+        entries.pop(item_id, None)
+        entries[item_id] = {name: value for name, value in body.items() if name != 'id'}
+    return (
+        lambda chunk: _batch_replace_chunk(table, chunk),
+        _chunks(list(entries.items()), BATCH_WRITE_CHUNK_SIZE),
+        results,
+    )
 
+def _plan_batch_delete(table, event):
+    """バッチ削除をチャンク単位の処理に分解する（softモードでは単一削除と同じく論理削除）"""
+    ids = _parse_batch_ids(event)
+    if DELETE_MODE == 'soft':
+        return (
+            lambda chunk: _soft_delete_chunk(table, chunk),
+            _chunks(ids, BATCH_WRITE_CHUNK_SIZE),
+            [],
+        )
+    requests = [
+        (item_id, {'DeleteRequest': {'Key': {'id': item_id}}}) for item_id in ids
+    ]
+    return (
+        lambda chunk: _batch_write_chunk(table, chunk),
+        _chunks(requests, BATCH_WRITE_CHUNK_SIZE),
+        [],
+    )
+
+def _execute_batch(func, chunks, results):
+    """チャンクをスレッドプールで並列に処理してバッチ操作のレスポンスを作成"""
+    if chunks:
+        results = results + _run_chunks(func, chunks)
+    return _batch_response(results)
+
+# バッチ操作のルート（リソースパス → plan関数）
+BATCH_ROUTES = {
+    '/items:batchGet': _plan_batch_get,
+    '/items:batchWrite': _plan_batch_write,
+    '/items:batchDelete': _plan_batch_delete,
+}
+
+def _get_async_executor():
+    global _async_executor
+    if _async_executor is None:
+        _async_executor = ThreadPoolExecutor(max_workers=ASYNC_MAX_CONCURRENCY)
+    return _async_executor
+
+def _get_event_loop():
+    """ウォームコンテナ内で使い回すイベントループ"""
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop
+
+async def gather_limited(funcs, limit=None):
+    """
+    ブロッキングするDynamoDB呼び出しを同時実行数を制限して並行に実行
+
+    botocoreのクライアントはスレッドセーフなため、各呼び出しはスレッドプール上で実行し、
+    イベントループ側でセマフォによる同時実行数の制御と結果の待ち合わせを行う。
+    結果は funcs と同じ順序で返す。
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(limit or ASYNC_MAX_CONCURRENCY)
+    executor = _get_async_executor()
+
+    async def run(func):
+        async with semaphore:
+            return await loop.run_in_executor(executor, func)
+
+    return await asyncio.gather(*(run(func) for func in funcs))
+
+def json_default(obj):
+    """
+    標準のJSONエンコーダが扱えないDynamoDBの値を変換
+
+    エンコーダ（json / orjson）のC実装による1回の走査の中で、対象の値に対してのみ呼ばれる。
+    Decimalは整数値ならint、それ以外はfloatに変換する。セット型はリストに変換する。
+    """
+    if isinstance(obj, Decimal):
+        # floatへの変換1回で整数かを判定する（2^53以上はfloatで表せないためDecimalから変換）
+        value = float(obj)
+        if value.is_integer():
+            return int(value) if -MAX_SAFE_INTEGER < value < MAX_SAFE_INTEGER else int(obj)
+        return value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+# 呼び出しごとにエンコーダを作らないよう使い回す
+_json_encoder = json.JSONEncoder(default=json_default, ensure_ascii=False)
+
+def _dumps_json(value):
+    return _json_encoder.encode(value)
+
+def _dumps_orjson(value):
+    try:
+        return orjson.dumps(value, default=json_default).decode('utf-8')
+    except TypeError:
+        # orjsonは64ビットを超える整数を扱えないため、標準のjsonで変換し直す（DynamoDBの数値は38桁まで）
+        return _dumps_json(value)
+
+JSON_SERIALIZERS = {
+    'json': _dumps_json,
+    'orjson': _dumps_orjson,
+}
+
+def _select_serializer(name):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson' and orjson is None:
+        raise ImportError('orjson is not installed')
+    return JSON_SERIALIZERS[name]
+
+dumps = _select_serializer(JSON_SERIALIZER)
+
+def parse_body(event, **kwargs):
+    """リクエストボディのJSONを読み込む"""
+    body = event.get('body') or '{}'
+    with request_metrics.timer('parse'):
+        if event.get('isBase64Encoded'):
+            # binaryMediaTypes に一致したリクエストはbase64で渡される
+            body = base64.b64decode(body)
+        return json.loads(body, **kwargs)
+
+def _reject_constant(name):
+    raise ValueError(f'{name} is not allowed')
+
+def _attribute_size(value, depth=0):
+    """DynamoDBの属性値のサイズ（バイト数の概算）を計算し、数値の桁数とネストの深さを検証"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    # 桁数はboto3のシリアライズ（有効桁38桁で丸めが起きると例外）と同じく末尾の0も数える
+    if isinstance(value, Decimal):
+        digits = len(value.as_tuple().digits)
+    elif isinstance(value, bool) or value is None:
+        return 1
+    elif isinstance(value, int):
+        digits = len(str(abs(value)))
+    else:
+        if depth >= MAX_NESTING_DEPTH:
+            raise ValidationError(f'Attributes cannot be nested more than {MAX_NESTING_DEPTH} levels')
+        # リスト・マップは3バイト + 要素ごとに1バイト
+        size = 3
+        if isinstance(value, dict):
+            for name, element in value.items():
+                size += len(name.encode('utf-8')) + _attribute_size(element, depth + 1) + 1
         else:
-            return create_response(405, {'message': 'Method not allowed'})
+            for element in value:
+                size += _attribute_size(element, depth + 1) + 1
+        return size
+    if digits > MAX_NUMBER_DIGITS:
+        raise ValidationError(f'Numbers cannot have more than {MAX_NUMBER_DIGITS} significant digits')
+    # 有効桁2桁ごとに1バイト + 1バイト
+    return (digits + 1) // 2 + 1
+
+def item_size(item):
+    """アイテムのサイズ（属性名 + 属性値のバイト数の概算）"""
+    return sum(len(name.encode('utf-8')) + _attribute_size(value) for name, value in item.items())
+
+_FIELD_TYPES = {
+    'string': (lambda value: isinstance(value, str), 'a string'),
+    'number': (lambda value: isinstance(value, (int, Decimal)) and not isinstance(value, bool), 'a number'),
+    'boolean': (lambda value: isinstance(value, bool), 'a boolean'),
+    'array': (lambda value: isinstance(value, list), 'an array'),
+    'object': (lambda value: isinstance(value, dict), 'an object'),
+}
+
+def _compile_field(name, spec):
+    """属性の定義を (判定, エラーメッセージ) の列を評価する検証関数に変換"""
+    is_type, label = _FIELD_TYPES[spec['type']]
+    checks = [(is_type, f'{name} must be {label}')]
+    if 'minLength' in spec:
+        min_length = spec['minLength']
+        checks.append((lambda value: len(value) >= min_length, f'{name} must be at least {min_length} characters'))
+    if 'maxLength' in spec:
+        max_length = spec['maxLength']
+        checks.append((lambda value: len(value) <= max_length, f'{name} must be at most {max_length} characters'))
+    if 'minimum' in spec:
+        minimum = spec['minimum']
+        checks.append((lambda value: value >= minimum, f'{name} must be greater than or equal to {minimum}'))
+    if 'maximum' in spec:
+        maximum = spec['maximum']
+        checks.append((lambda value: value <= maximum, f'{name} must be less than or equal to {maximum}'))
+    if 'maxItems' in spec:
+        max_items = spec['maxItems']
+        checks.append((lambda value: len(value) <= max_items, f'{name} must have at most {max_items} items'))
+    validate_element = _compile_field(f'{name} items', spec['items']) if 'items' in spec else None
+
+    def validate(value):
+        for check, message in checks:
+            if not check(value):
+                raise ValidationError(message)
+        if validate_element is not None:
+            for element in value:
+                validate_element(element)
+    return validate
+
+
+class ItemSchema:
+    """
+    アイテムのリクエストボディのスキーマ
+
+    属性の定義はコンテナの初期化時に一度だけ検証関数へコンパイルしておき、
+    リクエストごとには属性名での辞書参照と判定の評価のみを行う。
+    """
+
+    def __init__(self, fields, reserved=(), max_item_bytes=MAX_ITEM_BYTES):
+        self.validators = {name: _compile_field(name, spec) for name, spec in fields.items()}
+        self.non_numeric = frozenset(name for name, spec in fields.items() if spec['type'] != 'number')
+        self.reserved = frozenset(reserved)
+        self.max_item_bytes = max_item_bytes
+
+    def validate(self, body, allowed=None):
+        """
+        ボディを検証して返す
+
+        allowed に {属性名: 値} を指定した予約属性は、値が一致する場合に限り許可する。
+        """
+        if not isinstance(body, dict):
+            raise ValidationError('Request body must be a JSON object')
+        for name in self.reserved.intersection(body):
+            if allowed is None or name not in allowed or body[name] != allowed[name]:
+                raise ValidationError(f'{name} cannot be set')
+        if '' in body:
+            raise ValidationError('Attribute names cannot be empty')
+        validators = self.validators
+        for name, value in body.items():
+            validate = validators.get(name)
+            if validate is not None:
+                validate(value)
+        if item_size(body) > self.max_item_bytes:
+            raise ValidationError(f'Item exceeds the maximum size of {self.max_item_bytes} bytes')
+        return body
+
+    def validate_update(self, values, increments):
+        """
+        部分更新（PATCH）のSET・ADDを検証する
+
+        予約属性は更新できず、SETの値は作成時と同じ検証関数で判定する（nullはREMOVEのため除く）。
+        ADDは数値以外の既知の属性には指定できない。
+        """
+        for name in self.reserved.intersection((*values, *increments)):
+            raise ValidationError(f'{name} cannot be updated')
+        if '' in values or '' in increments:
+            raise ValidationError('Attribute names cannot be empty')
+        validators = self.validators
+        for name, value in values.items():
+            validate = validators.get(name)
+            if validate is not None and value is not None:
+                validate(value)
+        for name in self.non_numeric.intersection(increments):
+            raise ValidationError(f'$add cannot be used for {name}')
+        if item_size(values) > self.max_item_bytes:
+            raise ValidationError(f'Item exceeds the maximum size of {self.max_item_bytes} bytes')
+
+
+ITEM_SCHEMA = ItemSchema(ITEM_FIELDS, RESERVED_ATTRIBUTES, MAX_ITEM_BYTES - SERVER_ATTRIBUTES_BYTES)
+
+def load_item_body(event):
+    """アイテムのリクエストボディを読み込む（ボディ長の上限を確認し、小数はDecimalとして読み込む）"""
+    body = event.get('body') or ''
+    limit = MAX_BODY_BYTES * 4 // 3 + 4 if event.get('isBase64Encoded') else MAX_BODY_BYTES
+    if len(body) > limit:
+        raise ValidationError(f'Request body exceeds the maximum size of {MAX_BODY_BYTES} bytes')
+    try:
+        return parse_body(event, parse_float=Decimal, parse_constant=_reject_constant)
+    except ValueError:
+        raise ValidationError('Request body must be valid JSON')
+
+def parse_item(event, allowed=None):
+    """
+    アイテムのリクエストボディを読み込んでスキーマで検証
+
+    DynamoDBへの呼び出し前に不正なボディを400で拒否する。
+    """
+    body = load_item_body(event)
+    with request_metrics.timer('validate'):
+        return ITEM_SCHEMA.validate(body, allowed)
+
+class Router:
+    """
+    (httpMethod, resource) をキーにしたルーティングテーブル
+
+    ルートごとのミドルウェアは登録時に一度だけハンドラへ合成しておき、
+    呼び出し時は辞書の参照のみでハンドラを決定する。
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.resources = set()
+
+    def route(self, method, resource, middleware=()):
+        """ハンドラを登録するデコレータ（middlewareは先頭が最も外側）"""
+        def register(func):
+            handler = func
+            for wrap in reversed(middleware):
+                handler = wrap(handler)
+            self.routes[(method, resource)] = handler
+            self.resources.add(resource)
+            return func
+        return register
+
+    def resolve(self, method, resource):
+        """リクエストに対応するハンドラを返す（未登録なら404/405のハンドラ）"""
+        handler = self.routes.get((method, resource))
+        if handler is not None:
+            return handler
+        if resource in self.resources:
+            return _method_not_allowed
+        return _not_found
+
+
+def _method_not_allowed(table, event):
+    return create_response(405, {'message': 'Method not allowed'})
+
+def _not_found(table, event):
+    return create_response(404, {'message': 'Not found'})
+
+def resolve_resource(event):
+    """
+    リクエストのリソースパスを取得
+
+    API Gatewayのプロキシ統合では resource にテンプレート（/items/{id}）が入る。
+    resource が無いイベント（直接呼び出しなど）はpathParametersの値をテンプレートに戻す。
+    """
+    resource = event.get('resource')
+    if resource:
+        return resource
+    path = event.get('path') or ''
+    path_parameters = event.get('pathParameters') or {}
+    if not path_parameters:
+        return path
+    values = {value: name for name, value in path_parameters.items()}
+    return '/'.join(
+        '{' + values[segment] + '}' if segment in values else segment
+        for segment in path.split('/')
+    )
+
+def _item_id(event):
+    return (event.get('pathParameters') or {}).get('id')
+
+def _query_parameters(event):
+    return event.get('queryStringParameters') or {}
+
+def require_id(handler):
+    """パスパラメータのIDが無い・予約済みのIDのリクエストを400で返すミドルウェア"""
+    @functools.wraps(handler)
+    def wrapper(table, event):
+        item_id = _item_id(event)
+        if not item_id:
+            return create_response(400, {'message': 'ID is required'})
+        if is_reserved_id(item_id):
+            return create_response(400, {'message': 'Invalid ID'})
+        return handler(table, event)
+    return wrapper
+
+def invalidates_cache(handler):
+    """更新系のハンドラの実行後に単一アイテムのキャッシュを無効化するミドルウェア"""
+    @functools.wraps(handler)
+    def wrapper(table, event):
+        try:
+            return handler(table, event)
+        finally:
+            item_cache.invalidate(_item_id(event))
+    return wrapper
+
+def timed(handler):
+    """ハンドラの処理時間をhandlerフェーズとして計測するミドルウェア"""
+    @functools.wraps(handler)
+    def wrapper(table, event):
+        with request_metrics.timer('handler'):
+            return handler(table, event)
+    return wrapper
+
+
+router = Router()
+
+@router.route('GET', '/items', middleware=(timed,))
+def get_items(table, event):
+    query_parameters = _query_parameters(event)
+    if query_parameters.get('mode') == 'export':
+        # 全アイテム取得（並列スキャン）
+        return export_items(table, query_parameters)
+    if any(query_parameters.get(name) for name in QUERY_FILTERS):
+        # 条件付き取得（インデックスを使ったQuery）
+        return query_items(table, event, query_parameters)
+    # 全アイテム取得（ページング）
+    return list_items(table, event, query_parameters)
+
+@router.route('POST', '/items')
+def post_item(table, event):
+    # アイテム作成
+    body = parse_item(event)
+    key = idempotency_key(event)
+    if key is not None:
+        # 冪等キー付きの再送には初回の応答を返す
+        return create_item_idempotent(table, event, body, key)
+    if INGEST_MODE == 'queue':
+        # 非同期取り込み（キューに登録して書き込みはingest_handlerで行う）
+        return create_response(202, enqueue_item(new_item(body)))
+    return create_response(201, create_item(table, body))
+
+@router.route('GET', '/items/stats')
+def get_stats(table, event):
+    # 集計（件数・カテゴリ別件数）
+    return conditional_response(event, dumps(read_stats(table)))
+
+@router.route('GET', '/items/recent')
+def get_recent(table, event):
+    # 最近更新されたアイテム
+    return conditional_response(event, dumps(read_recent(table)))
+
+@router.route('GET', '/items/{id}', middleware=(require_id,))
+def get_item(table, event):
+    # 単一アイテム取得
+    return get_single_item(table, event, _item_id(event), _query_parameters(event))
+
+@router.route('PUT', '/items', middleware=(require_id,))
+@router.route('PUT', '/items/{id}', middleware=(require_id, invalidates_cache))
+def put_item(table, event):
+    # アイテム更新
+    item_id = _item_id(event)
+    body = parse_item(event, allowed={'id': item_id})
+    try:
+        updated_item = replace_item(table, item_id, body)
+    except ClientError as e:
+        if not _is_conditional_check_failed(e):
+            raise
+        return create_response(409, {'message': 'Version conflict'})
+    return create_response(200, updated_item)
+
+@router.route('PATCH', '/items/{id}', middleware=(require_id, invalidates_cache))
+def patch_item_route(table, event):
+    # アイテム部分更新
+    return patch_item(table, event, _item_id(event))
+
+@router.route('DELETE', '/items', middleware=(require_id,))
+@router.route('DELETE', '/items/{id}', middleware=(require_id, invalidates_cache))
+def delete_item(table, event):
+    # アイテム削除（softモードではトゥームストーンに置き換えてTTLで削除する）
+    if DELETE_MODE == 'soft':
+        soft_delete_item(table, _item_id(event))
+    else:
+        table.delete_item(Key={'id': _item_id(event)})
+    return create_response(200, {'message': 'Item deleted'})
+
+def _batch_route(plan):
+    def handler(table, event):
+        return _execute_batch(*plan(table, event))
+    return handler
+
+for _resource, _plan in BATCH_ROUTES.items():
+    # バッチ操作
+    router.route('POST', _resource, middleware=(timed,))(_batch_route(_plan))
+
+@router.route('POST', '/items:deleteByFilter', middleware=(timed,))
+def post_delete_by_filter(table, event):
+    # 条件に合うアイテムの一括論理削除（1回のリクエストでBATCH_MAX_ITEMS件まで）
+    body = parse_body(event)
+    if not isinstance(body, dict):
+        raise ValidationError('Request body must be a JSON object')
+    unknown = sorted(set(body) - set(QUERY_FILTERS))
+    if unknown:
+        raise ValidationError(f"Unknown filters: {', '.join(unknown)}")
+    if all(body.get(name) is None for name in QUERY_FILTERS):
+        raise ValidationError('At least one filter is required')
+    ids, has_more = find_matching_ids(table, parse_filters(body), BATCH_MAX_ITEMS)
+    results = []
+    if ids:
+        results = _run_chunks(lambda chunk: _soft_delete_chunk(table, chunk), _chunks(ids, BATCH_WRITE_CHUNK_SIZE))
+    return _batch_response(results, hasMore=has_more)
+
+@router.route('POST', '/items:export', middleware=(timed,))
+def post_export(table, event):
+    # S3へのエクスポート（NDJSON）
+    body = parse_body(event)
+    segments = _parse_segments(body.get('segments') if isinstance(body, dict) else None)
+    return create_response(200, export_to_s3(table, segments))
+
+@router.route('POST', '/items:import', middleware=(timed,))
+def post_import(table, event):
+    # S3からのインポート（NDJSON）
+    body = parse_body(event)
+    key = body.get('key') if isinstance(body, dict) else None
+    if not isinstance(key, str) or not key:
+        raise ValidationError('key is required')
+    return create_response(200, import_from_s3(table, key))
+
+def lambda_handler(event, context):
+    return _invoke(event, lambda: handle_request(event, context))
+
+def async_lambda_handler(event, context):
+    """非同期版のエントリーポイント（独立したDynamoDB呼び出しをイベントループ上で並行実行）"""
+    return _invoke(event, lambda: _get_event_loop().run_until_complete(handle_request_async(event, context)))
+
+def _invoke(event, handle):
+    """呼び出しごとの計測を初期化してハンドラを実行し、計測結果を出力"""
+    global _cold_start
+    client_stats.reset()
+    request_metrics.start()
+    response = compress_response(event, handle())
+    request_metrics.emit(event, response['statusCode'], _cold_start)
+    _cold_start = False
+    stats = client_stats.snapshot()
+    if stats['retries'] or stats['throttles']:
+        # スロットリングやリトライが発生した呼び出しのみ記録する
+        print(json.dumps({
+            'message': 'dynamodb_client_stats',
+            'method': event.get('httpMethod'),
+            'resource': event.get('resource') or event.get('path'),
+            **stats,
+        }))
+    return response
+
+def handle_request(event, context):
+    try:
+        with request_metrics.timer('init'):
+            table = _get_table()
+        route = router.resolve(event['httpMethod'], resolve_resource(event))
+        return route(table, event)
 
     except Exception as e:
-        print(f'Error: {str(e)}')
-        return create_response(500, {
-            'message': 'Internal server error',
-            'error': str(e)
-        })
+        return error_response(e)
+
+async def handle_request_async(event, context):
+    """
+    非同期版のリクエスト処理
+
+    ルーティングとミドルウェアは同期版（handle_request）と同じで、チャンクの実行（_run_chunks）のみを
+    イベントループ上の並行実行（gather_limited）に切り替える。ルートのハンドラはスレッドで実行し、
+    その間イベントループはチャンクの呼び出しを受け付ける。
+    """
+    loop = asyncio.get_running_loop()
+
+    def run_on_loop(func, chunks):
+        funcs = [functools.partial(func, chunk) for chunk in chunks]
+        results = []
+        for chunk_results in asyncio.run_coroutine_threadsafe(gather_limited(funcs), loop).result():
+            results.extend(chunk_results)
+        return results
+
+    request_context = contextvars.copy_context()
+    request_context.run(_chunk_runner.set, run_on_loop)
+    return await loop.run_in_executor(None, request_context.run, handle_request, event, context)
+
+def error_response(error):
+    """例外をエラーレスポンスに変換"""
+    if isinstance(error, ValidationError):
+        return create_response(400, {'message': str(error)})
+    print(f'Error: {str(error)}')
+    return create_response(500, {
+        'message': 'Internal server error',
+        'error': str(error)
+    })
 
-def create_response(status_code, body):
+def create_response(status_code, body, headers=None):
+    with request_metrics.timer('serialize'):
+        body = dumps(body)
+    return create_raw_response(status_code, body, headers)
+
+def create_raw_response(status_code, body, headers=None):
+    """シリアライズ済みのJSON文字列からレスポンスを作成"""
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+    }
+    if headers:
+        response_headers.update(headers)
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-        },
-        'body': json.dumps(body, cls=DecimalEncoder, ensure_ascii=False)
+        'headers': response_headers,
+        'body': body
     }
+
+def _compress_gzip(data):
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _compress_brotli(data):
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+def _accepted_encodings(event):
+    """Accept-Encodingヘッダーからq値が0より大きいエンコーディングを取得"""
+    accepted = set()
+    for part in (_get_header(event, 'Accept-Encoding') or '').split(','):
+        encoding, _, params = part.strip().partition(';')
+        try:
+            q = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            q = 0.0
+        if encoding and q > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+def select_encoding(event):
+    """クライアントが受け付ける圧縮方式を選択（brotliが使えればbrを優先）"""
+    accepted = _accepted_encodings(event)
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+COMPRESSORS = {
+    'br': _compress_brotli,
+    'gzip': _compress_gzip,
+}
+
+def compress_response(event, response):
+    """
+    COMPRESSION_MIN_BYTES 以上のボディをAccept-Encodingに応じて圧縮
+
+    圧縮したボディはbase64で返し、API Gatewayの binaryMediaTypes の設定によって
+    バイナリとしてクライアントに返される。ETagには圧縮方式の接尾辞を付ける。
+    """
+    body = response.get('body')
+    if (COMPRESSION_MIN_BYTES < 0 or not isinstance(body, str) or response.get('isBase64Encoded')
+            or 'Content-Encoding' in response['headers']):
+        return response
+    data = body.encode('utf-8')
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+    headers = {**response['headers'], 'Vary': 'Accept-Encoding'}
+    encoding = select_encoding(event)
+    if encoding is None:
+        return dict(response, headers=headers)
+    with request_metrics.timer('compress'):
+        compressed = base64.b64encode(COMPRESSORS[encoding](data)).decode('ascii')
+    headers['Content-Encoding'] = encoding
+    etag = headers.get('ETag')
+    if etag and etag.endswith('"') and not etag.startswith('W/'):
+        # 強いETagはバイト列ごとに異なる必要があるため、圧縮方式ごとに区別する
+        headers['ETag'] = encoded_etag(etag, encoding)
+    return dict(
+        response,
+        headers=headers,
+        body=compressed,
+        isBase64Encoded=True,
+    )
+
+# 初期化フェーズ（コールドスタート時のモジュール読み込み）でクライアントを準備する
+if DYNAMODB_INIT_MODE == 'eager':
+    _init_client_table()
+init_timings['module_ms'] = round((time.perf_counter() - _module_load_started) * 1000, 2)
+print(json.dumps({'message': 'init', 'mode': DYNAMODB_INIT_MODE, **init_timings}))
@@ -1,63 +1,416 @@
 from aws_cdk import (
+    BundlingOptions,
     Stack,
     aws_lambda as _lambda,
     aws_apigateway as apigateway,
     aws_dynamodb as dynamodb,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_s3 as s3,
+    aws_sqs as sqs,
     RemovalPolicy,
     CfnOutput,
+    Duration,
+    Size,
 )
 from constructs import Construct
 
+# Lambdaのデプロイパッケージに含める依存パッケージ（functions/requirements.txt）をARM64向けのwheelで取得するコマンド
+FUNCTION_BUNDLING_COMMAND = (
+    "pip install -r requirements.txt -t /asset-output --no-cache-dir"
+    " --platform manylinux2014_aarch64 --implementation cp --python-version 3.12 --only-binary=:all:"
+    " && cp -au . /asset-output"
+)
+
+# 選択可能なLambdaのエントリーポイント（functions/handler.py）
+HANDLER_ENTRY_POINTS = ("lambda_handler", "async_lambda_handler")
+
+# アイテム作成の取り込みモード（sync: 同期書き込み / queue: SQS経由の非同期書き込み）
+INGEST_MODES = ("sync", "queue")
+# 取り込みキューのコンシューマーの設定
+INGEST_CONSUMER_TIMEOUT = 30
+INGEST_BATCH_SIZE = 100
+INGEST_MAX_RECEIVE_COUNT = 5
+
+# バッチ操作・一括インポート/エクスポートのルート（/items:{action}、スロットリングはbatch_throttle）
+BATCH_ACTIONS = ("batchGet", "batchWrite", "batchDelete", "deleteByFilter", "export", "import")
+
+# 一括インポート・エクスポートの設定
+BULK_FUNCTION_TIMEOUT = 900
+EXPORT_EXPIRATION_DAYS = 7
+
+# DynamoDB Streamsの集計処理の設定
+STREAM_PROCESSOR_TIMEOUT = 60
+STREAM_BATCH_SIZE = 100
+STREAM_RETRY_ATTEMPTS = 10
+# 集計レコード・処理済みマーカーのIDのプレフィックス（functions/handler.py の RESERVED_ID_PREFIX と対応）
+RESERVED_ID_PREFIX = "#"
+# TTLで削除する属性（functions/handler.py の TTL_ATTRIBUTE と対応）
+TTL_ATTRIBUTE = "expiresAt"
+
+# アイテム作成の冪等キー（Idempotency-Key）の記録の保持期間とコンテナ内キャッシュの件数
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_CACHE_SIZE = 1000
+
+# アイテム削除のモード（soft: トゥームストーンに置き換えてTTLで削除）とトゥームストーンを削除するまでの期間
+DELETE_MODE = "soft"
+TOMBSTONE_TTL_SECONDS = 24 * 60 * 60
+
+# レスポンス圧縮を行うボディサイズの下限（Lambda側とAPI Gateway側で共通）
+COMPRESSION_MIN_BYTES = 1024
+
+# 環境別のDynamoDBテーブルのキャパシティ設定
+# provisioned: プロビジョニング済みキャパシティ（read/writeは[最小, 最大]、使用率がtarget_utilization%になるよう自動スケール）
+# on_demand: オンデマンド（max_request_unitsは[読み込み, 書き込み]の上限、Noneは上限なし）
+# warm_throughputは[読み込み, 書き込み]の事前確保する秒間ユニット数（Noneは既定値）
+TABLE_SETTINGS = {
+    'prod': {
+        'billing_mode': 'provisioned',
+        'read': (25, 1000),
+        'write': (10, 500),
+        'index_read': (5, 500),
+        'index_write': (10, 500),
+        'target_utilization': 70,
+        'warm_throughput': (15000, 5000),
+    },
+    'v2qa': {
+        'billing_mode': 'on_demand',
+        'max_request_units': None,
+        'warm_throughput': None,
+    },
+    'dev': {
+        'billing_mode': 'on_demand',
+        'max_request_units': (500, 200),
+        'warm_throughput': None,
+    },
+}
+
+# 条件付き取得用のグローバルセカンダリインデックス（インデックス名とパーティションキー）
+# （インデックス名は functions/handler.py の定数と対応）
+# 既存のテーブルには1回の更新で1つしかGSIを追加できないため、index_countで先頭から
+# 1つずつ増やしてデプロイする（手順はREADMEの「インデックスの追加」）
+GLOBAL_SECONDARY_INDEXES = (
+    ("createdDay-createdAt-index", "createdDay"),
+    ("category-createdAt-index", "category"),
+    ("status-createdAt-index", "status"),
+)
+
+# 環境別のLambda関数の性能設定
+# （reserved_concurrencyがNoneの環境は予約しない、provisioned_concurrencyが0の環境はプロビジョニングしない）
+FUNCTION_SETTINGS = {
+    'prod': {
+        'memory_size': 1024,
+        'timeout': 10,
+        'reserved_concurrency': 200,
+        'provisioned_concurrency': 5,
+        'max_provisioned_concurrency': 50,
+        'utilization_target': 0.7,
+    },
+    'v2qa': {
+        'memory_size': 512,
+        'timeout': 10,
+        'reserved_concurrency': 20,
+        'provisioned_concurrency': 1,
+        'max_provisioned_concurrency': 5,
+        'utilization_target': 0.7,
+    },
+    'dev': {
+        'memory_size': 512,
+        'timeout': 10,
+        'reserved_concurrency': None,
+        'provisioned_concurrency': 0,
+    },
+}
+
+# 環境別のAPI Gatewayステージ設定
+# （cache_cluster_sizeがNoneの環境はキャッシュ無効、TTLは秒、throttleは[rate/s, burst]）
+STAGE_SETTINGS = {
+    'prod': {
+        'cache_cluster_size': '0.5',
+        'item_cache_ttl': 60,
+        'list_cache_ttl': 30,
+        'throttle': (1000, 2000),
+        'batch_throttle': (100, 200),
+    },
+    'v2qa': {
+        'cache_cluster_size': '0.5',
+        'item_cache_ttl': 30,
+        'list_cache_ttl': 10,
+        'throttle': (100, 200),
+        'batch_throttle': (10, 20),
+    },
+    'dev': {
+        'cache_cluster_size': None,
+        'throttle': (50, 100),
+        'batch_throttle': (5, 10),
+    },
+}
+
+# レスポンスが変わるリクエストパラメータ（APIキャッシュのキー、functions/handler.py と対応）
+CACHE_KEY_HEADERS = ("Accept-Encoding", "If-None-Match")
+ITEM_QUERY_PARAMETERS = ("fields",)
+LIST_QUERY_PARAMETERS = (
+    "limit", "nextToken", "fields", "mode", "segments",
+    "category", "status", "createdAfter", "createdBefore",
+)
+
 class ApiStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, environment: str = 'dev', **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, environment: str = 'dev',
+                 handler_entry_point: str = 'lambda_handler', ingest_mode: str = 'sync',
+                 index_count: int = len(GLOBAL_SECONDARY_INDEXES), **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        if handler_entry_point not in HANDLER_ENTRY_POINTS:
+            raise ValueError(f"handler_entry_point must be one of {HANDLER_ENTRY_POINTS}")
+        if ingest_mode not in INGEST_MODES:
+            raise ValueError(f"ingest_mode must be one of {INGEST_MODES}")
+        if not 0 <= index_count <= len(GLOBAL_SECONDARY_INDEXES):
+            raise ValueError(f"index_count must be between 0 and {len(GLOBAL_SECONDARY_INDEXES)}")
+        indexes = GLOBAL_SECONDARY_INDEXES[:index_count]
+
         # 環境別のリソース名プレフィックス
         env_prefix = f"{environment}-"
 
         # DynamoDBテーブル作成
-        table = dynamodb.Table(
-            self, f"{env_prefix}ItemsTable",
+        table = self._create_table(
+            env_prefix, environment, TABLE_SETTINGS.get(environment, TABLE_SETTINGS['dev']), indexes
+        )
+
+        # 処理済みマーカー・冪等キーの記録用のテーブル（TTLで削除、アイテムの一覧・エクスポートのスキャンの対象外）
+        control_table = dynamodb.Table(
+            self, f"{env_prefix}ControlTable",
             partition_key=dynamodb.Attribute(
                 name="id",
                 type=dynamodb.AttributeType.STRING
             ),
+            removal_policy=RemovalPolicy.DESTROY if environment != 'prod' else RemovalPolicy.RETAIN,
+            table_name=f"{env_prefix}items-control-table",
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute=TTL_ATTRIBUTE,
+        )
+
+        function_settings = FUNCTION_SETTINGS.get(environment, FUNCTION_SETTINGS['dev'])
+
+        # 全関数で共通のデプロイパッケージ（orjsonなどの依存パッケージを同梱）
+        function_code = _lambda.Code.from_asset(
+            "functions",
+            exclude=["__pycache__"],
+            bundling=BundlingOptions(
+                image=_lambda.Runtime.PYTHON_3_12.bundling_image,
+                command=["bash", "-c", FUNCTION_BUNDLING_COMMAND],
+            ),
+        )
+
+        # メトリクス（EMF）のサンプリング率（本番はログ量を抑える）
+        metrics_sample_rate = "0.05" if environment == 'prod' else "1.0"
+
+        # アイテム作成の取り込みキュー（処理できないメッセージはデッドレターキューへ）
+        ingest_dlq = sqs.Queue(
+            self, f"{env_prefix}IngestDeadLetterQueue",
+            queue_name=f"{env_prefix}items-ingest-dlq",
+            retention_period=Duration.days(14),
+        )
+        ingest_queue = sqs.Queue(
+            self, f"{env_prefix}IngestQueue",
+            queue_name=f"{env_prefix}items-ingest",
+            # コンシューマーのタイムアウトの6倍（SQSイベントソースの推奨値）
+            visibility_timeout=Duration.seconds(INGEST_CONSUMER_TIMEOUT * 6),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                queue=ingest_dlq,
+                max_receive_count=INGEST_MAX_RECEIVE_COUNT,
+            ),
+        )
+
+        # 一括インポート・エクスポート（NDJSON）用のバケット（エクスポートは一定期間で削除）
+        bulk_bucket = s3.Bucket(
+            self, f"{env_prefix}BulkBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
             removal_policy=RemovalPolicy.DESTROY if environment != 'prod' else RemovalPolicy.RETAIN,
-            table_name=f"{env_prefix}items-table"
+            lifecycle_rules=[
+                s3.LifecycleRule(prefix="exports/", expiration=Duration.days(EXPORT_EXPIRATION_DAYS)),
+                s3.LifecycleRule(abort_incomplete_multipart_upload_after=Duration.days(1)),
+            ],
         )
 
         # Lambda関数作成
         handler = _lambda.Function(
             self, f"{env_prefix}ApiHandler",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            code=_lambda.Code.from_asset("functions"),
-            handler="handler.lambda_handler",
+            code=function_code,
+            handler=f"handler.{handler_entry_point}",
             function_name=f"{env_prefix}api-handler",
+            architecture=_lambda.Architecture.ARM_64,
+            memory_size=function_settings['memory_size'],
+            timeout=Duration.seconds(function_settings['timeout']),
+            reserved_concurrent_executions=function_settings['reserved_concurrency'],
             environment={
                 "TABLE_NAME": table.table_name,
+                "CONTROL_TABLE_NAME": control_table.table_name,
                 "ENVIRONMENT": environment,
+                "SCAN_MAX_WORKERS": "8",
+                "ITEM_CACHE_SIZE": "1000",
+                "ITEM_CACHE_TTL_SECONDS": "30",
+                "ID_GENERATOR": "ulid",
+                "DYNAMODB_INIT_MODE": "eager",
+                "DYNAMODB_MAX_POOL_CONNECTIONS": "50",
+                "DYNAMODB_CONNECT_TIMEOUT": "1",
+                "DYNAMODB_READ_TIMEOUT": "3",
+                "DYNAMODB_RETRY_MODE": "adaptive",
+                "DYNAMODB_MAX_ATTEMPTS": "5",
+                "DYNAMODB_TCP_KEEPALIVE": "true",
+                "METRICS_NAMESPACE": f"ItemsApi/{environment}",
+                "METRICS_SAMPLE_RATE": metrics_sample_rate,
+                "ASYNC_MAX_CONCURRENCY": "16",
+                "COMPRESSION_MIN_BYTES": str(COMPRESSION_MIN_BYTES),
+                "INGEST_MODE": ingest_mode,
+                # 作成済みのインデックスのみ検索に使う
+                "QUERY_INDEXES": ",".join(index_name for index_name, _ in indexes),
+                "INGEST_QUEUE_URL": ingest_queue.queue_url,
+                "BULK_BUCKET": bulk_bucket.bucket_name,
+                "IDEMPOTENCY_TTL_SECONDS": str(IDEMPOTENCY_TTL_SECONDS),
+                "IDEMPOTENCY_CACHE_SIZE": str(IDEMPOTENCY_CACHE_SIZE),
+                "DELETE_MODE": DELETE_MODE,
+                "TOMBSTONE_TTL_SECONDS": str(TOMBSTONE_TTL_SECONDS),
             },
         )
 
         # LambdaにDynamoDBへのアクセス権限を付与
         table.grant_read_write_data(handler)
+        control_table.grant_read_write_data(handler)
+        ingest_queue.grant_send_messages(handler)
+        bulk_bucket.grant_read_write(handler)
+
+        # 一括インポート・エクスポートを直接呼び出しで実行する関数（APIのタイムアウトを超える移行用）
+        bulk_function = _lambda.Function(
+            self, f"{env_prefix}BulkHandler",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            code=function_code,
+            handler="handler.bulk_handler",
+            function_name=f"{env_prefix}bulk-handler",
+            architecture=_lambda.Architecture.ARM_64,
+            memory_size=function_settings['memory_size'],
+            timeout=Duration.seconds(BULK_FUNCTION_TIMEOUT),
+            environment={
+                "TABLE_NAME": table.table_name,
+                "ENVIRONMENT": environment,
+                "DYNAMODB_INIT_MODE": "eager",
+                "BULK_BUCKET": bulk_bucket.bucket_name,
+                "SCAN_MAX_WORKERS": "8",
+            },
+        )
+        table.grant_read_write_data(bulk_function)
+        bulk_bucket.grant_read_write(bulk_function)
+
+        # 取り込みキューのコンシューマー（BatchWriteItemでまとめて書き込み、失敗したメッセージのみ再配信）
+        ingest_consumer = _lambda.Function(
+            self, f"{env_prefix}IngestConsumer",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            code=function_code,
+            handler="handler.ingest_handler",
+            function_name=f"{env_prefix}ingest-consumer",
+            architecture=_lambda.Architecture.ARM_64,
+            memory_size=function_settings['memory_size'],
+            timeout=Duration.seconds(INGEST_CONSUMER_TIMEOUT),
+            environment={
+                "TABLE_NAME": table.table_name,
+                "ENVIRONMENT": environment,
+                "DYNAMODB_INIT_MODE": "eager",
+                "DYNAMODB_RETRY_MODE": "adaptive",
+                "DYNAMODB_MAX_ATTEMPTS": "5",
+            },
+        )
+        table.grant_write_data(ingest_consumer)
+        ingest_consumer.add_event_source(lambda_event_sources.SqsEventSource(
+            ingest_queue,
+            batch_size=INGEST_BATCH_SIZE,
+            max_batching_window=Duration.seconds(1),
+            report_batch_item_failures=True,
+        ))
+
+        # DynamoDB Streamsから集計レコード（件数・カテゴリ別件数・最近更新されたアイテム）を更新する関数
+        stream_processor = _lambda.Function(
+            self, f"{env_prefix}StreamProcessor",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            code=function_code,
+            handler="handler.stream_handler",
+            function_name=f"{env_prefix}stream-processor",
+            architecture=_lambda.Architecture.ARM_64,
+            memory_size=function_settings['memory_size'],
+            timeout=Duration.seconds(STREAM_PROCESSOR_TIMEOUT),
+            environment={
+                "TABLE_NAME": table.table_name,
+                "CONTROL_TABLE_NAME": control_table.table_name,
+                "ENVIRONMENT": environment,
+                "DYNAMODB_INIT_MODE": "eager",
+            },
+        )
+        table.grant_read_write_data(stream_processor)
+        control_table.grant_write_data(stream_processor)
+        stream_dlq = sqs.Queue(
+            self, f"{env_prefix}StreamDeadLetterQueue",
+            queue_name=f"{env_prefix}items-stream-dlq",
+            retention_period=Duration.days(14),
+        )
+        stream_processor.add_event_source(lambda_event_sources.DynamoEventSource(
+            table,
+            starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+            batch_size=STREAM_BATCH_SIZE,
+            max_batching_window=Duration.seconds(1),
+            retry_attempts=STREAM_RETRY_ATTEMPTS,
+            on_failure=lambda_event_sources.SqsDlq(stream_dlq),
+            # 集計レコード自身の変更では起動しない
+            filters=[_lambda.FilterCriteria.filter({
+                "dynamodb": {"Keys": {"id": {"S": [{"anything-but": {"prefix": RESERVED_ID_PREFIX}}]}}},
+            })],
+        ))
+
+        # API Gatewayから呼び出すエイリアス（本番・QAはプロビジョニング済み同時実行で初期化済みの環境を確保）
+        provisioned_concurrency = function_settings['provisioned_concurrency']
+        alias = _lambda.Alias(
+            self, f"{env_prefix}ApiHandlerAlias",
+            alias_name="live",
+            version=handler.current_version,
+            provisioned_concurrent_executions=provisioned_concurrency or None,
+        )
+        if provisioned_concurrency:
+            alias.add_auto_scaling(
+                min_capacity=provisioned_concurrency,
+                max_capacity=function_settings['max_provisioned_concurrency'],
+            ).scale_on_utilization(utilization_target=function_settings['utilization_target'])
+
+        stage_settings = STAGE_SETTINGS.get(environment, STAGE_SETTINGS['dev'])
 
         # API Gateway作成
         api = apigateway.RestApi(
             self, f"{env_prefix}ItemsApi",
             rest_api_name=f"{env_prefix}Items Service",
             description=f"API for managing items ({environment} environment)",
+            # Lambdaが圧縮したbase64のボディをバイナリとして返す
+            binary_media_types=["*/*"],
+            # Content-Encodingを付けていないレスポンスはAPI Gatewayがgzip/deflateで圧縮
+            min_compression_size=Size.bytes(COMPRESSION_MIN_BYTES),
+            deploy_options=self._stage_options(stage_settings),
         )
 
         items = api.root.add_resource("items")
-        items.add_method("GET", apigateway.LambdaIntegration(handler))
-        items.add_method("POST", apigateway.LambdaIntegration(handler))
+        self._add_cached_get(items, alias, LIST_QUERY_PARAMETERS)
+        items.add_method("POST", apigateway.LambdaIntegration(alias))
+
+        # 集計（DynamoDB Streamsで更新した集計レコードを返す）
+        for name in ("stats", "recent"):
+            self._add_cached_get(items.add_resource(name), alias, ())
 
         item = items.add_resource("{id}")
-        item.add_method("GET", apigateway.LambdaIntegration(handler))
-        item.add_method("PUT", apigateway.LambdaIntegration(handler))
-        item.add_method("DELETE", apigateway.LambdaIntegration(handler))
+        self._add_cached_get(item, alias, ITEM_QUERY_PARAMETERS, path_parameters=("id",))
+        item.add_method("PUT", apigateway.LambdaIntegration(alias))
+        item.add_method("PATCH", apigateway.LambdaIntegration(alias))
+        item.add_method("DELETE", apigateway.LambdaIntegration(alias))
+
+        # バッチ操作・一括インポート/エクスポート
+        for action in BATCH_ACTIONS:
+            batch = api.root.add_resource(f"items:{action}")
+            batch.add_method("POST", apigateway.LambdaIntegration(alias))
 
         # 出力
         CfnOutput(
@@ -73,3 +426,138 @@ class ApiStack(Stack):
             description=f"DynamoDB Table Name ({environment})",
             export_name=f"{construct_id}-TableName"
         )
+
+    def _create_table(self, env_prefix: str, environment: str, table_settings: dict,
+                      indexes=GLOBAL_SECONDARY_INDEXES) -> dynamodb.Table:
+        """キャパシティ設定に応じてテーブルとGSIを作成（プロビジョニング時は自動スケールも設定）"""
+        provisioned = table_settings['billing_mode'] == 'provisioned'
+        if provisioned:
+            capacity = {
+                'billing_mode': dynamodb.BillingMode.PROVISIONED,
+                'read_capacity': table_settings['read'][0],
+                'write_capacity': table_settings['write'][0],
+            }
+            index_capacity = {
+                'read_capacity': table_settings['index_read'][0],
+                'write_capacity': table_settings['index_write'][0],
+            }
+        else:
+            max_read, max_write = table_settings['max_request_units'] or (None, None)
+            capacity = {
+                'billing_mode': dynamodb.BillingMode.PAY_PER_REQUEST,
+                'max_read_request_units': max_read,
+                'max_write_request_units': max_write,
+            }
+            index_capacity = {
+                'max_read_request_units': max_read,
+                'max_write_request_units': max_write,
+            }
+        warm_throughput = None
+        if table_settings['warm_throughput']:
+            read_units, write_units = table_settings['warm_throughput']
+            warm_throughput = dynamodb.WarmThroughput(
+                read_units_per_second=read_units,
+                write_units_per_second=write_units,
+            )
+
+        table = dynamodb.Table(
+            self, f"{env_prefix}ItemsTable",
+            partition_key=dynamodb.Attribute(
+                name="id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            removal_policy=RemovalPolicy.DESTROY if environment != 'prod' else RemovalPolicy.RETAIN,
+            table_name=f"{env_prefix}items-table",
+            warm_throughput=warm_throughput,
+            # 集計処理（stream_handler）用のストリーム
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
+            time_to_live_attribute=TTL_ATTRIBUTE,
+            **capacity,
+        )
+
+        for index_name, partition_key in indexes:
+            table.add_global_secondary_index(
+                index_name=index_name,
+                partition_key=dynamodb.Attribute(
+                    name=partition_key,
+                    type=dynamodb.AttributeType.STRING
+                ),
+                sort_key=dynamodb.Attribute(
+                    name="createdAt",
+                    type=dynamodb.AttributeType.STRING
+                ),
+                projection_type=dynamodb.ProjectionType.ALL,
+                **index_capacity,
+            )
+
+        if provisioned:
+            target = table_settings['target_utilization']
+            for scalable in (
+                table.auto_scale_read_capacity(
+                    min_capacity=table_settings['read'][0], max_capacity=table_settings['read'][1]),
+                table.auto_scale_write_capacity(
+                    min_capacity=table_settings['write'][0], max_capacity=table_settings['write'][1]),
+            ):
+                scalable.scale_on_utilization(target_utilization_percent=target)
+            for index_name, _ in indexes:
+                for scalable in (
+                    table.auto_scale_global_secondary_index_read_capacity(
+                        index_name,
+                        min_capacity=table_settings['index_read'][0],
+                        max_capacity=table_settings['index_read'][1]),
+                    table.auto_scale_global_secondary_index_write_capacity(
+                        index_name,
+                        min_capacity=table_settings['index_write'][0],
+                        max_capacity=table_settings['index_write'][1]),
+                ):
+                    scalable.scale_on_utilization(target_utilization_percent=target)
+
+        return table
+
+    @staticmethod
+    def _stage_options(stage_settings: dict) -> apigateway.StageOptions:
+        """ステージのキャッシュ・スロットリング設定を作成"""
+        caching = stage_settings['cache_cluster_size'] is not None
+        rate_limit, burst_limit = stage_settings['throttle']
+        batch_rate_limit, batch_burst_limit = stage_settings['batch_throttle']
+
+        method_options = {
+            f"/items:{action}/POST": apigateway.MethodDeploymentOptions(
+                throttling_rate_limit=batch_rate_limit,
+                throttling_burst_limit=batch_burst_limit,
+            )
+            for action in BATCH_ACTIONS
+        }
+        if caching:
+            for path, ttl in (
+                ("/items/GET", stage_settings['list_cache_ttl']),
+                ("/items/{id}/GET", stage_settings['item_cache_ttl']),
+            ):
+                method_options[path] = apigateway.MethodDeploymentOptions(
+                    caching_enabled=True,
+                    cache_ttl=Duration.seconds(ttl),
+                    throttling_rate_limit=rate_limit,
+                    throttling_burst_limit=burst_limit,
+                )
+
+        return apigateway.StageOptions(
+            cache_cluster_enabled=caching,
+            cache_cluster_size=stage_settings['cache_cluster_size'],
+            throttling_rate_limit=rate_limit,
+            throttling_burst_limit=burst_limit,
+            method_options=method_options,
+        )
+
+    @staticmethod
+    def _add_cached_get(resource, function, query_parameters, path_parameters=()):
+        """レスポンスが変わるパラメータをキャッシュキーにしたGETメソッドを追加"""
+        request_parameters = {
+            **{f"method.request.path.{name}": True for name in path_parameters},
+            **{f"method.request.querystring.{name}": False for name in query_parameters},
+            **{f"method.request.header.{name}": False for name in CACHE_KEY_HEADERS},
+        }
+        resource.add_method(
+            "GET",
+            apigateway.LambdaIntegration(function, cache_key_parameters=list(request_parameters)),
+            request_parameters=request_parameters,
+        )
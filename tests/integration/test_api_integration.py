@@ -4,6 +4,8 @@ import sys
 import pytest
 from moto import mock_aws
 import boto3
+from boto3.dynamodb.types import TypeSerializer
+from decimal import Decimal
 
 # functionsモジュールをインポートするためにパスを追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -97,6 +99,7 @@ class TestAPIIntegration:
         updated_item = json.loads(update_response['body'])
         assert updated_item['name'] == '更新された商品'
         assert updated_item['price'] == 3000
+        assert updated_item['version'] == 1
         
         # 4. 全アイテムを取得
         list_event = {
@@ -109,7 +112,7 @@ class TestAPIIntegration:
         list_response = handler.lambda_handler(list_event, None)
         assert list_response['statusCode'] == 200
         
-        items = json.loads(list_response['body'])
+        items = json.loads(list_response['body'])['items']
         assert len(items) >= 1
         
         # 5. アイテムを削除
@@ -174,5 +177,898 @@ class TestAPIIntegration:
         list_response = handler.lambda_handler(list_event, None)
         assert list_response['statusCode'] == 200
         
-        items = json.loads(list_response['body'])
+        items = json.loads(list_response['body'])['items']
         assert len(items) == 3
+
+        # ページングで全件を辿れることを確認
+        seen = []
+        token = None
+        while True:
+            params = {'limit': '2'}
+            if token:
+                params['nextToken'] = token
+            page_event = dict(list_event, queryStringParameters=params)
+            page = json.loads(handler.lambda_handler(page_event, None)['body'])
+            seen.extend(item['id'] for item in page['items'])
+            token = page['nextToken']
+            if not token:
+                break
+        assert sorted(seen) == sorted(item['id'] for item in items)
+
+    @mock_aws
+    def test_export_parallel_scan(self, aws_credentials):
+        """並列スキャンによるエクスポートのテスト"""
+
+        # DynamoDBテーブルを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        for i in range(50):
+            table.put_item(Item={'id': str(i), 'name': f'商品{i}'})
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        export_event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'mode': 'export', 'segments': '4'},
+            'body': None
+        }
+
+        export_response = handler.lambda_handler(export_event, None)
+        assert export_response['statusCode'] == 200
+
+        items = json.loads(export_response['body'])['items']
+        assert sorted(int(item['id']) for item in items) == list(range(50))
+
+    @mock_aws
+    def test_batch_operations(self, aws_credentials):
+        """バッチ取得・書き込み・削除のテスト"""
+
+        # DynamoDBテーブルを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        def batch_event(action, body):
+            return {
+                'httpMethod': 'POST',
+                'path': f'/items:{action}',
+                'resource': f'/items:{action}',
+                'pathParameters': None,
+                'body': json.dumps(body)
+            }
+
+        # 1. 一括書き込み（複数チャンク）
+        items = [{'id': str(i), 'name': f'商品{i}', 'price': 1.5 * i} for i in range(60)]
+        write_response = handler.lambda_handler(batch_event('batchWrite', {'items': items}), None)
+        assert write_response['statusCode'] == 200
+        assert json.loads(write_response['body'])['succeeded'] == 60
+
+        # 2. 一括取得
+        ids = [str(i) for i in range(0, 60, 2)] + ['missing']
+        get_response = handler.lambda_handler(batch_event('batchGet', {'ids': ids}), None)
+        body = json.loads(get_response['body'])
+        assert body['succeeded'] == 30
+        assert body['results'][-1] == {'id': 'missing', 'success': False, 'error': 'Item not found'}
+        assert body['results'][1]['item']['name'] == '商品2'
+
+        # 3. 一括削除
+        delete_ids = [str(i) for i in range(30)]
+        delete_response = handler.lambda_handler(batch_event('batchDelete', {'ids': delete_ids}), None)
+        assert json.loads(delete_response['body'])['succeeded'] == 30
+        assert table.scan()['Count'] == 30
+
+        # 4. 非同期版エントリーポイントでの一括取得
+        async_response = handler.async_lambda_handler(batch_event('batchGet', {'ids': ids}), None)
+        assert json.loads(async_response['body'])['succeeded'] == 15
+
+    @mock_aws
+    def test_batch_write_validation(self, aws_credentials):
+        """一括書き込みでアイテムごとに検証し、version・作成日時をPUTと同じく引き継ぐテスト"""
+
+        # DynamoDBテーブルを作成（カテゴリのインデックス付き）
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': name, 'AttributeType': 'S'}
+                for name in ('id', 'createdAt', 'category')
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': handler.CATEGORY_INDEX,
+                    'KeySchema': [
+                        {'AttributeName': 'category', 'KeyType': 'HASH'},
+                        {'AttributeName': 'createdAt', 'KeyType': 'RANGE'},
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'},
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        def request(method, path, path_parameters=None, query=None, body=None):
+            event = {
+                'httpMethod': method,
+                'path': path,
+                'resource': '/items/{id}' if path_parameters else path,
+                'pathParameters': path_parameters,
+                'queryStringParameters': query,
+                'body': json.dumps(body) if body is not None else None
+            }
+            response = handler.lambda_handler(event, None)
+            return response['statusCode'], json.loads(response['body'] or 'null')
+
+        def batch_write(items):
+            status, result = request('POST', '/items:batchWrite', body={'items': items})
+            assert status == 200
+            return {r['id']: r for r in result['results']}
+
+        # 1. 予約属性・不正な値を含むアイテムは書き込まずに失敗として返す
+        results = batch_write([{'id': 'x1', 'category': 'book', 'deletedAt': 'now', 'version': 'abc'}])
+        assert results['x1']['success'] is False
+        assert 'cannot be set' in results['x1']['error']
+        assert 'Item' not in table.get_item(Key={'id': 'x1'})
+
+        # 2. 作成日時をサーバー側で付与し、インデックスの検索の対象になる
+        assert batch_write([{'id': 'x2', 'category': 'book'}])['x2']['success'] is True
+        stored = table.get_item(Key={'id': 'x2'})['Item']
+        assert stored['createdAt'][:10] == stored['createdDay']
+        assert stored['version'] == 1
+        _, page = request('GET', '/items', query={'category': 'book'})
+        assert [item['id'] for item in page['items']] == ['x2']
+
+        # 3. PUTで作成したアイテムのversion・作成日時を引き継ぐ
+        assert request('PUT', '/items/p1', {'id': 'p1'}, body={'name': '商品'})[0] == 200
+        created_at = table.get_item(Key={'id': 'p1'})['Item']['createdAt']
+        assert batch_write([{'id': 'p1', 'name': '一括更新'}])['p1']['success'] is True
+        stored = table.get_item(Key={'id': 'p1'})['Item']
+        assert stored['version'] == 2
+        assert stored['createdAt'] == created_at
+        status, patched = request('PATCH', '/items/p1', {'id': 'p1'}, body={'version': 2, 'name': '部分更新'})
+        assert status == 200
+        assert patched['version'] == 3
+
+        # 4. サイズ超過のアイテムのみ失敗し、同じチャンクの他のアイテムは書き込む
+        results = batch_write([{'id': 'big', 'description': 'x', 'blob': 'x' * 400 * 1024}, {'id': 'small'}])
+        assert results['big']['success'] is False
+        assert 'maximum size' in results['big']['error']
+        assert results['small']['success'] is True
+
+    @mock_aws
+    def test_crud_with_client_table(self, aws_credentials):
+        """低レベルクライアント（eagerモード）でのCRUD・バッチ操作のテスト"""
+
+        # DynamoDBテーブルを作成
+        client = boto3.client('dynamodb', region_name='ap-northeast-1')
+        client.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = client
+        handler.table = handler.ClientTable(client, 'test-integration-table')
+
+        create_event = {
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'body': json.dumps({'name': '低レベル商品', 'price': 100})
+        }
+        created_item = json.loads(handler.lambda_handler(create_event, None)['body'])
+        item_id = created_item['id']
+
+        get_event = {
+            'httpMethod': 'GET',
+            'path': f'/items/{item_id}',
+            'pathParameters': {'id': item_id},
+            'body': None
+        }
+        get_response = handler.lambda_handler(get_event, None)
+        assert get_response['statusCode'] == 200
+        assert json.loads(get_response['body'])['price'] == 100
+
+        batch_event = {
+            'httpMethod': 'POST',
+            'path': '/items:batchWrite',
+            'resource': '/items:batchWrite',
+            'pathParameters': None,
+            'body': json.dumps({'items': [{'id': str(i)} for i in range(30)]})
+        }
+        assert json.loads(handler.lambda_handler(batch_event, None)['body'])['succeeded'] == 30
+
+        list_event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'limit': '20'},
+            'body': None
+        }
+        page = json.loads(handler.lambda_handler(list_event, None)['body'])
+        assert page['count'] == 20
+        assert page['nextToken']
+
+        delete_event = dict(get_event, httpMethod='DELETE')
+        assert handler.lambda_handler(delete_event, None)['statusCode'] == 200
+        assert handler.lambda_handler(get_event, None)['statusCode'] == 404
+
+    @mock_aws
+    def test_projection_and_conditional_get(self, aws_credentials):
+        """属性の絞り込みと条件付き取得のテスト"""
+
+        # DynamoDBテーブルを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.put_item(Item={'id': '1', 'name': '商品', 'price': 100, 'description': '長い説明' * 100})
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        get_event = {
+            'httpMethod': 'GET',
+            'path': '/items/1',
+            'pathParameters': {'id': '1'},
+            'queryStringParameters': {'fields': 'name,price'},
+            'body': None
+        }
+        get_response = handler.lambda_handler(get_event, None)
+        assert json.loads(get_response['body']) == {'id': '1', 'name': '商品', 'price': 100}
+
+        list_event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'fields': 'name'},
+            'body': None
+        }
+        list_response = handler.lambda_handler(list_event, None)
+        assert json.loads(list_response['body'])['items'] == [{'id': '1', 'name': '商品'}]
+
+        # 変更が無ければ304
+        etag = list_response['headers']['ETag']
+        conditional_event = dict(list_event, headers={'If-None-Match': etag})
+        assert handler.lambda_handler(conditional_event, None)['statusCode'] == 304
+
+    @mock_aws
+    def test_partial_update(self, aws_credentials):
+        """UpdateItemによる部分更新と楽観的排他制御のテスト"""
+
+        # DynamoDBテーブルを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.put_item(Item={'id': '1', 'name': '商品', 'memo': 'メモ', 'views': 0})
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        def patch_event(body):
+            return {
+                'httpMethod': 'PATCH',
+                'path': '/items/1',
+                'pathParameters': {'id': '1'},
+                'body': json.dumps(body)
+            }
+
+        # 1. 属性の更新・削除とカウンタの加算
+        response = handler.lambda_handler(patch_event({'name': '更新', 'memo': None, '$add': {'views': 2}}), None)
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['name'] == '更新'
+        assert body['views'] == 2
+        assert body['version'] == 1
+
+        item = table.get_item(Key={'id': '1'})['Item']
+        assert 'memo' not in item
+        assert item['views'] == 2
+
+        # 2. バージョン一致時のみ更新
+        assert handler.lambda_handler(patch_event({'name': 'v2', 'version': 1}), None)['statusCode'] == 200
+        conflict = handler.lambda_handler(patch_event({'name': 'v3', 'version': 1}), None)
+        assert conflict['statusCode'] == 409
+        assert json.loads(conflict['body'])['currentVersion'] == 2
+
+        # 3. 存在しないアイテム
+        missing = dict(patch_event({'name': 'x'}), pathParameters={'id': 'missing'})
+        assert handler.lambda_handler(missing, None)['statusCode'] == 404
+
+    @mock_aws
+    def test_query_with_indexes(self, aws_credentials):
+        """インデックスを使った条件付き取得のテスト"""
+
+        # DynamoDBテーブルを作成（ApiStackと同じインデックス構成）
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        indexes = [
+            (handler.CREATED_DAY_INDEX, 'createdDay'),
+            (handler.CATEGORY_INDEX, 'category'),
+            (handler.STATUS_INDEX, 'status'),
+        ]
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': name, 'AttributeType': 'S'}
+                for name in ('id', 'createdAt', 'createdDay', 'category', 'status')
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': index_name,
+                    'KeySchema': [
+                        {'AttributeName': partition_key, 'KeyType': 'HASH'},
+                        {'AttributeName': 'createdAt', 'KeyType': 'RANGE'},
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'},
+                }
+                for index_name, partition_key in indexes
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        for i in range(12):
+            created_at = f'2024-11-{20 + i % 3:02d}T10:{i:02d}:00'
+            table.put_item(Item=handler.with_created_day({
+                'id': f'item-{i}',
+                'category': 'book' if i % 2 else 'food',
+                'status': 'active',
+                'createdAt': created_at,
+            }))
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        def query(params):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/items',
+                'pathParameters': None,
+                'queryStringParameters': params,
+                'body': None
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200
+            return response['headers']['X-Query-Plan'], json.loads(response['body'])
+
+        # カテゴリ + 作成日時の範囲
+        plan, body = query({'category': 'book', 'createdAfter': '2024-11-21T00:00:00'})
+        assert plan == f'query:{handler.CATEGORY_INDEX}'
+        assert sorted(item['id'] for item in body['items']) == ['item-1', 'item-11', 'item-5', 'item-7']
+
+        # 日別インデックスをページングで辿る
+        seen = []
+        params = {'createdAfter': '2024-11-20T00:00:00', 'createdBefore': '2024-11-22T23:59:59', 'limit': '5'}
+        while True:
+            plan, body = query(params)
+            assert plan == f'query:{handler.CREATED_DAY_INDEX}'
+            seen.extend(item['id'] for item in body['items'])
+            if not body['nextToken']:
+                break
+            params = dict(params, nextToken=body['nextToken'])
+        assert sorted(seen) == sorted(f'item-{i}' for i in range(12))
+
+        # インデックスが使えない条件はスキャン
+        plan, body = query({'createdBefore': '2024-11-20T23:59:59'})
+        assert plan == 'scan'
+        assert body['count'] == 4
+
+        # PUTで置き換えても作成日時を引き継ぎ、インデックスの検索から外れない
+        put_event = {
+            'httpMethod': 'PUT',
+            'path': '/items/item-1',
+            'pathParameters': {'id': 'item-1'},
+            'body': json.dumps({'name': '置き換え後', 'category': 'book', 'status': 'active'})
+        }
+        assert handler.lambda_handler(put_event, None)['statusCode'] == 200
+        replaced = table.get_item(Key={'id': 'item-1'})['Item']
+        assert replaced['createdAt'] == '2024-11-21T10:01:00'
+        assert replaced['createdDay'] == '2024-11-21'
+        _, body = query({'category': 'book', 'createdAfter': '2024-11-21T00:00:00'})
+        assert 'item-1' in [item['id'] for item in body['items']]
+        _, body = query({'createdAfter': '2024-11-21T00:00:00', 'createdBefore': '2024-11-21T23:59:59'})
+        assert 'item-1' in [item['id'] for item in body['items']]
+
+    @mock_aws
+    def test_backfill_created(self, aws_credentials, monkeypatch):
+        """インデックス追加前の作成日時の補完と、作成前のインデックスを使わない検索のテスト"""
+
+        # DynamoDBテーブルを作成（カテゴリのインデックス付き）
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': name, 'AttributeType': 'S'}
+                for name in ('id', 'createdAt', 'category')
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': handler.CATEGORY_INDEX,
+                    'KeySchema': [
+                        {'AttributeName': 'category', 'KeyType': 'HASH'},
+                        {'AttributeName': 'createdAt', 'KeyType': 'RANGE'},
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'},
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        # 作成日時の無いアイテム（このシリーズ以前のPUTで置き換えたもの）・日付の無いアイテム
+        table.put_item(Item={'id': 'old-put', 'category': 'book', 'updatedAt': '2024-11-01T09:00:00'})
+        table.put_item(Item={'id': 'no-day', 'category': 'book', 'createdAt': '2024-11-02T09:00:00'})
+        table.put_item(Item={'id': 'deleted', 'deletedAt': '2024-11-03T00:00:00', 'expiresAt': 1})
+        table.put_item(Item={'id': '#stats', 'itemCount': 2})
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+
+        def query(params):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/items',
+                'pathParameters': None,
+                'queryStringParameters': params,
+                'body': None
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200
+            return response['headers']['X-Query-Plan'], json.loads(response['body'])
+
+        # 1. 補完前はインデックスに載らないため検索から漏れる
+        _, body = query({'category': 'book'})
+        assert [item['id'] for item in body['items']] == ['no-day']
+
+        # 2. 作成日時を補完する（トゥームストーン・予約IDは対象外）
+        result = handler.bulk_handler({'action': 'backfill', 'segments': 2}, None)
+        assert result == {'updated': 2, 'failed': 0, 'errors': []}
+        old_put = table.get_item(Key={'id': 'old-put'})['Item']
+        assert (old_put['createdAt'], old_put['createdDay']) == ('2024-11-01T09:00:00', '2024-11-01')
+        assert table.get_item(Key={'id': 'no-day'})['Item']['createdDay'] == '2024-11-02'
+        assert 'createdAt' not in table.get_item(Key={'id': 'deleted'})['Item']
+        _, body = query({'category': 'book'})
+        assert sorted(item['id'] for item in body['items']) == ['no-day', 'old-put']
+
+        # 3. 作成前のインデックス（QUERY_INDEXESに含まれない）は使わずにスキャンで同じ条件を検索する
+        monkeypatch.setattr(handler, 'QUERY_INDEXES', frozenset())
+        plan, body = query({'category': 'book', 'createdAfter': '2024-11-02T00:00:00'})
+        assert plan == 'scan'
+        assert [item['id'] for item in body['items']] == ['no-day']
+
+    @mock_aws
+    def test_queue_ingest(self, aws_credentials, monkeypatch):
+        """取り込みキュー(SQS)経由のアイテム作成のテスト"""
+
+        # DynamoDBテーブルと取り込みキューを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        sqs = boto3.client('sqs', region_name='ap-northeast-1')
+        queue_url = sqs.create_queue(QueueName='test-ingest-queue')['QueueUrl']
+
+        # handlerにテーブルとキューを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+        monkeypatch.setattr(handler, 'sqs', sqs)
+        monkeypatch.setattr(handler, 'INGEST_MODE', 'queue')
+        monkeypatch.setattr(handler, 'INGEST_QUEUE_URL', queue_url)
+
+        # 1. 作成リクエストはキューに登録して202を返す
+        ids = []
+        for i in range(30):
+            event = {
+                'httpMethod': 'POST',
+                'path': '/items',
+                'pathParameters': None,
+                'body': json.dumps({'name': f'商品{i}', 'price': 100 + i})
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 202
+            ids.append(json.loads(response['body'])['id'])
+        assert table.scan()['Count'] == 0
+
+        # 2. コンシューマーがキューのメッセージをまとめて書き込む
+        records = []
+        while True:
+            messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get('Messages', [])
+            if not messages:
+                break
+            records.extend({'messageId': m['MessageId'], 'body': m['Body']} for m in messages)
+        result = handler.ingest_handler({'Records': records}, None)
+        assert result == {'batchItemFailures': []}
+
+        # 3. 書き込まれたアイテムを取得できる
+        assert table.scan()['Count'] == 30
+        get_event = {
+            'httpMethod': 'GET',
+            'path': f'/items/{ids[0]}',
+            'pathParameters': {'id': ids[0]},
+            'body': None
+        }
+        response = handler.lambda_handler(get_event, None)
+        assert json.loads(response['body'])['name'] == '商品0'
+
+    @mock_aws
+    @pytest.mark.parametrize('client_table', [False, True])
+    def test_idempotent_create(self, aws_credentials, monkeypatch, client_table):
+        """Idempotency-Key付きの作成の再送で初回の応答を返し、アイテムを重複して作成しないテスト"""
+
+        # DynamoDBテーブルを作成（冪等キーの記録は別のテーブル）
+        client = boto3.client('dynamodb', region_name='ap-northeast-1')
+        for name in ('test-integration-table', 'test-control-table'):
+            client.create_table(
+                TableName=name,
+                KeySchema=[
+                    {'AttributeName': 'id', 'KeyType': 'HASH'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'id', 'AttributeType': 'S'}
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+
+        # handlerにテーブルを直接設定（コンテナ内キャッシュは無効）
+        if client_table:
+            handler.dynamodb = client
+            handler.table = handler.ClientTable(client, 'test-integration-table')
+        else:
+            handler.dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+            handler.table = handler.dynamodb.Table('test-integration-table')
+        monkeypatch.setattr(handler, 'idempotency_cache', handler.ItemCache(0, 60))
+        monkeypatch.setattr(handler, 'CONTROL_TABLE_NAME', 'test-control-table')
+
+        create_event = {
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'headers': {'idempotency-key': 'order-1'},
+            'body': json.dumps({'name': '冪等商品', 'price': 12.5})
+        }
+
+        # 1. 初回はアイテムと応答の記録を書き込む
+        first = handler.lambda_handler(create_event, None)
+        assert first['statusCode'] == 201
+        assert 'Idempotent-Replayed' not in first['headers']
+
+        # 2. 再送には同じ応答を返す
+        replayed = handler.lambda_handler(create_event, None)
+        assert replayed['statusCode'] == 201
+        assert replayed['headers']['Idempotent-Replayed'] == 'true'
+        assert json.loads(replayed['body']) == json.loads(first['body'])
+
+        # 3. 同じキーで異なるボディは422
+        other = dict(create_event, body=json.dumps({'name': '別の商品'}))
+        assert handler.lambda_handler(other, None)['statusCode'] == 422
+
+        # 4. アイテムは1件のみで、記録はアイテムのテーブルに含まれない
+        list_event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'body': None
+        }
+        page = json.loads(handler.lambda_handler(list_event, None)['body'])
+        assert [item['id'] for item in page['items']] == [json.loads(first['body'])['id']]
+        assert client.scan(TableName='test-integration-table', Select='COUNT')['Count'] == 1
+        record = client.get_item(
+            TableName='test-control-table', Key={'id': {'S': '#idempotency#order-1'}}
+        )['Item']
+        assert 'expiresAt' in record
+
+    @mock_aws
+    def test_soft_delete(self, aws_credentials, monkeypatch):
+        """論理削除したアイテムが取得・一覧・インデックスの検索から除かれ、条件で一括論理削除できるテスト"""
+
+        # DynamoDBテーブルを作成（ApiStackと同じインデックス構成）
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': name, 'AttributeType': 'S'}
+                for name in ('id', 'createdAt', 'category')
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': handler.CATEGORY_INDEX,
+                'KeySchema': [
+                    {'AttributeName': 'category', 'KeyType': 'HASH'},
+                    {'AttributeName': 'createdAt', 'KeyType': 'RANGE'},
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        for i in range(6):
+            table.put_item(Item=handler.with_created_day({
+                'id': f'item-{i}',
+                'category': 'book' if i % 2 else 'food',
+                'createdAt': f'2024-11-20T10:{i:02d}:00',
+            }))
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+        monkeypatch.setattr(handler, 'DELETE_MODE', 'soft')
+
+        def request(method, path, path_parameters=None, query=None, body=None):
+            event = {
+                'httpMethod': method,
+                'path': path,
+                'resource': '/items/{id}' if path_parameters else path,
+                'pathParameters': path_parameters,
+                'queryStringParameters': query,
+                'body': json.dumps(body) if body is not None else None
+            }
+            response = handler.lambda_handler(event, None)
+            return response['statusCode'], json.loads(response['body'] or 'null')
+
+        # 1. 削除はトゥームストーンとTTLの期限を記録し、インデックスのキーを取り除く
+        assert request('DELETE', '/items/item-1', {'id': 'item-1'})[0] == 200
+        tombstone = table.get_item(Key={'id': 'item-1'})['Item']
+        assert 'deletedAt' in tombstone and 'expiresAt' in tombstone
+        assert 'category' not in tombstone
+
+        # 2. 取得・部分更新・一覧・インデックスの検索から除かれる
+        assert request('GET', '/items/item-1', {'id': 'item-1'})[0] == 404
+        assert request('PATCH', '/items/item-1', {'id': 'item-1'}, body={'name': 'x'})[0] == 404
+        _, page = request('GET', '/items')
+        assert sorted(item['id'] for item in page['items']) == ['item-0', 'item-2', 'item-3', 'item-4', 'item-5']
+        _, page = request('GET', '/items', query={'category': 'book'})
+        assert sorted(item['id'] for item in page['items']) == ['item-3', 'item-5']
+
+        # 3. 条件に合うアイテムを一括論理削除
+        status, result = request('POST', '/items:deleteByFilter', body={'category': 'food'})
+        assert status == 200
+        assert result['succeeded'] == 3
+        assert result['hasMore'] is False
+        _, page = request('GET', '/items')
+        assert sorted(item['id'] for item in page['items']) == ['item-3', 'item-5']
+
+        # 4. 条件の無い一括削除は400
+        assert request('POST', '/items:deleteByFilter', body={})[0] == 400
+
+        # 5. IDを指定したバッチ削除も論理削除（存在しないIDは失敗として返す）
+        status, result = request('POST', '/items:batchDelete', body={'ids': ['item-3', 'missing']})
+        assert status == 200
+        assert result['succeeded'] == 1
+        assert [r for r in result['results'] if not r['success']] == [
+            {'id': 'missing', 'success': False, 'error': 'Item not found'}
+        ]
+        assert 'deletedAt' in table.get_item(Key={'id': 'item-3'})['Item']
+        _, page = request('GET', '/items')
+        assert [item['id'] for item in page['items']] == ['item-5']
+
+    @mock_aws
+    def test_stream_aggregates(self, aws_credentials, monkeypatch):
+        """DynamoDB Streamsの集計処理と集計レコードの取得のテスト"""
+
+        # DynamoDBテーブルを作成（処理済みマーカーは別のテーブル）
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table, control = (
+            dynamodb.create_table(
+                TableName=name,
+                KeySchema=[
+                    {'AttributeName': 'id', 'KeyType': 'HASH'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'id', 'AttributeType': 'S'}
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            for name in ('test-integration-table', 'test-control-table')
+        )
+
+        # handlerにテーブルを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+        monkeypatch.setattr(handler, 'CONTROL_TABLE_NAME', 'test-control-table')
+
+        serializer = TypeSerializer()
+        sequence = iter(range(1, 1000))
+
+        def record(event_name, old=None, new=None):
+            """合成したストリームレコード"""
+            item = new or old
+            dynamodb_record = {'Keys': {'id': {'S': item['id']}}}
+            if old:
+                dynamodb_record['OldImage'] = {k: serializer.serialize(v) for k, v in old.items()}
+            if new:
+                dynamodb_record['NewImage'] = {k: serializer.serialize(v) for k, v in new.items()}
+            return {'eventID': f'event-{next(sequence)}', 'eventName': event_name, 'dynamodb': dynamodb_record}
+
+        def get(path):
+            event = {'httpMethod': 'GET', 'path': path, 'pathParameters': None, 'body': None}
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200
+            return json.loads(response['body'])
+
+        # 1. 作成・カテゴリ変更・削除
+        items = [
+            {'id': f'item-{i}', 'name': f'商品{i}', 'category': 'book' if i % 2 else 'food',
+             'createdAt': f'2024-11-21T10:00:0{i}'}
+            for i in range(5)
+        ]
+        batch = [record('INSERT', new=item) for item in items]
+        batch.append(record('MODIFY', old=items[0],
+                            new={**items[0], 'category': 'book', 'updatedAt': '2024-11-22T00:00:00'}))
+        batch.append(record('REMOVE', old=items[1]))
+        result = handler.stream_handler({'Records': batch}, None)
+        assert result == {'applied': 7, 'skipped': 0}
+        # 処理済みマーカーはアイテムのテーブルのスキャンに含まれない
+        assert control.scan(Select='COUNT')['Count'] == 7
+        assert sorted(item['id'] for item in table.scan()['Items']) == ['#recent', '#stats']
+
+        stats = get('/items/stats')
+        assert stats['count'] == 4
+        assert stats['categories'] == {'book': 2, 'food': 2}
+        recent = get('/items/recent')
+        assert [item['id'] for item in recent['items']] == ['item-0', 'item-4', 'item-3', 'item-2']
+
+        # 2. 同じバッチの再送は集計に反映しない（新しいレコードのみ反映）
+        replay = batch + [record('INSERT', new={'id': 'item-9', 'category': 'toy', 'createdAt': '2024-11-23T00:00:00'})]
+        result = handler.stream_handler({'Records': replay}, None)
+        assert result == {'applied': 1, 'skipped': 7}
+        stats = get('/items/stats')
+        assert stats['count'] == 5
+        assert stats['categories'] == {'book': 2, 'food': 2, 'toy': 1}
+        assert get('/items/recent')['items'][0]['id'] == 'item-9'
+
+        # 3. 集計レコード・処理済みマーカーは一覧に含まれない
+        table.put_item(Item=items[0])
+        listing = get('/items')
+        assert [item['id'] for item in listing['items']] == ['item-0']
+
+        # 4. ストリームを経ずに書き込まれた既存のアイテムから集計を作り直す（トゥームストーンは除く）
+        table.put_item(Item={'id': 'legacy', 'name': '既存', 'category': 'food', 'updatedAt': '2024-11-24T00:00:00'})
+        table.put_item(Item={'id': 'deleted', 'category': 'toy', 'deletedAt': '2024-11-24T00:00:00'})
+        result = handler.bulk_handler({'action': 'rebuild', 'segments': 2}, None)
+        assert result == {'count': 2, 'categories': 1, 'recent': 2}
+        stats = get('/items/stats')
+        assert stats['count'] == 2
+        assert stats['categories'] == {'food': 2}
+        assert [item['id'] for item in get('/items/recent')['items']] == ['legacy', 'item-0']
+
+        # 作り直し後の削除は件数を負にしない
+        result = handler.stream_handler({'Records': [record('REMOVE', old=items[0])]}, None)
+        assert result == {'applied': 1, 'skipped': 0}
+        stats = get('/items/stats')
+        assert stats['count'] == 1
+        assert stats['categories'] == {'food': 1}
+        assert [item['id'] for item in get('/items/recent')['items']] == ['legacy']
+
+    @mock_aws
+    def test_bulk_export_and_import(self, aws_credentials, monkeypatch):
+        """S3経由のNDJSONエクスポートとインポートのテスト"""
+
+        # DynamoDBテーブルとバケットを作成
+        dynamodb = boto3.resource('dynamodb', region_name='ap-northeast-1')
+        table = dynamodb.create_table(
+            TableName='test-integration-table',
+            KeySchema=[
+                {'AttributeName': 'id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        s3 = boto3.client('s3', region_name='ap-northeast-1')
+        s3.create_bucket(
+            Bucket='test-bulk-bucket',
+            CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-1'}
+        )
+
+        # handlerにテーブルとS3クライアントを直接設定
+        handler.dynamodb = dynamodb
+        handler.table = table
+        monkeypatch.setattr(handler, 's3', s3)
+        monkeypatch.setattr(handler, 'BULK_BUCKET', 'test-bulk-bucket')
+
+        with table.batch_writer() as writer:
+            for i in range(250):
+                writer.put_item(Item={'id': f'item-{i:03d}', 'name': f'商品{i}', 'price': Decimal(str(i * 1.5))})
+
+        def post(action, body):
+            event = {
+                'httpMethod': 'POST',
+                'path': f'/items:{action}',
+                'resource': f'/items:{action}',
+                'pathParameters': None,
+                'body': json.dumps(body)
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200
+            return json.loads(response['body'])
+
+        # 1. エクスポート（NDJSONとしてS3に保存し、署名付きURLを返す）
+        exported = post('export', {'segments': 3})
+        assert exported['count'] == 250
+        assert exported['key'] in exported['url']
+        lines = s3.get_object(Bucket='test-bulk-bucket', Key=exported['key'])['Body'].read().splitlines()
+        assert len(lines) == 250
+        assert json.loads(lines[0])['id'].startswith('item-')
+
+        # 2. テーブルを空にしてから、不正な行を含むNDJSONをインポート
+        with table.batch_writer() as writer:
+            for i in range(250):
+                writer.delete_item(Key={'id': f'item-{i:03d}'})
+        body = b'\n'.join(lines) + b'\nnot json\n{"name": "no id"}\n\n'
+        s3.put_object(Bucket='test-bulk-bucket', Key='imports/items.ndjson', Body=body)
+        imported = post('import', {'key': 'imports/items.ndjson'})
+        assert imported['imported'] == 250
+        assert imported['failed'] == 2
+        assert [e['line'] for e in imported['errors']] == [251, 252]
+
+        # 3. 数値の精度を保ったまま復元される
+        item = table.get_item(Key={'id': 'item-003'})['Item']
+        assert item['price'] == Decimal('4.5')
+        assert table.scan(Select='COUNT')['Count'] == 250
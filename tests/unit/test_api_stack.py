@@ -0,0 +1,299 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION', '1')
+
+# stacksモジュールをインポートするためにパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import aws_cdk as cdk
+from aws_cdk.assertions import Match, Template
+
+from stacks.api_stack import ApiStack
+
+
+def synth(environment):
+    # Dockerでの依存パッケージのバンドリングは行わずに合成する
+    app = cdk.App(context={'aws:cdk:bundling-stacks': []})
+    stack = ApiStack(app, f"ApiStack-{environment}", environment=environment)
+    return Template.from_stack(stack)
+
+
+@pytest.fixture(scope='module')
+def prod_template():
+    return synth('prod')
+
+
+@pytest.fixture(scope='module')
+def dev_template():
+    return synth('dev')
+
+
+class TestApiStack:
+    """ApiStackの合成結果のテスト"""
+
+    def test_prod_stage_caching(self, prod_template):
+        """本番ではキャッシュクラスターとGETのメソッドキャッシュを有効にするテスト"""
+        prod_template.has_resource_properties('AWS::ApiGateway::Stage', {
+            'CacheClusterEnabled': True,
+            'CacheClusterSize': '0.5',
+            'MethodSettings': Match.array_with([
+                Match.object_like({
+                    'HttpMethod': 'GET',
+                    'ResourcePath': '/~1items',
+                    'CachingEnabled': True,
+                    'CacheTtlInSeconds': 30,
+                }),
+                Match.object_like({
+                    'HttpMethod': 'GET',
+                    'ResourcePath': '/~1items~1{id}',
+                    'CachingEnabled': True,
+                    'CacheTtlInSeconds': 60,
+                }),
+            ]),
+        })
+
+    def test_cache_key_parameters(self, prod_template):
+        """パスのIDとページングのパラメータがキャッシュキーに含まれるテスト"""
+        prod_template.has_resource_properties('AWS::ApiGateway::Method', {
+            'HttpMethod': 'GET',
+            'RequestParameters': Match.object_like({'method.request.path.id': True}),
+            'Integration': Match.object_like({
+                'CacheKeyParameters': Match.array_with(['method.request.path.id']),
+            }),
+        })
+        prod_template.has_resource_properties('AWS::ApiGateway::Method', {
+            'HttpMethod': 'GET',
+            'Integration': Match.object_like({
+                'CacheKeyParameters': Match.array_with([
+                    'method.request.querystring.limit',
+                    'method.request.querystring.nextToken',
+                ]),
+            }),
+        })
+
+    def test_dev_stage_without_caching(self, dev_template):
+        """開発環境ではキャッシュを無効にしてスロットリングのみ設定するテスト"""
+        dev_template.has_resource_properties('AWS::ApiGateway::Stage', {
+            'CacheClusterEnabled': False,
+            'MethodSettings': Match.array_with([
+                Match.object_like({
+                    'HttpMethod': '*',
+                    'ResourcePath': '/*',
+                    'ThrottlingRateLimit': 50,
+                    'ThrottlingBurstLimit': 100,
+                }),
+            ]),
+        })
+        stage = next(iter(dev_template.find_resources('AWS::ApiGateway::Stage').values()))
+        assert not any(s.get('CachingEnabled') for s in stage['Properties']['MethodSettings'])
+
+    def test_batch_route_throttling(self, prod_template):
+        """バッチ操作のルートに個別のスロットリングを設定するテスト"""
+        prod_template.has_resource_properties('AWS::ApiGateway::Stage', {
+            'MethodSettings': Match.array_with([
+                Match.object_like({
+                    'HttpMethod': 'POST',
+                    'ResourcePath': '/~1items:batchWrite',
+                    'ThrottlingRateLimit': 100,
+                    'ThrottlingBurstLimit': 200,
+                }),
+            ]),
+        })
+
+    def test_function_profile(self, prod_template, dev_template):
+        """環境別のメモリ・タイムアウト・アーキテクチャ・予約同時実行数のテスト"""
+        prod_template.has_resource_properties('AWS::Lambda::Function', {
+            'MemorySize': 1024,
+            'Timeout': 10,
+            'Architectures': ['arm64'],
+            'ReservedConcurrentExecutions': 200,
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'MemorySize': 512,
+            'Architectures': ['arm64'],
+            'ReservedConcurrentExecutions': Match.absent(),
+        })
+
+    def test_alias_provisioned_concurrency(self, prod_template, dev_template):
+        """本番のエイリアスにプロビジョニング済み同時実行と使用率によるスケーリングを設定するテスト"""
+        prod_template.has_resource_properties('AWS::Lambda::Alias', {
+            'Name': 'live',
+            'ProvisionedConcurrencyConfig': {'ProvisionedConcurrentExecutions': 5},
+        })
+        prod_template.has_resource_properties('AWS::ApplicationAutoScaling::ScalableTarget', {
+            'MinCapacity': 5,
+            'MaxCapacity': 50,
+            'ScalableDimension': 'lambda:function:ProvisionedConcurrency',
+        })
+        prod_template.has_resource_properties('AWS::ApplicationAutoScaling::ScalingPolicy', {
+            'TargetTrackingScalingPolicyConfiguration': Match.object_like({
+                'TargetValue': 0.7,
+                'PredefinedMetricSpecification': {
+                    'PredefinedMetricType': 'LambdaProvisionedConcurrencyUtilization',
+                },
+            }),
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Alias', {
+            'Name': 'live',
+            'ProvisionedConcurrencyConfig': Match.absent(),
+        })
+        dev_template.resource_count_is('AWS::ApplicationAutoScaling::ScalableTarget', 0)
+
+    def test_prod_table_provisioned_autoscaling(self, prod_template):
+        """本番のテーブルとGSIをプロビジョニング済みキャパシティで自動スケールするテスト"""
+        prod_template.has_resource_properties('AWS::DynamoDB::Table', {
+            'ProvisionedThroughput': {'ReadCapacityUnits': 25, 'WriteCapacityUnits': 10},
+            'WarmThroughput': {'ReadUnitsPerSecond': 15000, 'WriteUnitsPerSecond': 5000},
+            'GlobalSecondaryIndexes': Match.array_with([
+                Match.object_like({
+                    'IndexName': 'category-createdAt-index',
+                    'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 10},
+                }),
+            ]),
+        })
+        prod_template.has_resource_properties('AWS::ApplicationAutoScaling::ScalableTarget', {
+            'ScalableDimension': 'dynamodb:table:ReadCapacityUnits',
+            'MinCapacity': 25,
+            'MaxCapacity': 1000,
+        })
+        targets = prod_template.find_resources('AWS::ApplicationAutoScaling::ScalableTarget', {
+            'Properties': {'ScalableDimension': 'dynamodb:index:WriteCapacityUnits'},
+        })
+        assert len(targets) == 3
+        policies = prod_template.find_resources('AWS::ApplicationAutoScaling::ScalingPolicy', {
+            'Properties': {
+                'TargetTrackingScalingPolicyConfiguration': {
+                    'TargetValue': 70,
+                    'PredefinedMetricSpecification': {
+                        'PredefinedMetricType': Match.string_like_regexp('DynamoDB(Read|Write)CapacityUtilization'),
+                    },
+                },
+            },
+        })
+        # テーブルの読み込み・書き込み + GSI 3つの読み込み・書き込み
+        assert len(policies) == 8
+
+    def test_dev_table_on_demand(self, dev_template):
+        """開発環境のテーブルはオンデマンドで上限のみ設定するテスト"""
+        dev_template.has_resource_properties('AWS::DynamoDB::Table', {
+            'BillingMode': 'PAY_PER_REQUEST',
+            'OnDemandThroughput': {'MaxReadRequestUnits': 500, 'MaxWriteRequestUnits': 200},
+            'ProvisionedThroughput': Match.absent(),
+        })
+        policies = dev_template.find_resources('AWS::ApplicationAutoScaling::ScalingPolicy')
+        assert policies == {}
+
+    def test_ingest_queue_consumer(self, dev_template):
+        """取り込みキューとコンシューマーのイベントソースのテスト"""
+        dev_template.has_resource_properties('AWS::SQS::Queue', {
+            'QueueName': 'dev-items-ingest',
+            'VisibilityTimeout': 180,
+            'RedrivePolicy': Match.object_like({'maxReceiveCount': 5}),
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-ingest-consumer',
+            'Handler': 'handler.ingest_handler',
+            'Timeout': 30,
+        })
+        dev_template.has_resource_properties('AWS::Lambda::EventSourceMapping', {
+            'BatchSize': 100,
+            'MaximumBatchingWindowInSeconds': 1,
+            'FunctionResponseTypes': ['ReportBatchItemFailures'],
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-api-handler',
+            'Environment': {'Variables': Match.object_like({'INGEST_MODE': 'sync'})},
+        })
+
+    def test_idempotency_settings(self, dev_template):
+        """冪等キーの記録の保持期間とキャッシュ件数を環境変数で渡すテスト"""
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-api-handler',
+            'Environment': {'Variables': Match.object_like({
+                'IDEMPOTENCY_TTL_SECONDS': '86400',
+                'IDEMPOTENCY_CACHE_SIZE': '1000',
+            })},
+        })
+
+    def test_staged_indexes(self):
+        """既存のテーブルへインデックスを1つずつ追加するためのindex_countのテスト"""
+        app = cdk.App(context={'aws:cdk:bundling-stacks': []})
+        template = Template.from_stack(ApiStack(app, 'ApiStack-staged', index_count=1))
+        table = next(
+            resource for resource in template.find_resources('AWS::DynamoDB::Table').values()
+            if resource['Properties'].get('TableName') == 'dev-items-table'
+        )
+        assert [index['IndexName'] for index in table['Properties']['GlobalSecondaryIndexes']] == [
+            'createdDay-createdAt-index'
+        ]
+        template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-api-handler',
+            'Environment': {'Variables': Match.object_like({'QUERY_INDEXES': 'createdDay-createdAt-index'})},
+        })
+        with pytest.raises(ValueError):
+            ApiStack(cdk.App(), 'ApiStack-invalid-indexes', index_count=4)
+
+    def test_invalid_ingest_mode(self):
+        """未知の取り込みモードを指定した場合のテスト"""
+        with pytest.raises(ValueError):
+            ApiStack(cdk.App(), 'ApiStack-invalid', ingest_mode='kinesis')
+
+    def test_stream_processor(self, dev_template):
+        """テーブルのストリームと集計処理のイベントソースのテスト"""
+        dev_template.has_resource_properties('AWS::DynamoDB::Table', {
+            'StreamSpecification': {'StreamViewType': 'NEW_AND_OLD_IMAGES'},
+            'TimeToLiveSpecification': {'AttributeName': 'expiresAt', 'Enabled': True},
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-stream-processor',
+            'Handler': 'handler.stream_handler',
+        })
+        dev_template.has_resource_properties('AWS::Lambda::EventSourceMapping', {
+            'StartingPosition': 'TRIM_HORIZON',
+            'MaximumRetryAttempts': 10,
+            'FilterCriteria': {'Filters': [{'Pattern': Match.string_like_regexp('anything-but')}]},
+            'DestinationConfig': Match.object_like({'OnFailure': Match.any_value()}),
+        })
+
+    def test_control_table(self, dev_template):
+        """処理済みマーカー・冪等キーの記録をアイテムとは別のTTL付きテーブルに保存する設定のテスト"""
+        dev_template.has_resource_properties('AWS::DynamoDB::Table', {
+            'TableName': 'dev-items-control-table',
+            'BillingMode': 'PAY_PER_REQUEST',
+            'TimeToLiveSpecification': {'AttributeName': 'expiresAt', 'Enabled': True},
+        })
+        for function_name in ('dev-api-handler', 'dev-stream-processor'):
+            dev_template.has_resource_properties('AWS::Lambda::Function', {
+                'FunctionName': function_name,
+                'Environment': {'Variables': Match.object_like({'CONTROL_TABLE_NAME': Match.any_value()})},
+            })
+
+    def test_soft_delete_settings(self, dev_template):
+        """論理削除のモード・トゥームストーンの保持期間と一括論理削除のルートのテスト"""
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-api-handler',
+            'Environment': {'Variables': Match.object_like({
+                'DELETE_MODE': 'soft',
+                'TOMBSTONE_TTL_SECONDS': '86400',
+            })},
+        })
+        dev_template.has_resource_properties('AWS::ApiGateway::Resource', {'PathPart': 'items:deleteByFilter'})
+
+    def test_bulk_bucket_and_function(self, dev_template):
+        """一括インポート・エクスポート用のバケットと関数のテスト"""
+        dev_template.has_resource_properties('AWS::S3::Bucket', {
+            'PublicAccessBlockConfiguration': Match.object_like({'BlockPublicAcls': True}),
+            'LifecycleConfiguration': {'Rules': Match.array_with([
+                Match.object_like({'Prefix': 'exports/', 'ExpirationInDays': 7}),
+            ])},
+        })
+        dev_template.has_resource_properties('AWS::Lambda::Function', {
+            'FunctionName': 'dev-bulk-handler',
+            'Handler': 'handler.bulk_handler',
+            'Timeout': 900,
+        })
+        dev_template.has_resource_properties('AWS::ApiGateway::Resource', {'PathPart': 'items:export'})
+        dev_template.has_resource_properties('AWS::ApiGateway::Resource', {'PathPart': 'items:import'})
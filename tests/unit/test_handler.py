@@ -1,7 +1,13 @@
+import asyncio
+import base64
+import gzip
 import json
 import os
 import sys
+import threading
+import time
 import pytest
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
 # 環境変数を先に設定
@@ -44,9 +50,257 @@ class TestLambdaHandler:
         # 検証
         assert response['statusCode'] == 200
         body = json.loads(response['body'])
-        assert len(body) == 2
-        assert body[0]['id'] == '1'
-        mock_table.scan.assert_called_once()
+        assert len(body['items']) == 2
+        assert body['items'][0]['id'] == '1'
+        assert body['nextToken'] is None
+        mock_table.scan.assert_called_once_with(Limit=handler.DEFAULT_PAGE_LIMIT, **handler.live_filter())
+
+    @patch('functions.handler._get_table')
+    def test_get_items_pagination(self, mock_get_table):
+        """limitとnextTokenによるページングのテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.scan.return_value = {
+            'Items': [{'id': '3', 'name': 'Item 3'}],
+            'LastEvaluatedKey': {'id': '3'}
+        }
+        token = handler.encode_page_token({'id': '2'})
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'limit': '1', 'nextToken': token},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == 1
+        assert handler.decode_page_token(body['nextToken']) == {'id': '3'}
+        mock_table.scan.assert_called_once_with(Limit=1, ExclusiveStartKey={'id': '2'}, **handler.live_filter())
+
+    def test_build_page_follows_last_evaluated_key(self):
+        """DynamoDBの1MBページを跨いでlimit件まで取得するテスト"""
+        fetch = MagicMock(side_effect=[
+            {'Items': [{'id': '1'}], 'LastEvaluatedKey': {'id': '1'}},
+            {'Items': [{'id': '2'}, {'id': '3'}]},
+        ])
+
+        fragments, next_key = handler.build_page(fetch, 5)
+
+        assert [json.loads(f)['id'] for f in fragments] == ['1', '2', '3']
+        assert next_key is None
+        fetch.assert_called_with(Limit=4, ExclusiveStartKey={'id': '1'})
+
+    def test_build_page_stops_at_byte_budget(self):
+        """バイト数上限でページを打ち切るテスト"""
+        fetch = MagicMock(return_value={
+            'Items': [{'id': str(i), 'data': 'x' * 100} for i in range(10)],
+            'LastEvaluatedKey': {'id': '9'}
+        })
+
+        fragments, next_key = handler.build_page(fetch, 10, max_bytes=300)
+
+        assert len(fragments) == 2
+        assert next_key == {'id': '1'}
+
+    @patch('functions.handler._get_table')
+    def test_get_items_invalid_query(self, mock_get_table):
+        """不正なlimit/nextTokenのテスト"""
+        mock_get_table.return_value = MagicMock()
+
+        invalid_keys = ({'id': '1', 'name': 'x'}, {'name': 'x'}, {'id': 1}, {'id': {'S': '1'}})
+        for params in (
+            {'limit': 'abc'}, {'limit': '0'}, {'nextToken': '!!!'},
+            *({'nextToken': handler.encode_page_token(key)} for key in invalid_keys),
+            # 検索方法（インデックス）とキー属性が一致しないトークン
+            {'category': 'book', 'nextToken': handler.encode_page_token({'id': '1'})},
+        ):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/items',
+                'pathParameters': None,
+                'queryStringParameters': params,
+                'body': None
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 400
+
+    def test_parallel_scan_reads_all_segments(self):
+        """並列スキャンが全セグメントの全ページを返すテスト"""
+        def fake_scan(Segment, TotalSegments, ExclusiveStartKey=None):
+            # 各セグメントは2ページ構成
+            if ExclusiveStartKey is None:
+                return {'Items': [{'id': f'{Segment}-a'}], 'LastEvaluatedKey': {'id': f'{Segment}-a'}}
+            return {'Items': [{'id': f'{Segment}-b'}]}
+
+        items = list(handler.parallel_scan(fake_scan, 3, max_workers=2))
+
+        assert sorted(item['id'] for item in items) == ['0-a', '0-b', '1-a', '1-b', '2-a', '2-b']
+
+    def test_parallel_scan_propagates_errors(self):
+        """セグメントのスキャンで発生した例外が呼び出し側に伝わるテスト"""
+        def fake_scan(Segment, TotalSegments):
+            if Segment == 1:
+                raise RuntimeError('scan failed')
+            return {'Items': [{'id': str(Segment)}]}
+
+        with pytest.raises(RuntimeError):
+            list(handler.parallel_scan(fake_scan, 4))
+
+    @patch('functions.handler._get_table')
+    def test_export_items(self, mock_get_table):
+        """エクスポートモードのテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.scan.side_effect = lambda **kwargs: {'Items': [{'id': str(kwargs['Segment'])}]}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'mode': 'export', 'segments': '2'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == 2
+        assert sorted(item['id'] for item in body['items']) == ['0', '1']
+        assert mock_table.scan.call_count == 2
+
+        # 実行・検証（1レスポンスの上限を超える場合は413でS3へのエクスポートを案内する）
+        with patch.object(handler, 'MAX_RESPONSE_BYTES', 10):
+            response = handler.lambda_handler(event, None)
+        assert response['statusCode'] == 413
+        assert 'POST /items:export' in json.loads(response['body'])['message']
+
+    @patch('functions.handler._get_table')
+    def test_query_items_uses_category_index(self, mock_get_table):
+        """category指定時にインデックスをQueryするテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.query.return_value = {'Items': [{'id': '1', 'category': 'book'}]}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {
+                'category': 'book', 'status': 'active', 'createdAfter': '2024-11-01T00:00:00'
+            },
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        assert response['headers']['X-Query-Plan'] == f'query:{handler.CATEGORY_INDEX}'
+        params = mock_table.query.call_args.kwargs
+        assert params['IndexName'] == handler.CATEGORY_INDEX
+        assert params['KeyConditionExpression'] == '#pk = :pk AND #createdAt >= :after'
+        assert params['FilterExpression'] == '#status = :status'
+        assert params['ExpressionAttributeValues'] == {
+            ':pk': 'book', ':after': '2024-11-01T00:00:00', ':status': 'active'
+        }
+        mock_table.scan.assert_not_called()
+
+    @patch('functions.handler._get_table')
+    @patch('functions.handler.datetime')
+    def test_query_items_plan_selection(self, mock_datetime, mock_get_table):
+        """日別インデックスとスキャンへのフォールバックのテスト"""
+        from datetime import datetime
+
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.query.return_value = {'Items': []}
+        mock_table.scan.return_value = {'Items': []}
+        mock_datetime.fromisoformat.side_effect = datetime.fromisoformat
+        mock_datetime.now.return_value = datetime(2024, 11, 21, 12, 0, 0)
+
+        def plan_for(params):
+            event = {
+                'httpMethod': 'GET',
+                'path': '/items',
+                'pathParameters': None,
+                'queryStringParameters': params,
+                'body': None
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 200
+            return response['headers']['X-Query-Plan']
+
+        # 検証
+        assert plan_for({'createdAfter': '2024-11-19T00:00:00'}) == f'query:{handler.CREATED_DAY_INDEX}'
+        assert [c.kwargs['ExpressionAttributeValues'][':pk'] for c in mock_table.query.call_args_list] == [
+            '2024-11-19', '2024-11-20', '2024-11-21'
+        ]
+        assert plan_for({'createdAfter': '2023-01-01T00:00:00'}) == 'scan'
+        assert plan_for({'createdBefore': '2024-11-01T00:00:00'}) == 'scan'
+        assert mock_table.scan.call_args.kwargs['FilterExpression'] == (
+            '(#createdAt <= :before) AND attribute_not_exists(#deletedAt)'
+        )
+
+    @patch('functions.handler._get_table')
+    def test_query_items_invalid_timestamp(self, mock_get_table):
+        """不正な日時指定のテスト"""
+        mock_get_table.return_value = MagicMock()
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'createdAfter': 'yesterday'},
+            'body': None
+        }
+
+        response = handler.lambda_handler(event, None)
+
+        assert response['statusCode'] == 400
+
+    @patch('functions.handler._get_table')
+    def test_query_items_reversed_range(self, mock_get_table):
+        """createdAfterがcreatedBeforeより後の場合のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {
+                'createdAfter': '2024-11-20T00:00:00', 'createdBefore': '2024-11-19T00:00:00'
+            },
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 400
+        assert 'createdBefore' in json.loads(response['body'])['message']
+        mock_table.query.assert_not_called()
+        mock_table.scan.assert_not_called()
 
     @patch('functions.handler._get_table')
     def test_get_single_item(self, mock_get_table):
@@ -54,16 +308,640 @@ class TestLambdaHandler:
         # モックの設定
         mock_table = MagicMock()
         mock_get_table.return_value = mock_table
-        mock_table.get_item.return_value = {
-            'Item': {'id': '123', 'name': 'Test Item', 'price': 1000}
-        }
+        mock_table.get_item.return_value = {
+            'Item': {'id': '123', 'name': 'Test Item', 'price': 1000}
+        }
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['id'] == '123'
+        assert body['name'] == 'Test Item'
+        mock_table.get_item.assert_called_once_with(Key={'id': '123'})
+
+    @patch('functions.handler._get_table')
+    def test_get_single_item_cached(self, mock_get_table):
+        """単一アイテム取得のキャッシュとPUT/DELETEでの無効化のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {'Item': {'id': '123', 'name': 'Test Item'}}
+        get_event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+        put_event = dict(get_event, httpMethod='PUT', body=json.dumps({'name': 'Updated'}))
+        delete_event = dict(get_event, httpMethod='DELETE')
+
+        with patch.object(handler, 'item_cache', handler.ItemCache(10, 60)) as cache:
+            first = handler.lambda_handler(get_event, None)
+            second = handler.lambda_handler(get_event, None)
+            handler.lambda_handler(put_event, None)
+            third = handler.lambda_handler(get_event, None)
+            handler.lambda_handler(delete_event, None)
+            handler.lambda_handler(get_event, None)
+
+        # 検証
+        assert first['headers']['X-Cache'] == 'MISS'
+        assert second['headers']['X-Cache'] == 'HIT'
+        assert third['headers']['X-Cache'] == 'MISS'
+        assert json.loads(second['body'])['name'] == 'Test Item'
+        # GET 3回 + PUTでのversionの読み込み 1回
+        assert mock_table.get_item.call_count == 4
+        assert cache.stats() == {'hits': 1, 'misses': 3, 'size': 1}
+
+    @patch('functions.handler._get_table')
+    def test_get_single_item_with_fields(self, mock_get_table):
+        """fieldsクエリパラメータによる属性の絞り込みのテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {'Item': {'id': '123', 'name': 'Test Item'}}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'queryStringParameters': {'fields': 'name, price'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        mock_table.get_item.assert_called_once_with(
+            Key={'id': '123'},
+            ProjectionExpression='#p0,#p1,#p2,#p3',
+            ExpressionAttributeNames={'#p0': 'id', '#p1': 'name', '#p2': 'price', '#p3': 'deletedAt'},
+        )
+
+    @patch('functions.handler._get_table')
+    def test_list_items_with_fields(self, mock_get_table):
+        """一覧取得でのProjectionExpressionのテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.scan.return_value = {'Items': [{'id': '1', 'name': 'Item 1'}]}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items',
+            'pathParameters': None,
+            'queryStringParameters': {'fields': 'name'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        mock_table.scan.assert_called_once_with(
+            ProjectionExpression='#p0,#p1',
+            ExpressionAttributeNames={'#p0': 'id', '#p1': 'name', '#deletedAt': 'deletedAt'},
+            FilterExpression='attribute_not_exists(#deletedAt)',
+            Limit=handler.DEFAULT_PAGE_LIMIT,
+        )
+
+    @patch('functions.handler._get_table')
+    def test_get_item_if_none_match(self, mock_get_table):
+        """ETagとIf-None-Matchによる条件付き取得のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {'Item': {'id': '123', 'name': 'Test Item'}}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+
+        # 実行
+        first = handler.lambda_handler(event, None)
+        etag = first['headers']['ETag']
+        second = handler.lambda_handler(dict(event, headers={'if-none-match': etag}), None)
+        mock_table.get_item.return_value = {'Item': {'id': '123', 'name': 'Changed'}}
+        third = handler.lambda_handler(dict(event, headers={'If-None-Match': etag}), None)
+
+        # 検証
+        assert first['statusCode'] == 200
+        assert second['statusCode'] == 304
+        assert second['body'] == ''
+        assert second['headers']['ETag'] == etag
+        assert third['statusCode'] == 200
+        assert third['headers']['ETag'] != etag
+
+    @patch('functions.handler._get_table')
+    def test_get_item_invalid_fields(self, mock_get_table):
+        """不正なfieldsのテスト"""
+        mock_get_table.return_value = MagicMock()
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'queryStringParameters': {'fields': ' , '},
+            'body': None
+        }
+
+        response = handler.lambda_handler(event, None)
+
+        assert response['statusCode'] == 400
+
+    def test_item_cache_ttl_and_lru(self):
+        """ItemCacheの有効期限とLRU追い出しのテスト"""
+        now = [0.0]
+        cache = handler.ItemCache(2, 10, clock=lambda: now[0])
+
+        cache.put('a', {'id': 'a'})
+        cache.put('b', {'id': 'b'})
+        assert cache.get('a') == {'id': 'a'}
+        # 'b'が最も古く参照されたため追い出される
+        cache.put('c', {'id': 'c'})
+        assert cache.get('b') is None
+        assert cache.get('c') == {'id': 'c'}
+
+        now[0] = 11.0
+        assert cache.get('a') is None
+        assert cache.stats() == {'hits': 2, 'misses': 2, 'size': 1}
+
+    @patch('functions.handler._get_table')
+    def test_get_item_not_found(self, mock_get_table):
+        """存在しないアイテム取得のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/999',
+            'pathParameters': {'id': '999'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 404
+        body = json.loads(response['body'])
+        assert body['message'] == 'Item not found'
+
+    @patch('functions.handler._get_table')
+    @patch('functions.handler.datetime')
+    def test_create_item(self, mock_datetime, mock_get_table):
+        """アイテム作成のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_datetime.now.return_value.timestamp.return_value = 1732176000.0
+        mock_datetime.now.return_value.isoformat.return_value = '2024-11-21T10:00:00'
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'body': json.dumps({'name': 'New Item', 'price': 500})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 201
+        body = json.loads(response['body'])
+        assert body['name'] == 'New Item'
+        assert body['price'] == 500
+        assert 'id' in body
+        assert 'createdAt' in body
+        mock_table.put_item.assert_called_once()
+        assert mock_table.put_item.call_args.kwargs['ConditionExpression'] == 'attribute_not_exists(id)'
+
+    @patch('functions.handler._get_table')
+    def test_create_item_retries_on_id_conflict(self, mock_get_table):
+        """ID衝突時に再採番して作成を再試行するテスト"""
+        from botocore.exceptions import ClientError
+
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        conflict = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'conflict'}}, 'PutItem'
+        )
+        mock_table.put_item.side_effect = [conflict, None]
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'body': json.dumps({'name': 'New Item'})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 201
+        first_id = mock_table.put_item.call_args_list[0].kwargs['Item']['id']
+        second_id = mock_table.put_item.call_args_list[1].kwargs['Item']['id']
+        assert first_id != second_id
+        assert json.loads(response['body'])['id'] == second_id
+
+    @pytest.mark.parametrize('generator_class', [handler.UlidGenerator, handler.SnowflakeGenerator])
+    def test_id_generator_unique_and_sorted(self, generator_class):
+        """同一ミリ秒・複数スレッドでもIDが重複せず時刻順に並ぶテスト"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        generator = generator_class(clock=lambda: 1732176000000)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            ids = list(executor.map(lambda _: generator(), range(2000)))
+
+        assert len(set(ids)) == len(ids)
+        assert len({len(item_id) for item_id in ids}) == 1
+
+        sequential = [generator() for _ in range(100)]
+        assert sequential == sorted(sequential)
+        later = generator_class(clock=lambda: 1732176000001)()
+        earlier = generator_class(clock=lambda: 1732176000000)()
+        assert earlier < later
+
+    def test_snowflake_rejected_in_queue_mode(self):
+        """条件付き書き込みで衝突を検出できないqueueモードではsnowflakeを使えないテスト"""
+        with pytest.raises(ValueError, match='INGEST_MODE=queue'):
+            handler.create_id_generator('snowflake', 'queue')
+        assert isinstance(handler.create_id_generator('snowflake', 'sync'), handler.SnowflakeGenerator)
+        assert isinstance(handler.create_id_generator('ulid', 'queue'), handler.UlidGenerator)
+
+    @patch('functions.handler._get_table')
+    @patch('functions.handler.datetime')
+    def test_update_item(self, mock_datetime, mock_get_table):
+        """アイテム更新のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_datetime.now.return_value.isoformat.return_value = '2024-11-21T11:00:00'
+        mock_table.get_item.return_value = {'Item': {'version': Decimal('2')}}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'PUT',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': json.dumps({'name': 'Updated Item', 'price': 1500})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['id'] == '123'
+        assert body['name'] == 'Updated Item'
+        assert body['price'] == 1500
+        assert 'updatedAt' in body
+        # versionを引き継いで1加算し、読み込み後に変わっていない場合のみ書き込む
+        assert body['version'] == 3
+        mock_table.put_item.assert_called_once()
+        params = mock_table.put_item.call_args.kwargs
+        assert params['ConditionExpression'] == '#version = :version'
+        assert params['ExpressionAttributeValues'] == {':version': Decimal('2')}
+
+    @patch('functions.handler._get_table')
+    def test_update_item_version_conflict(self, mock_get_table):
+        """PUTの書き込み前にversionが変わった場合に再試行し、上限で409を返すテスト"""
+        from botocore.exceptions import ClientError
+
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {}
+        mock_table.put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem'
+        )
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'PUT',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': json.dumps({'name': 'Updated Item'})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 409
+        assert mock_table.put_item.call_count == handler.CREATE_MAX_ATTEMPTS
+        assert mock_table.put_item.call_args.kwargs['ConditionExpression'] == 'attribute_not_exists(#version)'
+        assert mock_table.put_item.call_args.kwargs['Item']['version'] == 1
+
+    @pytest.mark.parametrize('method, path_parameters, body, message', [
+        ('POST', None, '[1, 2]', 'Request body must be a JSON object'),
+        ('POST', None, '{"name": ', 'Request body must be valid JSON'),
+        ('POST', None, '{"price": NaN}', 'Request body must be valid JSON'),
+        ('POST', None, '{"name": 1}', 'name must be a string'),
+        ('POST', None, '{"price": -1}', 'price must be greater than or equal to 0'),
+        ('POST', None, '{"category": ""}', 'category must be at least 1 characters'),
+        ('POST', None, '{"tags": ["a", 2]}', 'tags items must be a string'),
+        ('POST', None, '{"id": "x"}', 'id cannot be set'),
+        ('POST', None, '{"createdAt": "2024-01-01"}', 'createdAt cannot be set'),
+        ('PUT', {'id': '123'}, '{"id": "456"}', 'id cannot be set'),
+        ('PUT', {'id': '123'}, '{"version": 2}', 'version cannot be set'),
+        ('POST', None, '{"memo": ' + '1' * 39 + '}', 'Numbers cannot have more than 38 significant digits'),
+    ])
+    @patch('functions.handler._get_table')
+    def test_item_body_validation(self, mock_get_table, method, path_parameters, body, message):
+        """作成・更新のボディをスキーマで検証し、DynamoDBを呼び出さずに400を返すテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+
+        # イベントの作成
+        event = {
+            'httpMethod': method,
+            'path': '/items',
+            'pathParameters': path_parameters,
+            'body': body
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 400
+        assert json.loads(response['body'])['message'] == message
+        mock_table.put_item.assert_not_called()
+
+    @patch('functions.handler._get_table')
+    def test_item_body_size_limit(self, mock_get_table):
+        """アイテムサイズとボディ長の上限を超える場合に400を返すテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+
+        # イベントの作成（エスケープによりボディ長は上限未満でもアイテムサイズが上限を超える）
+        oversized = {'httpMethod': 'POST', 'path': '/items', 'pathParameters': None,
+                     'body': json.dumps({'memo': 'あ' * 140000}, ensure_ascii=False)}
+        too_long = dict(oversized, body=json.dumps({'memo': 'a' * handler.MAX_BODY_BYTES}))
+
+        # 実行・検証
+        for event in (oversized, too_long):
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 400
+            assert 'maximum size' in json.loads(response['body'])['message']
+        mock_table.put_item.assert_not_called()
+
+    @patch('functions.handler._get_table')
+    def test_put_item_decimal_and_matching_id(self, mock_get_table):
+        """小数をDecimalに変換し、パスと同じidを含むPUTを許可するテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'PUT',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': json.dumps({'id': '123', 'price': 19.99, 'extra': {'ratio': 0.5}})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        item = mock_table.put_item.call_args.kwargs['Item']
+        assert item['price'] == Decimal('19.99')
+        assert item['extra'] == {'ratio': Decimal('0.5')}
+
+    def test_item_size(self):
+        """DynamoDBのサイズ計算規則によるアイテムサイズの概算のテスト"""
+        assert handler.item_size({'name': 'abc'}) == 7
+        assert handler.item_size({'n': Decimal('123.45')}) == 1 + 4
+        assert handler.item_size({'tags': ['a', 'b'], 'ok': True}) == 4 + 3 + 2 * 2 + 2 + 1
+
+    def test_compile_update(self):
+        """PATCHボディからUpdateExpressionを組み立てるテスト"""
+        params = handler.compile_update(
+            {'name': 'New', 'memo': None, '$add': {'views': 1}, 'version': 3}, '2024-11-21T11:00:00'
+        )
+
+        assert params['UpdateExpression'] == (
+            'SET #version = if_not_exists(#version, :zero) + :one, #updatedAt = :updatedAt, #a0 = :a0'
+            ' REMOVE #a1 ADD #n0 :n0'
+        )
+        assert params['ConditionExpression'] == (
+            'attribute_exists(#key) AND attribute_not_exists(#deletedAt) AND #version = :expectedVersion'
+        )
+        assert params['ExpressionAttributeNames']['#a0'] == 'name'
+        assert params['ExpressionAttributeNames']['#a1'] == 'memo'
+        assert params['ExpressionAttributeNames']['#n0'] == 'views'
+        assert params['ExpressionAttributeValues'][':a0'] == 'New'
+        assert params['ExpressionAttributeValues'][':expectedVersion'] == 3
+        assert params['ReturnValues'] == 'UPDATED_NEW'
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'id': 'other'},
+        {'$add': {'views': 'one'}},
+        {'name': 'x', 'version': 'latest'},
+        {'views': 1, '$add': {'views': 1}},
+        # 作成時と同じスキーマで値を検証する
+        {'name': ''},
+        {'price': -1},
+        {'tags': ['ok', 1]},
+        {'$add': {'name': 1}},
+        # 予約属性はSET・ADDのどちらでも更新できない
+        {'createdAt': '2024-01-01T00:00:00'},
+        {'expiresAt': None},
+        {'$add': {'version': 1}},
+        {'$add': {'expiresAt': 60}},
+        {'deletedAt': '2024-01-01T00:00:00'},
+        {'createdDay': None},
+    ])
+    def test_compile_update_invalid(self, body):
+        """不正なPATCHボディのテスト"""
+        with pytest.raises(handler.ValidationError):
+            handler.compile_update(body, '2024-11-21T11:00:00')
+
+    def test_compile_update_schema(self):
+        """PATCHで既知の属性の妥当な値・削除と未知の属性への加算を許可するテスト"""
+        params = handler.compile_update(
+            {'price': Decimal('10.5'), 'description': None, '$add': {'stock': 1}}, 'now'
+        )
+
+        assert params['ExpressionAttributeValues'][':a0'] == Decimal('10.5')
+        assert 'REMOVE #a1' in params['UpdateExpression']
+
+    @patch('functions.handler._get_table')
+    def test_patch_item(self, mock_get_table):
+        """部分更新のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.update_item.return_value = {'Attributes': {'name': 'Patched', 'version': 2}}
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'PATCH',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': json.dumps({'name': 'Patched'})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == {'id': '123', 'name': 'Patched', 'version': 2}
+        assert mock_table.update_item.call_args.kwargs['Key'] == {'id': '123'}
+
+    @patch('functions.handler._get_table')
+    def test_patch_item_conflicts(self, mock_get_table):
+        """部分更新の条件不一致（存在しない・バージョン不一致）のテスト"""
+        from botocore.exceptions import ClientError
+
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        error = {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}
+        mock_table.update_item.side_effect = [
+            ClientError(error, 'UpdateItem'),
+            ClientError(dict(error, Item={'id': {'S': '123'}, 'version': {'N': '5'}}), 'UpdateItem'),
+        ]
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'PATCH',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': json.dumps({'name': 'Patched', 'version': 4})
+        }
+
+        # 実行
+        not_found = handler.lambda_handler(event, None)
+        conflict = handler.lambda_handler(event, None)
+
+        # 検証
+        assert not_found['statusCode'] == 404
+        assert conflict['statusCode'] == 409
+        assert json.loads(conflict['body'])['currentVersion'] == 5
+
+    @patch('functions.handler._get_table')
+    def test_delete_item(self, mock_get_table):
+        """アイテム削除のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        
+        # イベントの作成
+        event = {
+            'httpMethod': 'DELETE',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['message'] == 'Item deleted'
+        mock_table.delete_item.assert_called_once_with(Key={'id': '123'})
+
+    @patch('functions.handler._get_table')
+    @patch('functions.handler.time.sleep')
+    def test_batch_get_retries_unprocessed_keys(self, mock_sleep, mock_get_table):
+        """BatchGetItemのUnprocessedKeysを再試行するテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_table.name = 'test-table'
+        mock_get_table.return_value = mock_table
+        client = mock_table.meta.client
+        client.batch_get_item.side_effect = [
+            {
+                'Responses': {'test-table': [{'id': '1', 'name': 'Item 1'}]},
+                'UnprocessedKeys': {'test-table': {'Keys': [{'id': '2'}]}},
+            },
+            {'Responses': {'test-table': [{'id': '2', 'name': 'Item 2'}]}},
+        ]
+
+        # イベントの作成
+        event = {
+            'httpMethod': 'POST',
+            'path': '/items:batchGet',
+            'resource': '/items:batchGet',
+            'pathParameters': None,
+            'body': json.dumps({'ids': ['1', '2', '3', '1']})
+        }
+
+        # 実行
+        response = handler.lambda_handler(event, None)
+
+        # 検証
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert [r['success'] for r in body['results']] == [True, True, False]
+        assert body['results'][1]['item']['name'] == 'Item 2'
+        assert body['results'][2]['error'] == 'Item not found'
+        assert client.batch_get_item.call_count == 2
+        mock_sleep.assert_called_once()
+
+    @patch('functions.handler._get_table')
+    @patch('functions.handler.time.sleep')
+    def test_batch_write_chunks_and_reports_failures(self, mock_sleep, mock_get_table):
+        """BatchWriteItemを25件単位に分割し、未処理分を失敗として返すテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_table.name = 'test-table'
+        mock_get_table.return_value = mock_table
+        client = mock_table.meta.client
 
-        # イベントの作成
+        def fake_batch_write_item(RequestItems):
+            stuck = [r for r in RequestItems['test-table'] if r['PutRequest']['Item']['id'] == '0']
+            if stuck:
+                return {'UnprocessedItems': {'test-table': stuck}}
+            return {}
+        client.batch_write_item.side_effect = fake_batch_write_item
+        client.batch_get_item.return_value = {}
+
+        items = [{'id': str(i)} for i in range(30)] + [{'name': 'no id'}]
         event = {
-            'httpMethod': 'GET',
-            'path': '/items/123',
-            'pathParameters': {'id': '123'},
-            'body': None
+            'httpMethod': 'POST',
+            'path': '/items:batchWrite',
+            'resource': '/items:batchWrite',
+            'pathParameters': None,
+            'body': json.dumps({'items': items})
         }
 
         # 実行
@@ -72,116 +950,322 @@ class TestLambdaHandler:
         # 検証
         assert response['statusCode'] == 200
         body = json.loads(response['body'])
-        assert body['id'] == '123'
-        assert body['name'] == 'Test Item'
-        mock_table.get_item.assert_called_once_with(Key={'id': '123'})
+        assert body['succeeded'] == 29
+        assert body['failed'] == 2
+        failed = {r['id']: r['error'] for r in body['results'] if not r['success']}
+        assert failed == {None: 'ID is required', '0': 'Unprocessed'}
+        # 25件 + 5件の2チャンク、未処理チャンクはBATCH_MAX_RETRIES回再試行
+        assert client.batch_write_item.call_count == 2 + handler.BATCH_MAX_RETRIES
 
     @patch('functions.handler._get_table')
-    def test_get_item_not_found(self, mock_get_table):
-        """存在しないアイテム取得のテスト"""
+    def test_batch_write_chunk_error_is_isolated(self, mock_get_table):
+        """1チャンクの書き込みが例外になっても他のチャンクの成否を返すテスト"""
+        from botocore.exceptions import ClientError
+
         # モックの設定
         mock_table = MagicMock()
+        mock_table.name = 'test-table'
         mock_get_table.return_value = mock_table
-        mock_table.get_item.return_value = {}
+        client = mock_table.meta.client
 
-        # イベントの作成
+        def fake_batch_write_item(RequestItems):
+            if any(r['PutRequest']['Item']['id'] == 'bad' for r in RequestItems['test-table']):
+                raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'empty key'}}, 'BatchWriteItem')
+            return {}
+        client.batch_write_item.side_effect = fake_batch_write_item
+        client.batch_get_item.return_value = {}
+
+        items = [{'id': str(i)} for i in range(30)] + [{'id': 'bad'}]
         event = {
-            'httpMethod': 'GET',
-            'path': '/items/999',
-            'pathParameters': {'id': '999'},
-            'body': None
+            'httpMethod': 'POST',
+            'path': '/items:batchWrite',
+            'resource': '/items:batchWrite',
+            'pathParameters': None,
+            'body': json.dumps({'items': items})
         }
 
         # 実行
         response = handler.lambda_handler(event, None)
 
-        # 検証
-        assert response['statusCode'] == 404
+        # 検証（25件のチャンクは成功、'bad'を含む6件のチャンクは失敗）
+        assert response['statusCode'] == 200
         body = json.loads(response['body'])
-        assert body['message'] == 'Item not found'
+        assert body['succeeded'] == 25
+        assert body['failed'] == 6
+        assert all('empty key' in r['error'] for r in body['results'] if not r['success'])
 
     @patch('functions.handler._get_table')
-    @patch('functions.handler.datetime')
-    def test_create_item(self, mock_datetime, mock_get_table):
-        """アイテム作成のテスト"""
+    def test_async_handler(self, mock_get_table):
+        """非同期版エントリーポイントのテスト"""
         # モックの設定
         mock_table = MagicMock()
+        mock_table.name = 'test-table'
+        mock_table.get_item.return_value = {'Item': {'id': '1', 'name': 'Item 1'}}
         mock_get_table.return_value = mock_table
-        mock_datetime.now.return_value.timestamp.return_value = 1732176000.0
-        mock_datetime.now.return_value.isoformat.return_value = '2024-11-21T10:00:00'
+        client = mock_table.meta.client
+        client.batch_write_item.return_value = {}
+        client.batch_get_item.return_value = {}
+
+        # イベントの作成
+        batch_event = {
+            'httpMethod': 'POST',
+            'path': '/items:batchWrite',
+            'resource': '/items:batchWrite',
+            'pathParameters': None,
+            'body': json.dumps({'items': [{'id': str(i)} for i in range(60)]})
+        }
+        get_event = {
+            'httpMethod': 'GET',
+            'path': '/items/1',
+            'resource': '/items/{id}',
+            'pathParameters': {'id': '1'},
+        }
+
+        # 実行
+        batch_response = handler.async_lambda_handler(batch_event, None)
+        get_response = handler.async_lambda_handler(get_event, None)
+
+        # 検証
+        body = json.loads(batch_response['body'])
+        assert body['succeeded'] == 60
+        assert [r['id'] for r in body['results']] == [str(i) for i in range(60)]
+        assert client.batch_write_item.call_count == 3
+        assert json.loads(get_response['body'])['name'] == 'Item 1'
+
+        # 実行・検証（バッチ操作も同期版と同じルーティング・ミドルウェアを通る）
+        assert handler.async_lambda_handler(dict(batch_event, httpMethod='GET'), None)['statusCode'] == 405
+        with patch.object(handler.request_metrics, 'sample_rate', 1):
+            handler.async_lambda_handler(batch_event, None)
+        assert handler.request_metrics.phases['handler'] > 0
+
+    def test_gather_limited_caps_concurrency(self):
+        """gather_limitedの同時実行数制限と結果順序のテスト"""
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def work(i):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return i
+
+        funcs = [lambda i=i: work(i) for i in range(12)]
+        results = asyncio.run(handler.gather_limited(funcs, limit=3))
+
+        assert results == list(range(12))
+        assert state['peak'] <= 3
+
+    @patch('functions.handler._get_sqs')
+    @patch('functions.handler._get_table')
+    def test_create_item_queue_mode(self, mock_get_table, mock_get_sqs):
+        """取り込みモードqueueではキューに登録して202を返すテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_sqs = MagicMock()
+        mock_get_sqs.return_value = mock_sqs
 
         # イベントの作成
         event = {
             'httpMethod': 'POST',
             'path': '/items',
             'pathParameters': None,
-            'body': json.dumps({'name': 'New Item', 'price': 500})
+            'body': json.dumps({'name': 'New Item'})
         }
 
         # 実行
-        response = handler.lambda_handler(event, None)
+        with patch.object(handler, 'INGEST_MODE', 'queue'), \
+                patch.object(handler, 'INGEST_QUEUE_URL', 'https://sqs.example/queue'):
+            response = handler.lambda_handler(event, None)
 
         # 検証
-        assert response['statusCode'] == 201
+        assert response['statusCode'] == 202
         body = json.loads(response['body'])
         assert body['name'] == 'New Item'
-        assert body['price'] == 500
-        assert 'id' in body
-        assert 'createdAt' in body
-        mock_table.put_item.assert_called_once()
+        mock_table.put_item.assert_not_called()
+        kwargs = mock_sqs.send_message.call_args.kwargs
+        assert kwargs['QueueUrl'] == 'https://sqs.example/queue'
+        assert json.loads(kwargs['MessageBody'])['id'] == body['id']
 
     @patch('functions.handler._get_table')
-    @patch('functions.handler.datetime')
-    def test_update_item(self, mock_datetime, mock_get_table):
-        """アイテム更新のテスト"""
+    def test_idempotent_create_cache_and_race(self, mock_get_table):
+        """冪等キーの記録をキャッシュから返し、並行リクエストに先を越された場合は記録を返すテスト"""
+        from botocore.exceptions import ClientError
+
         # モックの設定
         mock_table = MagicMock()
+        mock_table.name = 'test-table'
+        mock_table.get_item.return_value = {}
         mock_get_table.return_value = mock_table
-        mock_datetime.now.return_value.isoformat.return_value = '2024-11-21T11:00:00'
+        client = mock_table.meta.client
 
         # イベントの作成
         event = {
-            'httpMethod': 'PUT',
-            'path': '/items/123',
-            'pathParameters': {'id': '123'},
-            'body': json.dumps({'name': 'Updated Item', 'price': 1500})
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'headers': {'Idempotency-Key': 'key-1'},
+            'body': json.dumps({'name': 'New Item'})
+        }
+
+        # 実行・検証（初回は記録とアイテムを1つのトランザクションで書き込み、再送はキャッシュから返す）
+        with patch.object(handler, 'idempotency_cache', handler.ItemCache(10, 60)):
+            first = handler.lambda_handler(event, None)
+            replayed = handler.lambda_handler(event, None)
+        assert first['statusCode'] == replayed['statusCode'] == 201
+        assert replayed['body'] == first['body']
+        assert replayed['headers']['Idempotent-Replayed'] == 'true'
+        assert mock_table.get_item.call_count == 1
+        actions = client.transact_write_items.call_args.kwargs['TransactItems']
+        assert actions[0]['Put']['Item']['id'] == '#idempotency#key-1'
+        assert actions[1]['Put']['Item']['id'] == json.loads(first['body'])['id']
+
+        # 実行・検証（記録の条件付き書き込みが失敗した場合は先に書き込まれた記録を返す）
+        record = {
+            'id': '#idempotency#key-2',
+            'fingerprint': handler.request_fingerprint(event),
+            'statusCode': Decimal('201'),
+            'response': {'id': 'winner', 'name': 'New Item'},
+        }
+        mock_table.get_item.side_effect = [{}, {'Item': record}]
+        client.transact_write_items.side_effect = ClientError({
+            'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+            'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}],
+        }, 'TransactWriteItems')
+        response = handler.lambda_handler(dict(event, headers={'Idempotency-Key': 'key-2'}), None)
+        assert response['statusCode'] == 201
+        assert json.loads(response['body'])['id'] == 'winner'
+
+        # 実行・検証（先に書き込まれた記録が読み込む前に削除された場合は書き込みを再試行する）
+        mock_table.get_item.side_effect = [{}, {}, {}]
+        client.transact_write_items.side_effect = [client.transact_write_items.side_effect, {}]
+        response = handler.lambda_handler(dict(event, headers={'Idempotency-Key': 'key-3'}), None)
+        assert response['statusCode'] == 201
+        assert client.transact_write_items.call_count == 4
+
+        # 実行・検証（再試行しても記録を読めない場合は409）
+        mock_table.get_item.side_effect = None
+        mock_table.get_item.return_value = {}
+        client.transact_write_items.side_effect = ClientError({
+            'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+            'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}],
+        }, 'TransactWriteItems')
+        response = handler.lambda_handler(dict(event, headers={'Idempotency-Key': 'key-4'}), None)
+        assert response['statusCode'] == 409
+
+    @patch('functions.handler._get_table')
+    def test_idempotent_create_size_limit(self, mock_get_table):
+        """冪等キー付きの作成は記録の分だけ小さいアイテムのみ受け付けるテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_table.get_item.return_value = {}
+        mock_get_table.return_value = mock_table
+
+        # イベントの作成（冪等キーなしでは作成できる大きさ）
+        body = {'name': 'Large', 'data': 'x' * (handler.ITEM_SCHEMA.max_item_bytes - 100)}
+        event = {
+            'httpMethod': 'POST',
+            'path': '/items',
+            'pathParameters': None,
+            'headers': {'Idempotency-Key': 'large-1'},
+            'body': json.dumps(body)
         }
 
         # 実行
         response = handler.lambda_handler(event, None)
 
         # 検証
-        assert response['statusCode'] == 200
-        body = json.loads(response['body'])
-        assert body['id'] == '123'
-        assert body['name'] == 'Updated Item'
-        assert body['price'] == 1500
-        assert 'updatedAt' in body
-        mock_table.put_item.assert_called_once()
+        assert response['statusCode'] == 400
+        assert 'Idempotency-Key' in json.loads(response['body'])['message']
+        mock_table.meta.client.transact_write_items.assert_not_called()
+        assert handler.lambda_handler(dict(event, headers={}), None)['statusCode'] == 201
 
     @patch('functions.handler._get_table')
-    def test_delete_item(self, mock_get_table):
-        """アイテム削除のテスト"""
+    @patch('functions.handler.time.sleep')
+    def test_ingest_handler_partial_failures(self, mock_sleep, mock_get_table):
+        """取り込みキューのコンシューマーが失敗したメッセージのみ返すテスト"""
         # モックの設定
         mock_table = MagicMock()
+        mock_table.name = 'test-table'
         mock_get_table.return_value = mock_table
-        
+        client = mock_table.meta.client
+
+        def fake_batch_write_item(RequestItems):
+            stuck = [r for r in RequestItems['test-table'] if r['PutRequest']['Item']['id'] == 'b']
+            return {'UnprocessedItems': {'test-table': stuck}} if stuck else {}
+        client.batch_write_item.side_effect = fake_batch_write_item
+
         # イベントの作成
-        event = {
-            'httpMethod': 'DELETE',
-            'path': '/items/123',
-            'pathParameters': {'id': '123'},
-            'body': None
-        }
+        event = {'Records': [
+            {'messageId': 'm1', 'body': json.dumps({'id': 'a', 'price': 1.5})},
+            {'messageId': 'm2', 'body': json.dumps({'id': 'b'})},
+            {'messageId': 'm3', 'body': 'not json'},
+            {'messageId': 'm4', 'body': json.dumps({'id': 'b', 'name': 'retry'})},
+        ]}
 
         # 実行
-        response = handler.lambda_handler(event, None)
+        result = handler.ingest_handler(event, None)
 
         # 検証
-        assert response['statusCode'] == 200
-        body = json.loads(response['body'])
-        assert body['message'] == 'Item deleted'
-        mock_table.delete_item.assert_called_once_with(Key={'id': '123'})
+        assert result == {'batchItemFailures': [
+            {'itemIdentifier': 'm3'}, {'itemIdentifier': 'm2'}, {'itemIdentifier': 'm4'},
+        ]}
+        written = client.batch_write_item.call_args_list[0].kwargs['RequestItems']['test-table']
+        assert written[0]['PutRequest']['Item'] == {'id': 'a', 'price': Decimal('1.5')}
+        assert written[1]['PutRequest']['Item']['name'] == 'retry'
+
+    @patch('functions.handler._get_s3')
+    def test_export_to_s3_multipart(self, mock_get_s3):
+        """エクスポートをパートサイズごとに分割してアップロードし、失敗時は中止するテスト"""
+        # モックの設定
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_s3.upload_part.side_effect = lambda **kwargs: {'ETag': f"etag-{kwargs['PartNumber']}"}
+        mock_table = MagicMock()
+        mock_table.scan.return_value = {'Items': [{'id': f'{i:03d}', 'name': 'x' * 40} for i in range(10)]}
+
+        # 実行
+        with patch.object(handler, 'BULK_BUCKET', 'bucket'), patch.object(handler, 'EXPORT_PART_SIZE', 100):
+            result = handler.export_to_s3(mock_table, segments=1, key='exports/test.ndjson')
+
+        # 検証
+        assert result['count'] == 10
+        assert result['parts'] == mock_s3.upload_part.call_count == 5
+        parts = mock_s3.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [part['PartNumber'] for part in parts] == [1, 2, 3, 4, 5]
+        body = b''.join(call.kwargs['Body'] for call in mock_s3.upload_part.call_args_list)
+        assert [json.loads(line)['id'] for line in body.splitlines()] == [f'{i:03d}' for i in range(10)]
+
+        mock_s3.upload_part.side_effect = Exception('upload failed')
+        with patch.object(handler, 'BULK_BUCKET', 'bucket'), pytest.raises(Exception):
+            handler.export_to_s3(mock_table, segments=1, key='exports/test.ndjson')
+        mock_s3.abort_multipart_upload.assert_called_once_with(
+            Bucket='bucket', Key='exports/test.ndjson', UploadId='upload-1'
+        )
+
+    @patch('functions.handler._get_table')
+    def test_batch_invalid_request(self, mock_get_table):
+        """バッチ操作の不正なリクエストのテスト"""
+        mock_get_table.return_value = MagicMock()
+
+        for resource, body in (
+            ('/items:batchGet', {}),
+            ('/items:batchDelete', {'ids': [1]}),
+            ('/items:batchWrite', {'items': []}),
+        ):
+            event = {
+                'httpMethod': 'POST',
+                'path': resource,
+                'resource': resource,
+                'pathParameters': None,
+                'body': json.dumps(body)
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == 400
 
     def test_create_response(self):
         """レスポンス作成関数のテスト"""
@@ -213,9 +1297,267 @@ class TestLambdaHandler:
         
         # 検証
         assert result == mock_table
-        mock_boto3.resource.assert_called_once_with('dynamodb')
+        mock_boto3.resource.assert_called_once()
+        assert mock_boto3.resource.call_args.args == ('dynamodb',)
+        config = mock_boto3.resource.call_args.kwargs['config']
+        assert config.retries == {
+            'mode': handler.CLIENT_RETRY_MODE, 'max_attempts': handler.CLIENT_MAX_ATTEMPTS
+        }
         mock_resource.Table.assert_called_once_with('test-table')
 
+    @patch('functions.handler.boto3')
+    def test_get_table_eager_initialization(self, mock_boto3):
+        """eagerモードで低レベルクライアントを使う初期化のテスト"""
+        # グローバル変数をリセット
+        handler.dynamodb = None
+        handler.table = None
+
+        try:
+            with patch.object(handler, 'DYNAMODB_INIT_MODE', 'eager'):
+                result = handler._get_table()
+
+            # 検証
+            assert isinstance(result, handler.ClientTable)
+            assert result.name == 'test-table'
+            assert 'client_ms' in handler.init_timings
+            mock_boto3.resource.assert_not_called()
+            config = mock_boto3.client.call_args.kwargs['config']
+            assert config.max_pool_connections == handler.CLIENT_MAX_POOL_CONNECTIONS
+            assert config.tcp_keepalive is True
+        finally:
+            handler.dynamodb = None
+            handler.table = None
+
+    def test_client_table_converts_types(self):
+        """ClientTableがDynamoDBの型表現と相互変換するテスト"""
+        from decimal import Decimal
+
+        client = MagicMock()
+        client.get_item.return_value = {'Item': {'id': {'S': '1'}, 'price': {'N': '100'}}}
+        client.scan.return_value = {
+            'Items': [{'id': {'S': '1'}}],
+            'LastEvaluatedKey': {'id': {'S': '1'}},
+        }
+        client.batch_write_item.return_value = {
+            'UnprocessedItems': {'t': [{'DeleteRequest': {'Key': {'id': {'S': '2'}}}}]}
+        }
+        client_table = handler.ClientTable(client, 't')
+
+        assert client_table.get_item(Key={'id': '1'}) == {'Item': {'id': '1', 'price': Decimal('100')}}
+        client.get_item.assert_called_once_with(TableName='t', Key={'id': {'S': '1'}})
+
+        response = client_table.scan(Limit=1, ExclusiveStartKey={'id': '0'})
+        assert response['Items'] == [{'id': '1'}]
+        assert response['LastEvaluatedKey'] == {'id': '1'}
+        client.scan.assert_called_once_with(TableName='t', Limit=1, ExclusiveStartKey={'id': {'S': '0'}})
+
+        response = client_table.meta.client.batch_write_item(RequestItems={'t': [
+            {'PutRequest': {'Item': {'id': '1'}}},
+            {'DeleteRequest': {'Key': {'id': '2'}}},
+        ]})
+        assert response['UnprocessedItems'] == {'t': [{'DeleteRequest': {'Key': {'id': '2'}}}]}
+        assert client.batch_write_item.call_args.kwargs['RequestItems'] == {'t': [
+            {'PutRequest': {'Item': {'id': {'S': '1'}}}},
+            {'DeleteRequest': {'Key': {'id': {'S': '2'}}}},
+        ]}
+
+        client_table.meta.client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': 't', 'Item': {'id': '3'}, 'ConditionExpression': 'attribute_not_exists(id)'}},
+            {'Update': {'TableName': 't', 'Key': {'id': '4'}, 'UpdateExpression': 'ADD n :n',
+                        'ExpressionAttributeValues': {':n': 1}}},
+        ])
+        assert client.transact_write_items.call_args.kwargs['TransactItems'] == [
+            {'Put': {'TableName': 't', 'Item': {'id': {'S': '3'}}, 'ConditionExpression': 'attribute_not_exists(id)'}},
+            {'Update': {'TableName': 't', 'Key': {'id': {'S': '4'}}, 'UpdateExpression': 'ADD n :n',
+                        'ExpressionAttributeValues': {':n': {'N': '1'}}}},
+        ]
+
+    def test_client_stats_counts_retries_and_throttles(self):
+        """リトライ・スロットリング回数の集計テスト"""
+        stats = handler.ClientStats()
+        throttled = (MagicMock(), {'Error': {'Code': 'ProvisionedThroughputExceededException'}})
+        succeeded = (MagicMock(), {'ResponseMetadata': {}})
+
+        assert stats._on_attempt(response=throttled, attempts=1) is None
+        stats._on_attempt(response=throttled, attempts=2)
+        stats._on_attempt(response=succeeded, attempts=3)
+        stats._on_attempt(response=None, attempts=1)
+
+        assert stats.snapshot() == {'calls': 2, 'retries': 2, 'throttles': 2}
+        stats.reset()
+        assert stats.snapshot() == {'calls': 0, 'retries': 0, 'throttles': 0}
+
+    @patch('functions.handler._get_table')
+    def test_client_stats_reset_per_invocation(self, mock_get_table, capsys):
+        """呼び出しごとに集計をリセットし、リトライ発生時に記録するテスト"""
+        # モックの設定（DynamoDB呼び出し中にスロットリングが発生した想定）
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+
+        def throttled_get_item(**kwargs):
+            handler.client_stats._on_attempt(
+                response=(None, {'Error': {'Code': 'ThrottlingException'}}), attempts=1
+            )
+            handler.client_stats._on_attempt(response=(None, {}), attempts=2)
+            return {'Item': {'id': '123'}}
+        mock_table.get_item.side_effect = throttled_get_item
+
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+
+        # 実行
+        handler.lambda_handler(event, None)
+        handler.lambda_handler(event, None)
+
+        # 検証
+        logs = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(logs) == 2
+        assert logs[-1]['message'] == 'dynamodb_client_stats'
+        assert logs[-1]['retries'] == 1
+        assert logs[-1]['throttles'] == 1
+
+    @patch('functions.handler._get_table')
+    def test_request_metrics_emits_emf(self, mock_get_table, capsys):
+        """サンプリングされた呼び出しでEMF形式のメトリクスを出力するテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        mock_table.get_item.return_value = {'Item': {'id': '123'}}
+        event = {
+            'httpMethod': 'GET',
+            'resource': '/items/{id}',
+            'path': '/items/123',
+            'pathParameters': {'id': '123'},
+            'body': None
+        }
+
+        # 実行（サンプリング率0では出力しない）
+        with patch.object(handler.request_metrics, 'sample_rate', 0):
+            handler.lambda_handler(event, None)
+        assert capsys.readouterr().out == ''
+        with patch.object(handler.request_metrics, 'sample_rate', 1):
+            handler.lambda_handler(event, None)
+
+        # 検証
+        record = json.loads(capsys.readouterr().out)
+        metrics = record['_aws']['CloudWatchMetrics'][0]
+        assert metrics['Dimensions'] == [['Route', 'Method']]
+        assert {m['Name'] for m in metrics['Metrics']} >= {'InitTime', 'DynamoDBTime', 'SerializeTime'}
+        assert record['Route'] == '/items/{id}'
+        assert record['Method'] == 'GET'
+        assert record['StatusCode'] == 200
+        assert record['TotalTime'] >= record['SerializeTime'] >= 0
+
+    def test_request_metrics_dynamodb_hooks(self):
+        """botocoreのイベントフックでDynamoDB時間と消費キャパシティを集計するテスト"""
+        metrics = handler.RequestMetrics(sample_rate=1)
+        metrics.start()
+        model = MagicMock()
+        model.input_shape.members = {'Key': None, 'ReturnConsumedCapacity': None}
+        params = {}
+
+        metrics._on_parameter_build(params=params, model=model)
+        metrics._on_before_call()
+        metrics._on_after_call(parsed={'ConsumedCapacity': {'CapacityUnits': 0.5}})
+        metrics._on_before_call()
+        metrics._on_after_call(parsed={'ConsumedCapacity': [{'CapacityUnits': 1.0}, {'CapacityUnits': 2.0}]})
+
+        assert params == {'ReturnConsumedCapacity': 'TOTAL'}
+        assert metrics.consumed_capacity == 3.5
+        assert metrics.dynamodb_calls == 2
+        assert metrics.phases['dynamodb'] >= 0
+
+        # サンプリング対象外では何もしない
+        metrics.start(sampled=False)
+        params = {}
+        metrics._on_parameter_build(params=params, model=model)
+        assert params == {}
+
+    @patch('functions.handler._get_table')
+    def test_response_compression(self, mock_get_table):
+        """Accept-Encodingとサイズ下限に応じたレスポンス圧縮のテスト"""
+        # モックの設定
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+        items = [{'id': str(i), 'name': f'Item {i}'} for i in range(200)]
+        mock_table.scan.return_value = {'Items': items}
+
+        def list_event(accept_encoding):
+            return {
+                'httpMethod': 'GET',
+                'path': '/items',
+                'resource': '/items',
+                'headers': {'accept-encoding': accept_encoding} if accept_encoding else None,
+                'pathParameters': None,
+                'body': None
+            }
+
+        # 実行
+        compressed = handler.lambda_handler(list_event('gzip, deflate'), None)
+        plain = handler.lambda_handler(list_event(None), None)
+        refused = handler.lambda_handler(list_event('gzip;q=0'), None)
+
+        # 検証
+        assert compressed['isBase64Encoded'] is True
+        assert compressed['headers']['Content-Encoding'] == 'gzip'
+        assert compressed['headers']['Vary'] == 'Accept-Encoding'
+        body = json.loads(gzip.decompress(base64.b64decode(compressed['body'])))
+        assert body['count'] == 200
+        assert 'Content-Encoding' not in refused['headers']
+        assert json.loads(plain['body'])['count'] == 200
+        assert plain['headers']['Vary'] == 'Accept-Encoding'
+        assert 'isBase64Encoded' not in plain
+
+    def test_compression_threshold_and_brotli(self):
+        """サイズ下限未満は圧縮せず、brotliが使える場合はbrを優先するテスト"""
+        event = {'headers': {'Accept-Encoding': 'gzip, br'}}
+        small = handler.create_raw_response(200, '{}')
+        large = handler.create_raw_response(200, json.dumps({'data': 'x' * 4096}))
+
+        assert handler.compress_response(event, small) is small
+
+        fake_brotli = MagicMock()
+        fake_brotli.compress.return_value = b'compressed'
+        with patch.object(handler, 'brotli', fake_brotli):
+            response = handler.compress_response(event, large)
+        assert response['headers']['Content-Encoding'] == 'br'
+        assert base64.b64decode(response['body']) == b'compressed'
+
+        with patch.object(handler, 'brotli', None):
+            response = handler.compress_response(event, large)
+        assert response['headers']['Content-Encoding'] == 'gzip'
+
+    def test_compressed_etag(self):
+        """圧縮したボディのETagに圧縮方式の接尾辞を付け、条件付き取得ではどちらの表現とも一致させるテスト"""
+        body = json.dumps({'data': 'x' * 4096})
+        etag = handler.compute_etag(body)
+
+        # 圧縮の有無で強いETagを区別する
+        with patch.object(handler, 'brotli', None):
+            compressed = handler.compress_response(
+                {'headers': {'Accept-Encoding': 'gzip'}}, handler.conditional_response({}, body)
+            )
+        plain = handler.compress_response({}, handler.conditional_response({}, body))
+        assert compressed['headers']['ETag'] == etag[:-1] + '-gzip"'
+        assert plain['headers']['ETag'] == etag
+
+        # 304には保持している表現のETagを返す
+        for held in (etag, compressed['headers']['ETag'], 'W/' + compressed['headers']['ETag']):
+            response = handler.conditional_response({'headers': {'If-None-Match': held}}, body)
+            assert response['statusCode'] == 304
+            assert response['headers']['ETag'] == held.replace('W/', '')
+        response = handler.conditional_response({'headers': {'If-None-Match': etag[:-1] + '-deflate"'}}, body)
+        assert response['statusCode'] == 200
+
+    def test_parse_base64_body(self):
+        """binaryMediaTypesによりbase64で渡されたリクエストボディの解析テスト"""
+        event = {'body': base64.b64encode(b'{"name": "Item"}').decode(), 'isBase64Encoded': True}
+        assert handler.parse_body(event) == {'name': 'Item'}
+
     def test_decimal_encoder(self):
         """DecimalEncoderのテスト"""
         from decimal import Decimal
@@ -230,6 +1572,51 @@ class TestLambdaHandler:
         with pytest.raises(TypeError):
             encoder.default(object())
 
+    def test_json_default(self):
+        """DynamoDBの値をJSON互換の型に変換するテスト"""
+        from decimal import Decimal
+
+        assert handler.json_default(Decimal('1500')) == 1500
+        assert isinstance(handler.json_default(Decimal('1500')), int)
+        assert handler.json_default(Decimal('0.25')) == 0.25
+        assert handler.json_default({'a'}) == ['a']
+        with pytest.raises(TypeError):
+            handler.json_default(object())
+
+    @pytest.mark.parametrize('name', sorted(handler.JSON_SERIALIZERS))
+    def test_json_serializers(self, name):
+        """各シリアライザが同じJSONを出力するテスト"""
+        from decimal import Decimal
+
+        if name == 'orjson' and handler.orjson is None:
+            pytest.skip('orjson is not installed')
+        serializer = handler.JSON_SERIALIZERS[name]
+        item = {
+            'id': '1',
+            'name': 'テスト',
+            'price': Decimal('10'),
+            'nested': {'values': [Decimal('2.5'), None, True]},
+        }
+
+        assert json.loads(serializer(item)) == {
+            'id': '1', 'name': 'テスト', 'price': 10, 'nested': {'values': [2.5, None, True]}
+        }
+        assert '"price":10' in serializer(item).replace(' ', '')
+        assert 'テスト' in serializer(item)
+
+    @pytest.mark.parametrize('name', sorted(handler.JSON_SERIALIZERS))
+    def test_json_serializers_large_integer(self, name):
+        """64ビットを超える整数のDecimalを桁落ちなく出力するテスト"""
+        from decimal import Decimal
+
+        if name == 'orjson' and handler.orjson is None:
+            pytest.skip('orjson is not installed')
+        serializer = handler.JSON_SERIALIZERS[name]
+        item = {'id': '1', 'count': Decimal('123456789012345678901234567890'), 'price': Decimal('2.5')}
+
+        assert json.loads(serializer(item)) == {'id': '1', 'count': 123456789012345678901234567890, 'price': 2.5}
+        assert handler.json_default(Decimal('-9007199254740993')) == -9007199254740993
+
     @patch('functions.handler._get_table')
     def test_put_without_id_error(self, mock_get_table):
         """PUT要求でIDが無い場合のエラーテスト"""
@@ -299,6 +1686,105 @@ class TestLambdaHandler:
         body = json.loads(response['body'])
         assert body['message'] == 'Method not allowed'
 
+    @patch('functions.handler._get_table')
+    def test_reserved_id_rejected(self, mock_get_table):
+        """集計レコード用の予約済みIDを指定したリクエストを400で返すテスト"""
+        mock_table = MagicMock()
+        mock_get_table.return_value = mock_table
+
+        event = {
+            'httpMethod': 'GET',
+            'path': '/items/#stats',
+            'resource': '/items/{id}',
+            'pathParameters': {'id': '#stats'},
+            'body': None
+        }
+        response = handler.lambda_handler(event, None)
+
+        assert response['statusCode'] == 400
+        mock_table.get_item.assert_not_called()
+
+    def test_aggregate_stream_records(self):
+        """ストリームレコードから集計の差分を計算するテスト"""
+        def image(**item):
+            return {k: {'S': v} for k, v in item.items()}
+
+        records = [
+            {'dynamodb': {'NewImage': image(id='1', category='book', createdAt='2024-11-21')}},
+            {'dynamodb': {'OldImage': image(id='2', category='book'),
+                          'NewImage': image(id='2', category='food', updatedAt='2024-11-22')}},
+            {'dynamodb': {'OldImage': image(id='3', category='toy')}},
+        ]
+
+        count, categories, touched = handler.aggregate_stream_records(records)
+
+        assert count == 0
+        assert categories == {'food': 1, 'toy': -1}
+        assert touched['3'] is None
+        recent = handler.merge_recent([{'id': '3', 'updatedAt': '2024-11-01'}], touched)
+        assert [entry['id'] for entry in recent] == ['2', '1']
+
+    def test_aggregate_stream_records_tombstones(self):
+        """論理削除を削除として集計し、トゥームストーンのTTLによる削除は無視するテスト"""
+        def image(**item):
+            return {k: {'S': v} for k, v in item.items()}
+
+        records = [
+            {'dynamodb': {'OldImage': image(id='1', category='book'),
+                          'NewImage': image(id='1', deletedAt='2024-11-22')}},
+            {'dynamodb': {'OldImage': image(id='2', deletedAt='2024-11-20')}},
+        ]
+
+        count, categories, touched = handler.aggregate_stream_records(records)
+
+        assert count == -1
+        assert categories == {'book': -1}
+        assert touched == {'1': None}
+
+    @patch('functions.handler._get_table')
+    def test_router_not_found_and_method_not_allowed(self, mock_get_table):
+        """未登録のリソースは404、登録済みリソースの未対応メソッドは405を返すテスト"""
+        mock_get_table.return_value = MagicMock()
+
+        for method, resource, status in (
+            ('GET', '/unknown', 404),
+            ('DELETE', '/items:batchGet', 405),
+            ('POST', '/items/{id}', 405),
+        ):
+            event = {
+                'httpMethod': method,
+                'path': resource,
+                'resource': resource,
+                'pathParameters': None,
+                'body': None
+            }
+            response = handler.lambda_handler(event, None)
+            assert response['statusCode'] == status
+
+    def test_router_middleware_per_route(self):
+        """ミドルウェアが登録したルートにのみ適用されるテスト"""
+        calls = []
+
+        def record(func):
+            def wrapper(table, event):
+                calls.append(event['resource'])
+                return func(table, event)
+            return wrapper
+
+        router = handler.Router()
+        router.route('GET', '/a', middleware=(record,))(lambda table, event: 'a')
+        router.route('GET', '/b')(lambda table, event: 'b')
+
+        assert router.resolve('GET', '/a')(None, {'resource': '/a'}) == 'a'
+        assert router.resolve('GET', '/b')(None, {'resource': '/b'}) == 'b'
+        assert calls == ['/a']
+
+    def test_resolve_resource(self):
+        """resourceが無いイベントでpathParametersからテンプレートを復元するテスト"""
+        assert handler.resolve_resource({'resource': '/items/{id}', 'path': '/items/1'}) == '/items/{id}'
+        assert handler.resolve_resource({'path': '/items/1', 'pathParameters': {'id': '1'}}) == '/items/{id}'
+        assert handler.resolve_resource({'path': '/items', 'pathParameters': None}) == '/items'
+
     @patch('functions.handler._get_table')
     def test_exception_handling(self, mock_get_table):
         """例外処理のテスト"""